@@ -0,0 +1,509 @@
+# analytics.py — Incremental student analytics (aggregate state + finalisation)
+import statistics
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import config
+
+CTC_RANGES = [
+    ("0-2", 0, 2), ("2-4", 2, 4), ("4-6", 4, 6), ("6-8", 6, 8),
+    ("8-10", 8, 10), ("10-12", 10, 12), ("12-14", 12, 14), ("14+", 14, 9999),
+]
+
+
+def _bump(counter, key, sign):
+    """Add ``sign`` to a count in a dict, dropping keys that reach zero."""
+    n = counter.get(key, 0) + sign
+    if n:
+        counter[key] = n
+    else:
+        counter.pop(key, None)
+
+
+def _backlogs(row):
+    """Backlog count as float, None when unparsable (matches the old rules)."""
+    try:
+        return float(row.get("backlogs") or 0)
+    except (ValueError, TypeError):
+        return None
+
+
+def _ctc(row):
+    if not row.get("ctc"):
+        return None
+    try:
+        return float(row["ctc"])
+    except (ValueError, TypeError):
+        return None
+
+
+def _placed_day(row):
+    value = row.get("placed_date")
+    if not value:
+        return None
+    try:
+        if isinstance(value, str):
+            value = datetime.strptime(value, "%Y-%m-%d").date()
+        elif isinstance(value, datetime):
+            value = value.date()
+        elif not isinstance(value, date):
+            return None
+        return value.strftime("%Y-%m-%d")
+    except (ValueError, TypeError):
+        return None
+
+
+def _expand(multiset):
+    """Sorted list of float values from a ``{repr(value): count}`` multiset."""
+    values = []
+    for key, count in multiset.items():
+        values.extend([float(key)] * count)
+    values.sort()
+    return values
+
+
+class AnalyticsAggregate:
+    """Additive aggregate of the students table behind the dashboard numbers.
+
+    Every statistic is kept as counts (CTC values as multisets), so a row
+    can be removed exactly as it was added. Applying ``old row → new row``
+    deltas keeps the state in sync with the table without rescanning it;
+    ``finalize()`` turns the state into the analytics dict the templates use.
+    The state is plain JSON and lives in analytics_cache.state.
+    """
+
+    def __init__(self, state=None):
+        self.state = state or {
+            "total": 0,
+            "seeking": {},
+            "placed": 0,
+            "eligible": 0,
+            "unplaced_opted_in": 0,
+            "ctc": {},
+            "companies": {},
+            "genders": {},
+            "departments": {},
+            "dept_courses": {},
+            "courses": {},
+            "placed_dates": {},
+        }
+
+    @classmethod
+    def from_rows(cls, rows):
+        agg = cls()
+        for row in rows:
+            agg.add_row(row)
+        return agg
+
+    @classmethod
+    def from_frame(cls, df):
+        """Columnar backend: build the same state with NumPy over whole columns.
+
+        Used for cold builds over many rows, where a per-row Python pass is
+        too slow. Each text column is factorised once; parsing happens on the
+        (few) distinct values and every group count is a ``bincount`` over
+        integer codes. ``df`` is a DataFrame or a dict of column arrays with
+        the student columns the aggregate reads.
+        """
+        agg = cls()
+        s = agg.state
+        n = len(df["reg_no"])
+        if not n:
+            return agg
+
+        def factor(col):
+            codes, uniques = pd.factorize(np.asarray(df[col], dtype=object), use_na_sentinel=True)
+            return codes, list(uniques)
+
+        def labels(col, default):
+            """Codes for a text column where ''/NULL collapse into ``default``."""
+            codes, uniques = factor(col)
+            names = [u if u not in ("", None) else default for u in uniques] + [default]
+            keep = sorted(set(names))
+            index = {name: i for i, name in enumerate(keep)}
+            remap = np.array([index[name] for name in names])
+            return remap[codes], keep   # code -1 (NULL) maps to the trailing default
+
+        def parsed(col, parse):
+            codes, uniques = factor(col)
+            values = np.array([parse(u) for u in uniques] + [parse(None)], dtype="float64")
+            return values[codes]
+
+        def as_float(v, null=np.nan):
+            if v is None or v == "":
+                return null
+            try:
+                return float(v)
+            except (ValueError, TypeError):
+                return np.nan
+
+        seeking_codes, seeking_values = factor("seeking_placement")
+        status_codes, status_values = factor("status")
+
+        def flag(codes, uniques, value):
+            return codes == (uniques.index(value) if value in uniques else -2)
+
+        opted_in = flag(seeking_codes, seeking_values, "Opted In")
+        placed = flag(status_codes, status_values, "Placed")
+        deemed = flag(status_codes, status_values, "Deemed Placed")
+        bl = parsed("backlogs", lambda v: as_float(v, 0.0))
+        bl_known = ~np.isnan(bl)
+        eligible = opted_in & (~bl_known | (bl < 3))
+        ctc = parsed("ctc", as_float)
+        has_ctc = placed & ~np.isnan(ctc) & (ctc != 0)
+        ctc_codes, ctc_uniques = pd.factorize(np.where(has_ctc, ctc, np.nan), use_na_sentinel=True)
+        ctc_keys = [repr(float(v)) for v in ctc_uniques]
+
+        company_codes, companies = labels("company_name", "")
+        has_company = placed & (np.array([c != "" for c in companies])[company_codes])
+        day_codes, day_values = factor("placed_date")
+        day_keys = [_placed_day({"placed_date": v}) for v in day_values]
+        dept_codes, depts = labels("department", "Unknown")
+        course_codes, courses = labels("course", "Unknown")
+        gender_codes, genders = labels("gender", "Not Specified")
+
+        def count(codes, size, mask=None, weights=None):
+            if mask is not None:
+                codes = codes[mask]
+                weights = weights[mask] if weights is not None else None
+            return np.bincount(codes, weights=weights, minlength=size).astype(int)
+
+        def pair_counts(a_codes, a_size, b_codes, b_size, mask):
+            flat = count(a_codes * b_size + b_codes, a_size * b_size, mask)
+            return flat.reshape(a_size, b_size)
+
+        nd, nc, ng = len(depts), len(courses), len(genders)
+        nk, nco = len(ctc_keys), len(companies)
+
+        s["total"] = n
+        s["seeking"] = {
+            v: int(c) for v, c in zip(seeking_values, count(seeking_codes, len(seeking_values), seeking_codes >= 0)) if c
+        }
+        s["placed"] = int(placed.sum())
+        s["eligible"] = int(eligible.sum())
+        s["unplaced_opted_in"] = int((opted_in & ~placed).sum())
+        s["ctc"] = {k: int(c) for k, c in zip(ctc_keys, count(ctc_codes, nk, ctc_codes >= 0)) if c}
+        s["companies"] = {
+            name: int(c) for name, c in zip(companies, count(company_codes, nco, has_company)) if c
+        }
+        placed_days = {}
+        for code, c in enumerate(count(day_codes, len(day_keys), placed & (day_codes >= 0))):
+            if c and day_keys[code]:
+                placed_days[day_keys[code]] = placed_days.get(day_keys[code], 0) + int(c)
+        s["placed_dates"] = placed_days
+
+        g_total, g_placed = count(gender_codes, ng), count(gender_codes, ng, placed)
+        s["genders"] = {
+            g: {"total": int(g_total[i]), "placed": int(g_placed[i])}
+            for i, g in enumerate(genders) if g_total[i]
+        }
+
+        d_total = count(dept_codes, nd)
+        d_placed = count(dept_codes, nd, placed)
+        d_eligible = count(dept_codes, nd, eligible)
+        d_opted = count(dept_codes, nd, opted_in)
+        d_ctc = pair_counts(dept_codes, nd, ctc_codes, nk, ctc_codes >= 0) if nk else None
+        d_company = pair_counts(dept_codes, nd, company_codes, nco, has_company)
+        for i, dept in enumerate(depts):
+            if not d_total[i]:
+                continue
+            s["departments"][dept] = {
+                "total": int(d_total[i]), "placed": int(d_placed[i]),
+                "eligible": int(d_eligible[i]), "opted_in": int(d_opted[i]),
+                "ctc": {ctc_keys[k]: int(c) for k, c in enumerate(d_ctc[i]) if c} if nk else {},
+                "companies": {companies[k]: int(c) for k, c in enumerate(d_company[i]) if c},
+            }
+
+        dc_total = pair_counts(dept_codes, nd, course_codes, nc, None)
+        dc_placed = pair_counts(dept_codes, nd, course_codes, nc, placed)
+        dc_eligible = pair_counts(dept_codes, nd, course_codes, nc, eligible)
+        for i, j in zip(*np.nonzero(dc_total)):
+            s["dept_courses"].setdefault(depts[i], {})[courses[j]] = {
+                "total": int(dc_total[i, j]), "placed": int(dc_placed[i, j]),
+                "eligible": int(dc_eligible[i, j]),
+            }
+
+        c_ctc = pair_counts(course_codes, nc, ctc_codes, nk, ctc_codes >= 0) if nk else None
+        c_ineligible = count(course_codes, nc, opted_in & bl_known & (bl >= 3))
+        c_backlogs = count(course_codes, nc, bl_known & (bl > 0))
+        c_deemed = count(course_codes, nc, deemed)
+        c_seeking = count(course_codes, nc, opted_in)
+        c_eligible = count(course_codes, nc, eligible)
+        c_placed = count(course_codes, nc, placed)
+        for j, course in enumerate(courses):
+            total = int(dc_total[:, j].sum())
+            if not total:
+                continue
+            s["courses"][course] = {
+                "departments": {depts[i]: int(c) for i, c in enumerate(dc_total[:, j]) if c},
+                "total": total, "seeking": int(c_seeking[j]), "eligible": int(c_eligible[j]),
+                "ineligible_backlogs": int(c_ineligible[j]), "has_backlogs": int(c_backlogs[j]),
+                "deemed_placed": int(c_deemed[j]), "placed": int(c_placed[j]),
+                "ctc": {ctc_keys[k]: int(c) for k, c in enumerate(c_ctc[j]) if c} if nk else {},
+            }
+        return agg
+
+    @classmethod
+    def from_records(cls, records, columns):
+        """Build from row tuples, picking the columnar backend for large inputs."""
+        if len(records) >= config.ANALYTICS_COLUMNAR_MIN_ROWS:
+            arrays = [np.array(values, dtype=object) for values in zip(*records)]
+            return cls.from_frame(dict(zip(columns, arrays)))
+        return cls.from_rows(dict(zip(columns, values)) for values in records)
+
+    def add_row(self, row):
+        self._apply(row, 1)
+
+    def remove_row(self, row):
+        self._apply(row, -1)
+
+    def apply_delta(self, old_row, new_row):
+        """Replace ``old_row`` by ``new_row``; either may be None."""
+        if old_row:
+            self.remove_row(old_row)
+        if new_row:
+            self.add_row(new_row)
+
+    def _apply(self, row, sign):
+        s = self.state
+        seeking = row.get("seeking_placement")
+        opted_in = seeking == "Opted In"
+        placed = row.get("status") == "Placed"
+        backlogs = _backlogs(row)
+        eligible = opted_in and (backlogs is None or backlogs < 3)
+        ctc = _ctc(row) if placed else None
+        ctc_key = repr(ctc) if ctc is not None else None
+        dept = row.get("department") or "Unknown"
+        course = row.get("course") or "Unknown"
+        gender = row.get("gender") or "Not Specified"
+
+        s["total"] += sign
+        if seeking is not None:
+            _bump(s["seeking"], seeking, sign)
+        s["placed"] += sign if placed else 0
+        s["eligible"] += sign if eligible else 0
+        s["unplaced_opted_in"] += sign if opted_in and not placed else 0
+        if ctc_key:
+            _bump(s["ctc"], ctc_key, sign)
+        if placed and row.get("company_name"):
+            _bump(s["companies"], row["company_name"], sign)
+        if placed:
+            day = _placed_day(row)
+            if day:
+                _bump(s["placed_dates"], day, sign)
+
+        g = s["genders"].setdefault(gender, {"total": 0, "placed": 0})
+        g["total"] += sign
+        g["placed"] += sign if placed else 0
+        if not g["total"]:
+            del s["genders"][gender]
+
+        d = s["departments"].setdefault(dept, {
+            "total": 0, "placed": 0, "eligible": 0, "opted_in": 0,
+            "ctc": {}, "companies": {},
+        })
+        d["total"] += sign
+        d["placed"] += sign if placed else 0
+        d["eligible"] += sign if eligible else 0
+        d["opted_in"] += sign if opted_in else 0
+        if ctc_key:
+            _bump(d["ctc"], ctc_key, sign)
+        if placed and row.get("company_name"):
+            _bump(d["companies"], row["company_name"], sign)
+        if not d["total"]:
+            del s["departments"][dept]
+
+        dc = s["dept_courses"].setdefault(dept, {})
+        cell = dc.setdefault(course, {"total": 0, "placed": 0, "eligible": 0})
+        cell["total"] += sign
+        cell["placed"] += sign if placed else 0
+        cell["eligible"] += sign if eligible else 0
+        if not cell["total"]:
+            del dc[course]
+        if not dc:
+            del s["dept_courses"][dept]
+
+        c = s["courses"].setdefault(course, {
+            "departments": {}, "total": 0, "seeking": 0, "eligible": 0,
+            "ineligible_backlogs": 0, "has_backlogs": 0,
+            "deemed_placed": 0, "placed": 0, "ctc": {},
+        })
+        _bump(c["departments"], dept, sign)
+        c["total"] += sign
+        c["seeking"] += sign if opted_in else 0
+        c["eligible"] += sign if eligible else 0
+        c["ineligible_backlogs"] += sign if opted_in and backlogs is not None and backlogs >= 3 else 0
+        c["has_backlogs"] += sign if backlogs is not None and backlogs > 0 else 0
+        c["deemed_placed"] += sign if row.get("status") == "Deemed Placed" else 0
+        c["placed"] += sign if placed else 0
+        if ctc_key:
+            _bump(c["ctc"], ctc_key, sign)
+        if not c["total"]:
+            del s["courses"][course]
+
+    # ── Finalisation ─────────────────────────────────────────────────────
+    def finalize(self):
+        """Build the dashboard analytics dict from the aggregate state."""
+        s = self.state
+        seeking = s["seeking"]
+        opted_in = seeking.get("Opted In", 0)
+        eligible = s["eligible"]
+        placed = s["placed"]
+        ctc_values = _expand(s["ctc"])
+
+        depts = sorted(s["departments"].items(), key=lambda x: (-x[1]["placed"], x[0]))
+        top_companies = sorted(s["companies"].items(), key=lambda x: (-x[1], x[0]))[:10]
+
+        ctc_dist_values = [0] * len(CTC_RANGES)
+        for v in ctc_values:
+            for i, (_, lo, hi) in enumerate(CTC_RANGES):
+                if lo <= v < hi:
+                    ctc_dist_values[i] += 1
+                    break
+
+        analytics = {
+            "total": s["total"],
+            "opted_in": opted_in,
+            "opted_out": seeking.get("Opted Out", 0),
+            "not_registered": seeking.get("Not Registered", 0),
+            "debarred": seeking.get("Debarred", 0),
+            "eligible": eligible,
+            "ineligible": opted_in - eligible,
+            "placed": placed,
+            "unplaced": s["unplaced_opted_in"],
+            "placement_rate": round((placed / eligible * 100), 1) if eligible else 0,
+            "avg_ctc": round(sum(ctc_values) / len(ctc_values), 2) if ctc_values else 0,
+            "median_ctc": round(statistics.median(ctc_values), 2) if ctc_values else 0,
+            "max_ctc": ctc_values[-1] if ctc_values else 0,
+            "min_ctc": ctc_values[0] if ctc_values else 0,
+            "top_company": top_companies[0][0] if top_companies else "N/A",
+            "dept_labels": [d[0] for d in depts],
+            "dept_placed": [d[1]["placed"] for d in depts],
+            "dept_total": [d[1]["total"] for d in depts],
+            "dept_eligible": [d[1]["eligible"] for d in depts],
+            "company_labels": [c[0] for c in top_companies],
+            "company_values": [c[1] for c in top_companies],
+            "gender_counts": {g: v["total"] for g, v in sorted(s["genders"].items())},
+            "gender_placement": {
+                g: {"total": v["total"], "placed": v["placed"]}
+                for g, v in sorted(s["genders"].items())
+            },
+            "ctc_dist_labels": [r[0] + " LPA" for r in CTC_RANGES],
+            "ctc_dist_values": ctc_dist_values,
+            "dept_course_breakdown": {
+                dept: {course: dict(cell) for course, cell in sorted(courses.items())}
+                for dept, courses in sorted(s["dept_courses"].items())
+            },
+            "course_summary": self._course_summary(),
+            "dept_summary": self._dept_summary(),
+        }
+        analytics.update(self._trends())
+        return analytics
+
+    def _course_summary(self):
+        rows = []
+        for course, agg in _live_items(self.state["courses"]):
+            # A course is listed under the department most of its students are in
+            department = min(agg["departments"].items(), key=lambda x: (-x[1], x[0]))[0]
+            ctc_values = _expand(agg["ctc"])
+            seeking, eligible = agg["seeking"], agg["eligible"]
+            unplaced = max(0, eligible - agg["placed"] - agg["deemed_placed"])
+            rows.append({
+                "department": department,
+                "stream": course,
+                "total": agg["total"],
+                "seeking": seeking,
+                "not_seeking": agg["total"] - seeking,
+                "eligible": eligible,
+                "ineligible_backlogs": agg["ineligible_backlogs"],
+                "gap_pct": round((seeking - eligible) / seeking * 100, 1) if seeking > 0 else 0,
+                "backlogs": agg["has_backlogs"],
+                "deemed_placed": agg["deemed_placed"],
+                "placed": agg["placed"],
+                "unplaced": unplaced,
+                "pending": unplaced,
+                "target_pct": 100,
+                "achieved_pct": round(agg["placed"] / eligible * 100, 1) if eligible > 0 else 0,
+                "avg_ctc": round(sum(ctc_values) / len(ctc_values), 2) if ctc_values else 0,
+            })
+        rows.sort(key=lambda r: (r["department"], r["stream"]))
+        return rows
+
+    def _dept_summary(self):
+        rows = []
+        for sr, (dept, da) in enumerate(_live_items(self.state["departments"]), start=1):
+            ctc_values = _expand(da["ctc"])
+            companies = sorted(da["companies"])
+            rows.append({
+                "sr_no": sr,
+                "school_name": dept,
+                "total": da["total"],
+                "opted_in": da["opted_in"],
+                "placed": da["placed"],
+                "placed_pct": round(da["placed"] / da["opted_in"] * 100, 1) if da["opted_in"] > 0 else 0,
+                "highest_ctc": ctc_values[-1] if ctc_values else 0,
+                "avg_ctc": round(sum(ctc_values) / len(ctc_values), 2) if ctc_values else 0,
+                "median_ctc": round(statistics.median(ctc_values), 2) if ctc_values else 0,
+                "unique_companies_count": len(companies),
+                "unique_companies": ", ".join(companies),
+            })
+        return rows
+
+    def _trends(self):
+        date_counts = {
+            datetime.strptime(k, "%Y-%m-%d").date(): n
+            for k, n in self.state["placed_dates"].items() if n > 0
+        }
+        trends = {
+            "trend_daily_labels": [], "trend_daily_values": [], "trend_daily_new": [],
+            "trend_weekly_labels": [], "trend_weekly_values": [], "trend_weekly_new": [],
+            "trend_monthly_labels": [], "trend_monthly_values": [], "trend_monthly_new": [],
+        }
+        if not date_counts:
+            return trends
+
+        week_counts, month_counts = {}, {}
+        for d, n in date_counts.items():
+            iso = d.isocalendar()
+            wk = f"{iso[0]}-W{iso[1]:02d}"
+            week_counts[wk] = week_counts.get(wk, 0) + n
+            mk = d.strftime("%Y-%m")
+            month_counts[mk] = month_counts.get(mk, 0) + n
+
+        first_date, last_date = min(date_counts), max(date_counts)
+        day, cumulative, weeks = first_date, 0, set()
+        while day <= last_date:
+            new = date_counts.get(day, 0)
+            cumulative += new
+            trends["trend_daily_labels"].append(day.strftime("%Y-%m-%d"))
+            trends["trend_daily_values"].append(cumulative)
+            trends["trend_daily_new"].append(new)
+            iso = day.isocalendar()
+            weeks.add(f"{iso[0]}-W{iso[1]:02d}")
+            day += timedelta(days=1)
+
+        cumulative = 0
+        for wk in sorted(weeks):
+            cumulative += week_counts.get(wk, 0)
+            trends["trend_weekly_labels"].append(wk)
+            trends["trend_weekly_values"].append(cumulative)
+            trends["trend_weekly_new"].append(week_counts.get(wk, 0))
+
+        ym, last_month, cumulative = first_date.strftime("%Y-%m"), last_date.strftime("%Y-%m"), 0
+        while ym <= last_month:
+            cumulative += month_counts.get(ym, 0)
+            trends["trend_monthly_labels"].append(ym)
+            trends["trend_monthly_values"].append(cumulative)
+            trends["trend_monthly_new"].append(month_counts.get(ym, 0))
+            y, m = int(ym[:4]), int(ym[5:7]) + 1
+            if m > 12:
+                y, m = y + 1, 1
+            ym = f"{y}-{m:02d}"
+        return trends
+
+
+def _live_items(mapping):
+    """Items of a state mapping in key order, skipping emptied entries."""
+    return [(k, v) for k, v in sorted(mapping.items()) if v.get("total", 0) > 0]
@@ -1,10 +1,11 @@
 # app.py — Main Flask application (modularised)
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import (
+    Flask, render_template, request, redirect, url_for, flash, jsonify, send_file,
+    Response, stream_with_context, abort,
+)
 import pandas as pd
-import hashlib
-import re as _re
+import os
 from datetime import datetime
-from decimal import Decimal
 from io import BytesIO
 from mysql.connector import Error
 
@@ -12,9 +13,21 @@ import config
 from helpers import (
     UPLOAD_FOLDER, EXPECTED_HEADERS, HEADER_TO_COL, DB_COLUMNS,
     DISPLAY_COLUMNS, EDITABLE_COLUMNS, NUMERIC_FLOAT_COLS, NUMERIC_INT_COLS,
-    to_float_or_none, to_int_or_none, normalize_row, normalize_rows,
-    get_connection, init_db, compute_analytics,
-    get_cached_analytics, save_analytics_cache, invalidate_analytics_cache,
+    normalize_row,
+    get_connection, init_db, invalidate_analytics_cache, load_analytics,
+    apply_analytics_deltas, fetch_student_rows, student_row_deltas, get_pool_stats,
+    load_segment_analytics, segment_key, bump_data_generation,
+)
+from drive_listing import note_cdm_change
+from http_cache import conditional_get, skip_conditional
+from ingest import (
+    normalize_upload_frame, rows_from_columns, dedupe_rows, content_digest, stage_upload,
+    diff_staging_against_students, merge_staging_into_students, drop_staging_table,
+    placed_transitions, sync_placed_dates,
+)
+from versions import (
+    record_upload_version, latest_upload_matches, load_version_rows, delete_version as remove_version,
+    archive_file_path, stream_archive_json, start_archive_migration, VERSION_META_FIELDS,
 )
 from routes_data import register_data_routes
 from routes_cdm import register_cdm_routes
@@ -78,65 +91,15 @@ def upload():
 
     df = df[EXPECTED_HEADERS]
     df.rename(columns=HEADER_TO_COL, inplace=True)
-    df = df.where(pd.notnull(df), None)
-    # Force object dtype so None stays None (not numpy.nan)
-    for col in DB_COLUMNS:
-        df[col] = df[col].astype(object).where(df[col].notna(), None)
-
-    df["sr_no"] = df["sr_no"].apply(to_int_or_none)
-
-    def to_str_or_none(v):
-        if v is None:
-            return None
-        s = str(v).strip()
-        if s.lower() == "nan" or s == "":
-            return None
-        return s
-
-    for col in DB_COLUMNS:
-        if col == "sr_no":
-            continue
-        df[col] = df[col].apply(to_str_or_none)
-
-    # ── Fix percent decimals on upload (0.6 → 60) ───────────────────────
-    for col in ["percent_10", "percent_12"]:
-        def fix_pct(v):
-            if v is None:
-                return None
-            if isinstance(v, (int, float)):
-                if pd.isna(v):
-                    return None
-                num = float(v)
-                if 0 < num <= 1:
-                    num = round(num * 100, 1)
-                return str(int(num)) if num == int(num) else str(num)
-            s = str(v).strip()
-            if s.lower() in ("", "nan"):
-                return None
-            # Strip GPA/CGPA prefix
-            cleaned = _re.sub(r'^(C?GPA)\s*', '', s, flags=_re.IGNORECASE).strip()
-            cleaned = cleaned.rstrip('%').strip()
-            # Convert garbage like '__' to None
-            if cleaned in ('__', '_', ''):
-                return None
-            try:
-                num = float(cleaned)
-                if 0 < num <= 1:
-                    num = round(num * 100, 1)
-                    cleaned = str(int(num)) if num == int(num) else str(num)
-            except ValueError:
-                pass
-            return cleaned
-        df[col] = df[col].apply(fix_pct)
-
-    # ── Convert numeric columns to proper types ──────────────────────────
-    for col in ["ctc", "percent_10", "percent_12", "graduation_ogpa"]:
-        df[col] = df[col].apply(to_float_or_none)
-    df["backlogs"] = df["backlogs"].apply(to_int_or_none)
+
+    # ── Clean & type every column in one vectorised pass ─────────────────
+    columns = normalize_upload_frame(df)
+    values_list = rows_from_columns(columns)
 
     # ── Upsert into MySQL (batch) ────────────────────────────────────────
-    inserted = 0
-    updated = 0
+    rows = dedupe_rows(values_list)
+    data_hash = content_digest(rows)
+    reg_idx = DB_COLUMNS.index("reg_no")
 
     placeholders = ", ".join(["%s"] * len(DB_COLUMNS))
     cols_joined = ", ".join(DB_COLUMNS)
@@ -150,113 +113,67 @@ def upload():
 
     try:
         conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Fetch full existing data for accurate change detection
-        cursor.execute("SELECT * FROM students")
-        existing_rows = {row["reg_no"]: row for row in cursor.fetchall()}
+        cursor = conn.cursor()
 
-        # Compare uploaded data against DB to find real changes
-        values_list = []
-        for _, row in df.iterrows():
-            values = tuple(
-                None if (v is not None and isinstance(v, float) and pd.isna(v)) else v
-                for c in DB_COLUMNS for v in [row[c]]
+        # Identical to the latest version and nothing edited since: skip the diff
+        if latest_upload_matches(cursor, data_hash):
+            cursor.close()
+            conn.close()
+            flash(
+                "No changes detected — this file is identical to the latest upload. "
+                "No new version created.",
+                "info",
             )
-            values_list.append(values)
-            reg = row["reg_no"]
-            if reg not in existing_rows:
-                inserted += 1
+            return redirect(url_for("upload"))
+
+        # Stage the upload and diff it against students by row fingerprint
+        load_stats = stage_upload(cursor, rows)
+        changes = diff_staging_against_students(cursor)
+        inserted = sum(1 for c in changes if c["is_new"])
+        updated = len(changes) - inserted
+
+        # Write only new/changed rows
+        bulk_merge = config.UPLOAD_BULK_LOAD and len(rows) >= config.UPLOAD_BULK_MIN_ROWS
+        changed_regs = [c["reg_no"] for c in changes]
+        before = fetch_student_rows(
+            cursor, [c["reg_no"] for c in changes if not c["is_new"]], for_update=True
+        )
+        after = {}
+        if changes:
+            if bulk_merge:
+                merge_staging_into_students(cursor)
             else:
-                # Field-by-field comparison for real updates
-                db_row = existing_rows[reg]
-                for col in DB_COLUMNS:
-                    if col == "reg_no":
-                        continue
-                    new_val = row[col]
-                    old_val = db_row.get(col)
-                    # Normalize Decimal for comparison
-                    if isinstance(old_val, Decimal):
-                        old_val = float(old_val)
-                    # Compare as strings to handle type mismatches
-                    if str(new_val if new_val is not None else "") != str(old_val if old_val is not None else ""):
-                        updated += 1
-                        break
-
-        # Always do the upsert (idempotent sync)
-        cursor2 = conn.cursor()
-        cursor2.executemany(upsert_sql, values_list)
-        conn.commit()
-
-        # Auto-set placed_date for newly placed students (via upload)
-        now_date = datetime.now().strftime("%Y-%m-%d")
-        for _, row in df.iterrows():
-            reg = row["reg_no"]
-            new_status = row.get("status")
-            if new_status == "Placed":
-                old_status = existing_rows.get(reg, {}).get("status") if reg in existing_rows else None
-                if old_status != "Placed":
-                    cursor2 = conn.cursor()
-                    cursor2.execute(
-                        "UPDATE students SET placed_date = %s WHERE reg_no = %s AND placed_date IS NULL",
-                        (now_date, reg),
-                    )
-                    cursor2.close()
-            elif reg in existing_rows and existing_rows[reg].get("status") == "Placed" and new_status != "Placed":
-                # Student was un-placed, clear the date
-                cursor2 = conn.cursor()
-                cursor2.execute(
-                    "UPDATE students SET placed_date = NULL WHERE reg_no = %s",
-                    (reg,),
-                )
-                cursor2.close()
+                changed = set(changed_regs)
+                cursor.executemany(upsert_sql, [v for v in rows if v[reg_idx] in changed])
+
+            # Auto-set / clear placed_date for status transitions (set-based)
+            placed, unplaced = placed_transitions(changes)
+            sync_placed_dates(cursor, placed, unplaced, datetime.now().strftime("%Y-%m-%d"))
+            after = fetch_student_rows(cursor, changed_regs)
+            bump_data_generation(cursor, "students")
+        apply_analytics_deltas(conn, student_row_deltas(before, after))
         conn.commit()
 
-        cursor2 = conn.cursor()
-
         total = inserted + updated
         has_real_changes = (inserted + updated) > 0
 
         if has_real_changes:
-            # ── Compute content hash ─────────────────────────────────────
-            sorted_df = df.sort_values("reg_no").reset_index(drop=True)
-            data_hash = hashlib.md5(
-                sorted_df[DB_COLUMNS].to_csv(index=False).encode("utf-8")
-            ).hexdigest()
-
-            # ── Save version snapshot (batch) ────────────────────────────
-            cursor3 = conn.cursor()
-            cursor3.execute(
-                "INSERT INTO upload_versions (filename, uploaded_at, total_records, inserted, updated, content_hash) "
-                "VALUES (%s, %s, %s, %s, %s, %s)",
-                (file.filename, datetime.now(), total, inserted, updated, data_hash),
-            )
-            version_id = cursor3.lastrowid
-
-            snap_cols = ", ".join(DB_COLUMNS)
-            snap_placeholders = ", ".join(["%s"] * (len(DB_COLUMNS) + 1))
-            snap_sql = (
-                f"INSERT INTO version_snapshots (version_id, {snap_cols}) "
-                f"VALUES ({snap_placeholders})"
+            # ── Save version snapshot (checkpoint or delta) ──────────────
+            version_id, storage, _written = record_upload_version(
+                cursor, file.filename, datetime.now(), total, inserted, updated, data_hash,
             )
-            snap_values_list = []
-            for _, row in df.iterrows():
-                values = (version_id,) + tuple(
-                    None if (v is not None and isinstance(v, float) and pd.isna(v)) else v
-                    for c in DB_COLUMNS for v in [row[c]]
-                )
-                snap_values_list.append(values)
-            cursor3.executemany(snap_sql, snap_values_list)
-
             conn.commit()
-            cursor3.close()
-
-            # Invalidate analytics cache after data change
-            invalidate_analytics_cache()
+            if storage == "checkpoint":
+                # Versions before this checkpoint can now move to the archive tier
+                start_archive_migration()
 
+            load_note = (
+                f" Bulk-loaded {load_stats['rows']} rows at {load_stats['rows_per_sec']:,.0f} rows/s."
+                if bulk_merge else ""
+            )
             flash(
                 f"Upload successful. {total} records processed, "
-                f"{inserted} new, {updated} updated. Version #{version_id} created.",
+                f"{inserted} new, {updated} updated. Version #{version_id} created.{load_note}",
                 "success",
             )
         else:
@@ -266,6 +183,7 @@ def upload():
                 "info",
             )
 
+        drop_staging_table(cursor)
         cursor.close()
         conn.close()
 
@@ -343,23 +261,40 @@ def download_cdm_template():
     )
 
 
+def _segment_from_args(args):
+    """Segment key for ?department= / ?course= / ?placed_from=&placed_to=."""
+    if args.get("department"):
+        return segment_key("department", args["department"].strip())
+    if args.get("course"):
+        return segment_key("course", args["course"].strip())
+    if args.get("placed_from") and args.get("placed_to"):
+        return segment_key("placed", f"{args['placed_from']}..{args['placed_to']}")
+    return None
+
+
 @app.route("/dashboard")
+@conditional_get("students")
 def dashboard():
+    segment = _segment_from_args(request.args)
     try:
-        analytics = get_cached_analytics()
-        if not analytics:
-            conn = get_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM students ORDER BY sr_no")
-            rows = cursor.fetchall()
-            normalize_rows(rows)
-            analytics = compute_analytics(rows)
-            cursor.close()
-            conn.close()
-            save_analytics_cache(analytics)
+        analytics = load_segment_analytics(segment) if segment else load_analytics()
     except Error:
         analytics = {}
-    return render_template("dashboard.html", analytics=analytics)
+    if not analytics or analytics.get("_stale"):
+        # A rebuild will change the numbers without a new students generation
+        skip_conditional()
+    return render_template("dashboard.html", analytics=analytics, segment=segment)
+
+
+@app.route("/api/analytics")
+def api_analytics():
+    """Dashboard analytics as JSON, optionally filtered to one segment."""
+    segment = _segment_from_args(request.args)
+    try:
+        analytics = load_segment_analytics(segment) if segment else load_analytics()
+        return jsonify({"segment": segment, "analytics": analytics})
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
 
 
 # ── Admin routes ─────────────────────────────────────────────────────────────
@@ -371,6 +306,9 @@ def drop_all():
         cursor = conn.cursor()
         cursor.execute("DELETE FROM students")
         count = cursor.rowcount
+        bump_data_generation(cursor, "students")
+        # Every drive_students row goes with them (ON DELETE CASCADE)
+        note_cdm_change(cursor)
         conn.commit()
         cursor.close()
         conn.close()
@@ -387,6 +325,7 @@ def drop_cdm():
     try:
         conn = get_connection()
         cursor = conn.cursor()
+        bump_data_generation(cursor, "cdm")
         cursor.execute("DELETE FROM drive_students")
         cursor.execute("DELETE FROM drive_rounds")
         cursor.execute("DELETE FROM drive_courses")
@@ -404,6 +343,12 @@ def drop_cdm():
     return redirect(url_for("upload"))
 
 
+@app.route("/api/admin/pool-stats")
+def api_pool_stats():
+    """Return connection-pool metrics for this worker."""
+    return jsonify({"pools": get_pool_stats()})
+
+
 # ── Logs / Version routes ────────────────────────────────────────────────────
 @app.route("/audit")
 def logs_page():
@@ -426,16 +371,16 @@ def version_detail(version_id):
     """Show data from a specific upload version."""
     try:
         conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT v.* FROM version_snapshots v WHERE v.version_id = %s ORDER BY v.sr_no",
-            (version_id,),
-        )
-        rows = cursor.fetchall()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM upload_versions WHERE version_id = %s", (version_id,))
+        exists = cursor.fetchone() is not None
+        rows = load_version_rows(cursor, version_id) if exists else []
         cursor.close()
         conn.close()
     except Error:
-        rows = []
+        exists, rows = True, []
+    if not exists:
+        abort(404)
     return render_template("audit_version.html", version_id=version_id, snap_json=rows)
 
 
@@ -451,21 +396,36 @@ def version_detail_legacy_redirect(version_id):
 
 @app.route("/api/version/<int:version_id>")
 def api_version(version_id):
-    """Return snapshot data for a specific version as JSON."""
+    """Return snapshot data for a specific version as JSON.
+
+    ``?columns=reg_no,status`` limits the fields returned. Archived versions
+    are streamed straight from their blob without touching MySQL.
+    """
+    fields = [c.strip() for c in request.args.get("columns", "").split(",") if c.strip()]
+    fields = [c for c in fields if c in DB_COLUMNS or c in VERSION_META_FIELDS] or None
+    path = archive_file_path(version_id)
+    if os.path.exists(path):
+        return Response(
+            stream_with_context(stream_archive_json(path, fields)),
+            mimetype="application/json",
+        )
     try:
         conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
         cursor.execute(
-            "SELECT v.*, uv.filename, uv.uploaded_at "
-            "FROM version_snapshots v "
-            "JOIN upload_versions uv ON v.version_id = uv.version_id "
-            "WHERE v.version_id = %s ORDER BY v.sr_no",
+            "SELECT filename, uploaded_at FROM upload_versions WHERE version_id = %s",
             (version_id,),
         )
-        rows = cursor.fetchall()
-        for r in rows:
-            if r.get("uploaded_at"):
-                r["uploaded_at"] = r["uploaded_at"].strftime("%Y-%m-%d %H:%M:%S")
+        meta = cursor.fetchone()
+        rows = load_version_rows(cursor, version_id) if meta else []
+        if meta:
+            filename = meta[0]
+            uploaded_at = meta[1].strftime("%Y-%m-%d %H:%M:%S") if meta[1] else None
+            for r in rows:
+                r["filename"] = filename
+                r["uploaded_at"] = uploaded_at
+        if fields:
+            rows = [{k: r.get(k) for k in fields} for r in rows]
         cursor.close()
         conn.close()
         return jsonify({"data": rows})
@@ -478,19 +438,18 @@ def delete_version(version_id):
     """Delete a specific upload version and its snapshot data."""
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM version_snapshots WHERE version_id = %s", (version_id,))
-        cursor.execute("DELETE FROM upload_versions WHERE version_id = %s", (version_id,))
-        conn.commit()
-        cursor.close()
+        remove_version(conn, version_id)
         conn.close()
         flash(f"Version #{version_id} deleted.", "success")
     except Error as e:
         flash(f"Database error: {e}", "danger")
+    except OSError as e:
+        flash(f"Archive file error: {e}", "danger")
     return redirect(url_for("logs_page"))
 
 
 # ── Main ─────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     init_db()
+    start_archive_migration()
     app.run(debug=True, port=5000)
@@ -0,0 +1,160 @@
+# cdm_analytics.py — Recruitment (CDM) analytics: one-pass build, materialized per cdm generation
+import json
+import threading
+from collections import Counter
+
+from helpers import parse_ctc_value
+
+# Snapshot of /api/cdm/analytics, stored in cdm_analytics_cache (id = 1)
+# with the cdm data generation it was built from. Every CDM write bumps that
+# generation, so a stored body is served as-is while it matches and rebuilt
+# (by whichever worker asks first) once it does not.
+_memo = {}                  # "body" → (generation, json text)
+_memo_lock = threading.Lock()
+
+SELECTED_STATUSES = ("Selected", "Placed")
+
+
+def _ranked(counts, key, limit=None):
+    """``{(company_id, company_name): n}`` → rows by count desc, then name."""
+    rows = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0][1]))
+    return [{"company_name": name, key: count} for (_, name), count in rows[:limit]]
+
+
+def compute_cdm_analytics(cursor):
+    """Build the /api/cdm/analytics payload from one joined scan.
+
+    Companies ⋈ drives ⋈ drive students come back as a single result set
+    (outer joins keep recruiters without drives and drives without
+    students); every figure is folded in one pass, and each drive's CTC
+    text is parsed once. ``cursor`` must be a plain (tuple) cursor.
+    """
+    cursor.execute("""
+        SELECT c.company_id, c.company_name, c.received_by,
+               d.drive_id, IFNULL(d.status, 'Upcoming'), d.ctc_text,
+               ds.reg_no, ds.status
+        FROM companies c
+        LEFT JOIN company_drives d ON d.company_id = c.company_id
+        LEFT JOIN drive_students ds ON ds.drive_id = d.drive_id
+    """)
+    companies = set()
+    drives = {}                              # drive_id → (company_id, company_name, coordinator, ctc)
+    status_dist = Counter()
+    participants, selected = set(), set()
+    selected_rows = Counter()                # (company_id, company_name) → selected/placed rows
+    placed = {}                              # (company_id, company_name) → {reg_no}
+    team_selections = Counter()
+
+    for company_id, company_name, received_by, drive_id, drive_status, ctc_text, reg_no, ds_status in cursor.fetchall():
+        companies.add(company_id)
+        if drive_id is None:
+            continue
+        coordinator = received_by if received_by else None
+        if drive_id not in drives:
+            drives[drive_id] = (company_id, company_name, coordinator, parse_ctc_value(ctc_text))
+            status_dist[drive_status] += 1
+        if reg_no is None:
+            continue
+        participants.add(reg_no)
+        if ds_status in SELECTED_STATUSES:
+            selected.add(reg_no)
+            selected_rows[(company_id, company_name)] += 1
+            if coordinator:
+                team_selections[coordinator] += 1
+        if ds_status == "Placed":
+            placed.setdefault((company_id, company_name), set()).add(reg_no)
+
+    ctc_values = sorted(ctc for _, _, _, ctc in drives.values() if ctc is not None)
+    ctc_stats = {}
+    if ctc_values:
+        mid = len(ctc_values) // 2
+        ctc_stats = {
+            "mean": round(sum(ctc_values) / len(ctc_values), 2),
+            "median": round(
+                (ctc_values[mid - 1] + ctc_values[mid]) / 2 if len(ctc_values) % 2 == 0 else ctc_values[mid], 2
+            ),
+            "highest": round(ctc_values[-1], 2),
+            "lowest": round(ctc_values[0], 2),
+            "count": len(ctc_values),
+        }
+
+    company_ctc, team = {}, {}
+    for company_id, company_name, coordinator, ctc in drives.values():
+        if ctc is not None and ctc > company_ctc.get(company_name, 0):
+            company_ctc[company_name] = ctc
+        if coordinator:
+            stats = team.setdefault(coordinator, {"drives": 0, "companies": set(), "ctc": []})
+            stats["drives"] += 1
+            stats["companies"].add(company_id)
+            if ctc is not None:
+                stats["ctc"].append(ctc)
+
+    placed_counts = {company: len(regs) for company, regs in placed.items()}
+    team_performance = [
+        {
+            "name": person,
+            "companies_brought": len(stats["companies"]),
+            "total_drives": stats["drives"],
+            "selections": team_selections.get(person, 0),
+            "avg_ctc": round(sum(stats["ctc"]) / len(stats["ctc"]), 2) if stats["ctc"] else None,
+            "highest_ctc": round(max(stats["ctc"]), 2) if stats["ctc"] else None,
+        }
+        for person, stats in sorted(team.items(), key=lambda kv: (-len(kv[1]["companies"]), kv[0]))
+    ]
+
+    return {
+        "total_drives": len(drives),
+        "total_companies": len(companies),
+        "total_participating_students": len(participants),
+        "total_selected_students": len(selected),
+        "unique_placed_companies": len(placed),
+        "placed_by_company": _ranked(placed_counts, "placed_count"),
+        "status_dist": dict(status_dist),
+        "ctc_stats": ctc_stats,
+        "top_placed_companies": _ranked(selected_rows, "selected_count", 10),
+        "highest_ctc_companies": sorted(
+            ({"company_name": k, "ctc": v} for k, v in company_ctc.items()),
+            key=lambda x: x["ctc"], reverse=True,
+        )[:10],
+        "team_performance": team_performance,
+    }
+
+
+def _stored_text(data):
+    return data.decode() if isinstance(data, (bytes, bytearray)) else data
+
+
+def load_cdm_analytics(conn):
+    """JSON text of the CDM analytics for the current cdm generation.
+
+    Served from this worker's memo, then cdm_analytics_cache; otherwise
+    rebuilt and stored. Generation, cache row and scan are read in one
+    transaction, so a stored body always matches its generation.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT generation FROM data_generations WHERE name = 'cdm'")
+    row = cursor.fetchone()
+    generation = row[0] if row else 0
+    with _memo_lock:
+        memo = _memo.get("body")
+    if memo and memo[0] == generation:
+        cursor.close()
+        return memo[1]
+
+    cursor.execute("SELECT generation, data FROM cdm_analytics_cache WHERE id = 1")
+    row = cursor.fetchone()
+    if row and row[0] == generation and row[1]:
+        body = _stored_text(row[1])
+    else:
+        body = json.dumps(compute_cdm_analytics(cursor))
+        cursor.execute(
+            "UPDATE cdm_analytics_cache SET generation = %s, data = %s, updated_at = NOW() "
+            "WHERE id = 1 AND generation <= %s",
+            (generation, body, generation),
+        )
+        conn.commit()
+    cursor.close()
+    with _memo_lock:
+        _memo["body"] = (generation, body)
+    return body
+
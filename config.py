@@ -9,5 +9,61 @@ DB_USER = "root"                # <-- your MySQL username
 DB_PASSWORD = "admin"   # <-- your MySQL password
 DB_NAME = "placementmis"       # <-- database name (will be created automatically)
 
+# Connection pool (per worker process)
+DB_POOL_ENABLED = True
+DB_POOL_SIZE = 10                  # max connections checked out at once
+DB_POOL_CHECKOUT_TIMEOUT = 10      # seconds to wait for a free connection
+DB_POOL_MAX_IDLE_SECONDS = 300     # idle connections older than this are closed
+DB_POOL_PING_INTERVAL = 30         # ping idle connections older than this before reuse
+
+# Student upload: staging-table bulk load (used for sheets of at least MIN_ROWS)
+UPLOAD_BULK_LOAD = True
+UPLOAD_BULK_MIN_ROWS = 500
+UPLOAD_BULK_PACKET_FILL = 0.5      # fraction of max_allowed_packet per INSERT batch
+UPLOAD_BULK_MIN_BATCH = 100
+UPLOAD_BULK_MAX_BATCH = 20000
+
+# Upload versions: store a full checkpoint every N versions, deltas in between
+VERSION_CHECKPOINT_INTERVAL = 10
+VERSION_ARCHIVE_ENABLED = True     # move versions older than the latest checkpoint to archives/
+
+# Analytics: cold builds over at least this many students use the pandas backend
+ANALYTICS_COLUMNAR_MIN_ROWS = 2000
+# Per-worker analytics copy: seconds between generation-counter checks (0 = every request)
+ANALYTICS_GENERATION_CHECK_SECONDS = 0
+ANALYTICS_ASYNC_RECOMPUTE = False      # rebuild in a background thread right after invalidation
+ANALYTICS_RECOMPUTE_WAIT_SECONDS = 30  # max wait for another worker's rebuild when nothing is cached
+# Filtered (department / course / placed-date) analytics segments, LRU-evicted
+ANALYTICS_SEGMENT_DB_MAX = 200
+ANALYTICS_SEGMENT_MEMORY_MAX = 50
+ANALYTICS_SEGMENT_TOUCH_SECONDS = 60   # how often a memory hit refreshes last_used_at
+
+# Student listing: rows embedded in the /students page, and the /api/students page cap
+STUDENTS_FIRST_PAGE_SIZE = 500
+STUDENTS_API_MAX_LIMIT = 1000
+STUDENTS_EXPORT_BATCH = 1000       # rows per fetchmany() while streaming /api/students/export
+STUDENTS_FILTER_VALUES_MAX = 5000  # distinct values listed in one column filter panel
+
+# Search: ngram FULLTEXT index on students (falls back to LIKE when missing)
+SEARCH_FULLTEXT_ENABLED = True
+SEARCH_FUZZY_MIN_LENGTH = 3        # shortest query that also gets typo-tolerant matches
+# Global search: sources queried in parallel, answers cached briefly per query
+SEARCH_WORKERS = 4
+SEARCH_CACHE_TTL_SECONDS = 15
+SEARCH_CACHE_MAX_ENTRIES = 256
+
+# Audit history: edit_log / cdm_edit_log page cap and cached total-count lifetime
+EDIT_LOG_MAX_LIMIT = 10000
+EDIT_LOG_COUNT_TTL_SECONDS = 300
+EDIT_LOG_COUNT_OVERLAP = 1000      # newest log ids recounted on every call (may still commit out of order)
+
+# Batch student edits (PUT /api/students/batch-update)
+STUDENT_BATCH_EDIT_MAX = 5000       # edits accepted per request
+STUDENT_BATCH_EDIT_CHUNK = 500      # students per UPDATE ... CASE statement
+
+# Recruitment listing cache (drive_listing.py)
+CDM_LISTING_CHANGES_KEEP = 5000     # generations of drive change records kept
+CDM_LISTING_REFRESH_MAX = 500       # more changed drives than this → full reload
+
 # Flask
 SECRET_KEY = os.urandom(24)
@@ -0,0 +1,218 @@
+# drive_listing.py — Drive / recruiter listings for /recruitment and /api/cdm, cached per worker
+import threading
+
+import config
+from helpers import bump_data_generation, normalize_rows
+
+# Every CDM write goes through note_cdm_change(), which bumps the "cdm" data
+# generation and, when the write only touched known drives, records them in
+# cdm_listing_changes under the new generation. Workers keep the listing in
+# memory; when the generation moved they re-read just the recorded drives
+# (and their recruiters). A generation without records — imports, recruiter
+# edits, wipes — means a full reload. drive_id 0 records a write that leaves
+# the listing as it was (HR contacts, rounds).
+LISTING_UNAFFECTED = 0
+
+_COURSE_LABEL = (
+    "CONCAT(dc.course_name, IF(dc.drive_type IS NULL OR dc.drive_type = '', '', "
+    "CONCAT(' (', dc.drive_type, ')')))"
+)
+DRIVE_SUMMARY_SELECT = f"""
+    SELECT d.drive_id, d.company_id, c.company_name, d.role, d.ctc_text,
+           d.jd_received_date, d.process_date, d.data_shared,
+           d.location, d.notes, d.status,
+           d.jd_briefing_done, d.jd_briefing_date, d.jd_briefing_conducted_by,
+           c.received_by, c.secondary_coordinator,
+           (SELECT GROUP_CONCAT({_COURSE_LABEL} SEPARATOR ', ')
+              FROM drive_courses dc WHERE dc.drive_id = d.drive_id) AS courses
+"""
+DRIVE_COUNT_SELECT = """,
+           (SELECT COUNT(*) FROM drive_students s WHERE s.drive_id = d.drive_id) AS student_count,
+           (SELECT COUNT(*) FROM drive_rounds r WHERE r.drive_id = d.drive_id) AS round_count
+"""
+
+_listing = {}               # "state" → {generation, drives, companies, drive_list, company_list}
+_listing_lock = threading.Lock()
+
+
+def _marks(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _value(row, key, index=0):
+    return row[key] if isinstance(row, dict) else row[index]
+
+
+# ── Loaders ──────────────────────────────────────────────────────────────────
+def load_drive_summaries(cursor, company_id=None, drive_ids=None, with_counts=False,
+                         yes_no=("data_shared", "jd_briefing_done")):
+    """Drives newest first with company columns and a ``courses`` label.
+
+    One query: courses are folded in with GROUP_CONCAT and, when
+    ``with_counts``, student and round counts come from indexed
+    subqueries. ``company_id`` / ``drive_ids`` narrow it down; ``yes_no``
+    columns are rendered as "Yes" / "No". ``cursor`` must be a dictionary
+    cursor.
+    """
+    clauses, params = [], []
+    if company_id is not None:
+        clauses.append("d.company_id = %s")
+        params.append(company_id)
+    if drive_ids is not None:
+        if not drive_ids:
+            return []
+        clauses.append(f"d.drive_id IN ({_marks(drive_ids)})")
+        params.extend(drive_ids)
+    where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    cursor.execute("SET SESSION group_concat_max_len = 65535")
+    cursor.execute(
+        DRIVE_SUMMARY_SELECT + (DRIVE_COUNT_SELECT if with_counts else "")
+        + f"FROM company_drives d JOIN companies c ON d.company_id = c.company_id"
+        f"{where} ORDER BY d.drive_id DESC",
+        params,
+    )
+    drives = normalize_rows(cursor.fetchall())
+    for d in drives:
+        d["courses"] = d.get("courses") or ""
+        for col in yes_no:
+            d[col] = "Yes" if d.get(col) else "No"
+    return drives
+
+
+def load_company_summaries(cursor, company_ids=None):
+    """Recruiters with drive count, latest process date and participants.
+
+    Drive and participant figures are aggregated per company in derived
+    tables, so drive_students is never fanned out across every drive row.
+    """
+    scope, inner, params = "", "", []
+    if company_ids is not None:
+        if not company_ids:
+            return []
+        marks = _marks(company_ids)
+        scope = f" WHERE c.company_id IN ({marks})"
+        inner = f" WHERE d.company_id IN ({marks})"
+        params = list(company_ids) * 3
+    cursor.execute(
+        "SELECT c.company_id, c.company_name, c.received_by, c.secondary_coordinator, "
+        "       COALESCE(dg.drive_count, 0) AS drive_count, dg.latest_process_date, "
+        "       COALESCE(pg.participants_count, 0) AS participants_count "
+        "FROM companies c "
+        "LEFT JOIN (SELECT d.company_id, COUNT(*) AS drive_count, MAX(d.process_date) AS latest_process_date "
+        f"           FROM company_drives d{inner} GROUP BY d.company_id) dg "
+        "       ON dg.company_id = c.company_id "
+        "LEFT JOIN (SELECT d.company_id, COUNT(DISTINCT ds.reg_no) AS participants_count "
+        "           FROM drive_students ds JOIN company_drives d ON d.drive_id = ds.drive_id"
+        f"{inner} GROUP BY d.company_id) pg "
+        "       ON pg.company_id = c.company_id"
+        f"{scope} ORDER BY latest_process_date DESC, c.company_id DESC",
+        params,
+    )
+    return normalize_rows(cursor.fetchall())
+
+
+# ── Change tracking ──────────────────────────────────────────────────────────
+def _cdm_generation(cursor):
+    cursor.execute("SELECT generation FROM data_generations WHERE name = 'cdm'")
+    row = cursor.fetchone()
+    return _value(row, "generation") if row else 0
+
+
+def note_cdm_change(cursor, drive_ids=None):
+    """Bump the "cdm" generation for a write the caller is about to commit.
+
+    ``drive_ids`` are the drives whose listing rows the write changed
+    (``[]`` when it changed none); leave it None when the write may affect
+    any drive or recruiter.
+    """
+    bump_data_generation(cursor, "cdm")
+    if drive_ids is None:
+        return
+    generation = _cdm_generation(cursor)
+    ids = sorted({int(d) for d in drive_ids}) or [LISTING_UNAFFECTED]
+    cursor.execute(
+        "INSERT IGNORE INTO cdm_listing_changes (generation, drive_id) VALUES "
+        + ", ".join(["(%s, %s)"] * len(ids)),
+        [v for d in ids for v in (generation, d)],
+    )
+    if generation % 100 == 0:
+        cursor.execute(
+            "DELETE FROM cdm_listing_changes WHERE generation <= %s",
+            (generation - config.CDM_LISTING_CHANGES_KEEP,),
+        )
+
+
+# ── Cached listing ───────────────────────────────────────────────────────────
+def _company_order(company):
+    return (company.get("latest_process_date") or "", company["company_id"].lower())
+
+
+def _build_state(generation, drives, companies):
+    return {
+        "generation": generation,
+        "drives": drives,
+        "companies": companies,
+        "drive_list": [drives[i] for i in sorted(drives, reverse=True)],
+        "company_list": sorted(companies.values(), key=_company_order, reverse=True),
+    }
+
+
+def _full_state(cursor, generation):
+    drives = {d["drive_id"]: d for d in load_drive_summaries(cursor)}
+    companies = {c["company_id"]: c for c in load_company_summaries(cursor)}
+    return _build_state(generation, drives, companies)
+
+
+def _refreshed_state(cursor, cached, generation):
+    """Apply the recorded drive changes since ``cached``; None if incomplete."""
+    cursor.execute(
+        "SELECT generation, drive_id FROM cdm_listing_changes "
+        "WHERE generation > %s AND generation <= %s",
+        (cached["generation"], generation),
+    )
+    generations, drive_ids = set(), set()
+    for row in cursor.fetchall():
+        generations.add(_value(row, "generation"))
+        drive_ids.add(_value(row, "drive_id", 1))
+    if len(generations) != generation - cached["generation"]:
+        return None
+    drive_ids.discard(LISTING_UNAFFECTED)
+    if len(drive_ids) > config.CDM_LISTING_REFRESH_MAX:
+        return None
+
+    drives, companies = dict(cached["drives"]), dict(cached["companies"])
+    if drive_ids:
+        ids = sorted(drive_ids)
+        fresh = {d["drive_id"]: d for d in load_drive_summaries(cursor, drive_ids=ids)}
+        touched = {drives[i]["company_id"] for i in ids if i in drives}
+        touched.update(d["company_id"] for d in fresh.values())
+        for i in ids:
+            drives.pop(i, None)
+        drives.update(fresh)
+        for company in load_company_summaries(cursor, sorted(touched)):
+            companies[company["company_id"]] = company
+    return _build_state(generation, drives, companies)
+
+
+def load_drive_listing(cursor):
+    """``(drives, companies)`` for the recruitment page, as of the cdm generation.
+
+    The lists are shared with other requests of this worker: read, don't
+    modify. ``cursor`` must be a dictionary cursor on a fresh transaction.
+    """
+    generation = _cdm_generation(cursor)
+    with _listing_lock:
+        cached = _listing.get("state")
+    if cached and cached["generation"] == generation:
+        return cached["drive_list"], cached["company_list"]
+
+    state = None
+    if cached and cached["generation"] < generation:
+        state = _refreshed_state(cursor, cached, generation)
+    if state is None:
+        state = _full_state(cursor, generation)
+    with _listing_lock:
+        current = _listing.get("state")
+        if current is None or current["generation"] <= generation:
+            _listing["state"] = state
+    return state["drive_list"], state["company_list"]
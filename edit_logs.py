@@ -0,0 +1,154 @@
+# edit_logs.py — Keyset-paged reads of edit_log / cdm_edit_log
+import base64
+import binascii
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import config
+
+# table → the column a caller may scope the log to (?reg_no= / ?drive_id=)
+LOG_SCOPES = {"edit_log": "reg_no", "cdm_edit_log": "drive_id"}
+
+# (table, filter key) → (count, max_id, counted_at)
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+def encode_log_cursor(row):
+    changed_at = row["changed_at"]
+    payload = [changed_at.strftime("%Y-%m-%d %H:%M:%S") if changed_at else None, row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_log_cursor(token):
+    try:
+        changed_at, row_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return changed_at, int(row_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+
+def _parse_day(value, name):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD")
+
+
+def parse_log_args(args, table):
+    """Read limit / after / field / from / to / scope args (ValueError if bad)."""
+    scope_column = LOG_SCOPES[table]
+    scope = args.get(scope_column, type=int) if scope_column == "drive_id" else args.get(scope_column)
+    date_from = args.get("from")
+    date_to = args.get("to")
+    after = args.get("after")
+    return {
+        "limit": max(1, min(args.get("limit", 200, type=int), config.EDIT_LOG_MAX_LIMIT)),
+        "page": args.get("page", type=int),
+        "after": decode_log_cursor(after) if after else None,
+        "filters": {
+            scope_column: scope or None,
+            "field_name": (args.get("field") or "").strip() or None,
+            "from": _parse_day(date_from, "from") if date_from else None,
+            "to": _parse_day(date_to, "to") + timedelta(days=1) if date_to else None,
+        },
+    }
+
+
+def _filter_clause(filters):
+    clauses, params = [], []
+    for col in ("reg_no", "drive_id", "field_name"):
+        if filters.get(col) is not None:
+            clauses.append(f"{col} = %s")
+            params.append(filters[col])
+    if filters.get("from"):
+        clauses.append("changed_at >= %s")
+        params.append(filters["from"])
+    if filters.get("to"):
+        clauses.append("changed_at < %s")
+        params.append(filters["to"])
+    return clauses, params
+
+
+def _where(clauses):
+    return (" WHERE " + " AND ".join(clauses)) if clauses else ""
+
+
+def count_log_rows(cursor, table, filters):
+    """Row count for the filters, kept per worker and topped up by id.
+
+    Log rows are only appended (or purged wholesale), but ids are handed
+    out at insert, so a row can commit after a higher id was already
+    counted. The cache therefore only settles rows at least
+    EDIT_LOG_COUNT_OVERLAP ids below the max and recounts the newer ones on
+    every call. A writer lagging further behind than that, or a purge, can
+    still skew the total until the full COUNT(*) reruns, which happens after
+    EDIT_LOG_COUNT_TTL_SECONDS or when the max id went backwards.
+    """
+    clauses, params = _filter_clause(filters)
+    key = (table, tuple(sorted((k, str(v)) for k, v in filters.items() if v is not None)))
+    cursor.execute(f"SELECT MAX(id) AS max_id FROM {table}")
+    max_id = cursor.fetchone()["max_id"] or 0
+    settle_to = max(max_id - config.EDIT_LOG_COUNT_OVERLAP, 0)
+    with _count_lock:
+        cached = _count_cache.get(key)
+    now = time.monotonic()
+    if cached and cached[1] <= max_id and now - cached[2] < config.EDIT_LOG_COUNT_TTL_SECONDS:
+        settled, settled_to, counted_at = cached
+    else:
+        cursor.execute(
+            f"SELECT COUNT(*) AS cnt FROM {table}{_where(clauses + ['id <= %s'])}",
+            params + [settle_to],
+        )
+        settled, settled_to, counted_at = cursor.fetchone()["cnt"], settle_to, now
+    settle_to = max(settle_to, settled_to)
+    cursor.execute(
+        f"SELECT COUNT(*) AS cnt, COALESCE(SUM(id <= %s), 0) AS settling "
+        f"FROM {table}{_where(clauses + ['id > %s'])}",
+        [settle_to] + params + [settled_to],
+    )
+    row = cursor.fetchone()
+    count = settled + row["cnt"]
+    with _count_lock:
+        _count_cache[key] = (settled + int(row["settling"]), settle_to, counted_at)
+    return count
+
+
+def fetch_log_page(cursor, table, limit, filters, after=None, page=None):
+    """One page of log rows, newest first, on a dictionary cursor.
+
+    Pages follow ``after`` (the previous page's next_cursor) on
+    (changed_at, id); the old ``page`` number still works through OFFSET.
+    Returns ``{data, next_cursor, has_more, total_count}``.
+    """
+    clauses, params = _filter_clause(filters)
+    if after is not None:
+        changed_at, row_id = after
+        if changed_at is None:
+            clauses.append("(changed_at IS NULL AND id < %s)")
+            params.append(row_id)
+        else:
+            clauses.append("(changed_at < %s OR (changed_at = %s AND id < %s) OR changed_at IS NULL)")
+            params.extend([changed_at, changed_at, row_id])
+    sql = f"SELECT * FROM {table}{_where(clauses)} ORDER BY changed_at DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+    if after is None and page and page > 1:
+        sql += " OFFSET %s"
+        params.append((page - 1) * limit)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_log_cursor(rows[-1]) if has_more else None
+    for r in rows:
+        if r.get("changed_at"):
+            r["changed_at"] = r["changed_at"].strftime("%d %B %Y, %I:%M %p")
+    return {
+        "data": rows,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "total_count": count_log_rows(cursor, table, filters),
+    }
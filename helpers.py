@@ -2,19 +2,26 @@
 import json
 import os
 import re
-import statistics
-from datetime import datetime, date, timedelta
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime, date
 from decimal import Decimal
 
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
 
 import config
+from analytics import AnalyticsAggregate
 
 
 # ── File upload config ───────────────────────────────────────────────────────
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+ARCHIVE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archives")
+os.makedirs(ARCHIVE_FOLDER, exist_ok=True)
 
 # ── Excel headers (exact order & spelling expected in uploaded file) ──────────
 EXPECTED_HEADERS = [
@@ -92,6 +99,22 @@ DISPLAY_COLUMNS = [
 # Columns that are editable via inline editing (placed_date is auto-managed)
 EDITABLE_COLUMNS = set(DB_COLUMNS) - {"sr_no", "reg_no", "placed_date"}
 
+# Columns covered by the per-row content fingerprint (students.row_hash)
+FINGERPRINT_COLUMNS = [c for c in DB_COLUMNS if c != "reg_no"]
+
+# Columns of the ngram FULLTEXT search index (MATCH() must list exactly these)
+STUDENT_SEARCH_COLUMNS = ["student_name", "reg_no", "course", "company_name"]
+
+
+def row_hash_expression():
+    """SQL expression for the generated row_hash fingerprint column.
+
+    NULLs are encoded as CHAR(0) so that NULL and '' hash differently.
+    """
+    parts = ", ".join(f"IFNULL(`{c}`, CHAR(0))" for c in FINGERPRINT_COLUMNS)
+    return f"MD5(CONCAT_WS(CHAR(31), {parts}))"
+
+
 # Numeric column sets for type conversion
 NUMERIC_FLOAT_COLS = {"ctc", "percent_10", "percent_12", "graduation_ogpa"}
 NUMERIC_INT_COLS = {"backlogs"}
@@ -117,6 +140,21 @@ def to_int_or_none(v):
         return None
 
 
+def parse_ctc_value(ctc_text):
+    """First positive number in a CTC text such as '6-8 LPA' (None if none)."""
+    if not ctc_text:
+        return None
+    text = str(ctc_text).strip()
+    parts = re.split(r'\s*[-&,/]\s*', text)
+    for part in parts:
+        m = re.search(r'(\d+\.?\d*)', part)
+        if m:
+            val = float(m.group(1))
+            if val > 0:
+                return val
+    return None
+
+
 def normalize_row(row):
     """Convert Decimal values to float, date to str for JSON serialization."""
     if row is None:
@@ -137,8 +175,8 @@ def normalize_rows(rows):
 
 
 # ── Database helpers ─────────────────────────────────────────────────────────
-def get_connection():
-    """Return a MySQL connection using credentials from config.py."""
+def _open_connection():
+    """Open a brand-new MySQL connection using credentials from config.py."""
     return mysql.connector.connect(
         host=config.DB_HOST,
         port=config.DB_PORT,
@@ -150,6 +188,210 @@ def get_connection():
     )
 
 
+class PooledConnection:
+    """Thin proxy around a raw connection; close() hands it back to the pool.
+
+    A wrapper dropped without close() — an early return or an ``except
+    Error`` path — is released when it is garbage-collected, so those paths
+    cannot leak pool slots. It also works as a context manager.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        # Must not reference self, or the wrapper would never be collected
+        self._finalizer = weakref.finalize(self, pool.release, raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._finalizer()
+
+    def discard(self):
+        """Close the connection instead of pooling it.
+
+        For a connection left in an unknown protocol state, e.g. with an
+        unbuffered result still unread, where rollback() would either fail
+        or read the rest of the result first.
+        """
+        if self._finalizer.detach():
+            self._pool.discard(self._raw)
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections with health checks and metrics.
+
+    Idle connections older than ``max_idle`` seconds are evicted, connections
+    idle longer than ``ping_interval`` are pinged before reuse, and checkout
+    blocks for at most ``timeout`` seconds before raising PoolError.
+    """
+
+    def __init__(self, name, size, max_idle, timeout, ping_interval, factory=_open_connection):
+        self.name = name
+        self.size = size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._factory = factory
+        self._idle = []          # [(raw_conn, last_used_monotonic)], most recent last
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0, "created": 0, "reused": 0, "closed": 0,
+            "evicted_idle": 0, "failed_health": 0, "timeouts": 0,
+            "wait_seconds": 0.0, "max_in_use": 0,
+        }
+
+    def _discard(self, raw):
+        self._stats["closed"] += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _evict_expired(self, now):
+        """Drop idle connections past max_idle (caller holds the lock)."""
+        if not self.max_idle:
+            return []
+        keep, expired = [], []
+        for raw, last_used in self._idle:
+            (expired if now - last_used > self.max_idle else keep).append((raw, last_used))
+        self._idle = keep
+        self._stats["evicted_idle"] += len(expired)
+        return [raw for raw, _ in expired]
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            while True:
+                expired = self._evict_expired(time.monotonic())
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.size:
+                    raw, last_used = None, None
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolError(
+                        f"Connection pool '{self.name}' exhausted "
+                        f"({self.size} in use, waited {self.timeout}s)"
+                    )
+                self._cond.wait(remaining)
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds"] += time.monotonic() - started
+            self._stats["max_in_use"] = max(self._stats["max_in_use"], self._in_use)
+
+        for stale in expired:
+            self._discard(stale)
+
+        try:
+            if raw is not None and time.monotonic() - last_used > self.ping_interval:
+                if not raw.is_connected():
+                    with self._cond:
+                        self._stats["failed_health"] += 1
+                    self._discard(raw)
+                    raw = None
+            if raw is None:
+                raw = self._factory()
+                with self._cond:
+                    self._stats["created"] += 1
+            else:
+                with self._cond:
+                    self._stats["reused"] += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        """Return a connection, rolling back any open transaction first."""
+        healthy = True
+        try:
+            raw.rollback()
+        except Exception:
+            healthy = False
+        with self._cond:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+        if not healthy:
+            with self._cond:
+                self._stats["failed_health"] += 1
+            self._discard(raw)
+
+    def discard(self, raw):
+        """Give up a checked-out connection: free its slot and close it."""
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+        self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data.update({
+                "name": self.name,
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "wait_seconds": round(self._stats["wait_seconds"], 4),
+            })
+        return data
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(name="default"):
+    """Return (creating on first use) the named connection pool."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(name)
+        if pool is None:
+            pool = ConnectionPool(
+                name,
+                size=config.DB_POOL_SIZE,
+                max_idle=config.DB_POOL_MAX_IDLE_SECONDS,
+                timeout=config.DB_POOL_CHECKOUT_TIMEOUT,
+                ping_interval=config.DB_POOL_PING_INTERVAL,
+            )
+            _POOLS[name] = pool
+        return pool
+
+
+def get_pool_stats():
+    """Return metrics for every pool created in this worker."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    return {p.name: p.stats() for p in pools}
+
+
+def get_connection():
+    """Return a MySQL connection (pooled unless DB_POOL_ENABLED is off).
+
+    Callers use it exactly like a raw connection: ``conn.close()`` returns
+    it to the pool instead of tearing down the socket.
+    """
+    if not config.DB_POOL_ENABLED:
+        return _open_connection()
+    return get_pool().acquire()
+
+
 def init_db():
     """Create the database and required tables if they don't exist."""
     conn = mysql.connector.connect(
@@ -278,6 +520,16 @@ def init_db():
             INDEX idx_cdm_time (changed_at)
         )
     """)
+    for stmt in [
+        "CREATE INDEX idx_log_reg_time ON edit_log(reg_no, changed_at)",
+        "CREATE INDEX idx_log_field_time ON edit_log(field_name, changed_at)",
+        "CREATE INDEX idx_cdm_drive_time ON cdm_edit_log(drive_id, changed_at)",
+        "CREATE INDEX idx_cdm_field_time ON cdm_edit_log(field_name, changed_at)",
+    ]:
+        try:
+            cursor.execute(stmt)
+        except Error:
+            pass
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS analytics_cache (
             id          INT PRIMARY KEY,
@@ -287,6 +539,57 @@ def init_db():
     """)
     cursor.execute("INSERT IGNORE INTO analytics_cache (id, data, updated_at) VALUES (1, NULL, NOW())")
     conn.commit()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cdm_analytics_cache (
+            id          INT PRIMARY KEY,
+            generation  BIGINT NOT NULL DEFAULT 0,
+            data        LONGTEXT,
+            updated_at  DATETIME
+        )
+    """)
+    cursor.execute(
+        "INSERT IGNORE INTO cdm_analytics_cache (id, generation, data, updated_at) VALUES (1, 0, NULL, NOW())"
+    )
+    conn.commit()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS analytics_segments (
+            segment_key   VARCHAR(191) PRIMARY KEY,
+            kind          VARCHAR(20) NOT NULL,
+            value         VARCHAR(180) NOT NULL,
+            data          JSON,
+            state         JSON,
+            generation    BIGINT NOT NULL DEFAULT 0,
+            updated_at    DATETIME,
+            last_used_at  DATETIME,
+            INDEX idx_seg_kind (kind),
+            INDEX idx_seg_used (last_used_at)
+        )
+    """)
+    conn.commit()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_generations (
+            name          VARCHAR(32) PRIMARY KEY,
+            generation    BIGINT NOT NULL DEFAULT 0,
+            updated_at    DATETIME NOT NULL
+        )
+    """)
+    for name in DATA_GENERATIONS:
+        cursor.execute(
+            "INSERT IGNORE INTO data_generations (name, generation, updated_at) "
+            "VALUES (%s, 1, UTC_TIMESTAMP())",
+            (name,),
+        )
+    conn.commit()
+    for stmt in [
+        "ALTER TABLE analytics_cache ADD COLUMN state JSON NULL",
+        "ALTER TABLE analytics_cache ADD COLUMN generation BIGINT NOT NULL DEFAULT 0",
+        "ALTER TABLE analytics_cache ADD COLUMN stale TINYINT(1) NOT NULL DEFAULT 0",
+    ]:
+        try:
+            cursor.execute(stmt)
+            conn.commit()
+        except Error:
+            pass
 
     # ── Add content_hash column to upload_versions (idempotent) ──────
     try:
@@ -301,6 +604,21 @@ def init_db():
     except Error:
         pass
 
+    # ── Delta-encoded version storage columns (idempotent) ───────────
+    for stmt in [
+        "ALTER TABLE upload_versions ADD COLUMN storage VARCHAR(12) NOT NULL DEFAULT 'full'",
+        "ALTER TABLE version_snapshots ADD COLUMN change_type CHAR(1) NOT NULL DEFAULT 'F'",
+        "ALTER TABLE version_snapshots ADD COLUMN row_hash CHAR(32) NULL",
+        "CREATE INDEX idx_snap_version_reg ON version_snapshots(version_id, reg_no)",
+        "ALTER TABLE upload_versions ADD COLUMN archive_path VARCHAR(255) NULL",
+        "ALTER TABLE upload_versions ADD COLUMN students_digest VARCHAR(48) NULL",
+    ]:
+        try:
+            cursor.execute(stmt)
+        except Error:
+            pass
+    conn.commit()
+
     # ── Migrate numeric columns (safe, idempotent) ───────────────────
     try:
         cursor.execute(
@@ -344,6 +662,9 @@ def init_db():
         "CREATE INDEX idx_seeking ON students(seeking_placement)",
         "CREATE INDEX idx_course ON students(course)",
         "CREATE INDEX idx_department ON students(department)",
+        "CREATE INDEX idx_sr_no ON students(sr_no)",
+        "CREATE INDEX idx_student_name ON students(student_name)",
+        "CREATE INDEX idx_ctc ON students(ctc)",
     ]:
         try:
             cursor.execute(stmt)
@@ -376,6 +697,33 @@ def init_db():
     except Error:
         pass
 
+    # ── ngram FULLTEXT index for search (idempotent) ─────────────────
+    # Stopwords are off for the build so two-letter grams like "in" stay indexed
+    try:
+        cursor.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+        cursor.execute(
+            f"CREATE FULLTEXT INDEX ft_students_search ON students"
+            f"({', '.join(STUDENT_SEARCH_COLUMNS)}) WITH PARSER ngram"
+        )
+    except Error:
+        pass
+
+    # ── Content fingerprint maintained by MySQL on every write (idempotent) ──
+    try:
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'students' AND COLUMN_NAME = 'row_hash'",
+            (config.DB_NAME,)
+        )
+        if not cursor.fetchone():
+            cursor.execute(
+                f"ALTER TABLE students ADD COLUMN row_hash CHAR(32) "
+                f"AS ({row_hash_expression()}) STORED"
+            )
+            conn.commit()
+    except Error:
+        pass
+
     # ── CDM tables ───────────────────────────────────────────────────
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS companies (
@@ -386,6 +734,19 @@ def init_db():
             notes TEXT NULL
         )
     """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS company_id_counters (
+            prefix       VARCHAR(10) PRIMARY KEY,
+            next_suffix  INT NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cdm_listing_changes (
+            generation   BIGINT NOT NULL,
+            drive_id     INT NOT NULL,
+            PRIMARY KEY (generation, drive_id)
+        )
+    """)
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS company_drives (
             drive_id          INT AUTO_INCREMENT PRIMARY KEY,
@@ -581,46 +942,500 @@ def init_db():
     conn.close()
 
 
+# ── Data generation counters ─────────────────────────────────────────────────
+# One counter per dataset, bumped inside every write transaction that touches
+# it; read-only endpoints derive ETag / Last-Modified from them.
+#   students — the students table
+#   cdm      — companies, drives, HR contacts, rounds and drive_students
+DATA_GENERATIONS = ("students", "cdm")
+
+
+def bump_data_generation(cursor, *names):
+    """Advance the named dataset counters (call before the writer commits)."""
+    for name in names:
+        cursor.execute(
+            "INSERT INTO data_generations (name, generation, updated_at) "
+            "VALUES (%s, 1, UTC_TIMESTAMP()) "
+            "ON DUPLICATE KEY UPDATE generation = generation + 1, updated_at = UTC_TIMESTAMP()",
+            (name,),
+        )
+
+
+def read_data_generations(names):
+    """Return ``{name: (generation, updated_at)}`` for the named datasets."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT name, generation, updated_at FROM data_generations "
+            f"WHERE name IN ({', '.join(['%s'] * len(names))})",
+            tuple(names),
+        )
+        found = {name: (generation, updated_at) for name, generation, updated_at in cursor.fetchall()}
+        cursor.close()
+    finally:
+        conn.close()
+    return {name: found.get(name, (0, None)) for name in names}
+
+
 # ── Analytics cache helpers ──────────────────────────────────────────────────
+# Per-worker copy of analytics_cache.data:
+#   (generation, analytics, stale, checked_at).
+# Every write to analytics_cache bumps its generation counter, so a worker
+# only re-reads and re-parses the blob when the counter has moved.
+_analytics_memo = (None, None, False, 0.0)
+ANALYTICS_LOCK_NAME = f"{config.DB_NAME}.analytics_recompute"
+
+
+def _remember_analytics(generation, analytics, stale=False):
+    global _analytics_memo
+    _analytics_memo = (generation, analytics, stale, time.monotonic())
+
+
+def _read_analytics_generation(cursor):
+    """Return the generation just written by an UPDATE on analytics_cache."""
+    cursor.execute("SELECT generation FROM analytics_cache WHERE id = 1")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _with_stale_flag(analytics, stale):
+    return dict(analytics, _stale=True) if stale else analytics
+
+
 def get_cached_analytics():
-    """Return cached analytics dict, or None if cache is empty/stale."""
+    """Return cached analytics dict, or None if the cache is empty.
+
+    Served from this worker's memory while analytics_cache.generation is
+    unchanged (checked at most every ANALYTICS_GENERATION_CHECK_SECONDS).
+    After an invalidation the last known-good numbers are still returned,
+    marked with ``_stale: True`` until a recompute lands.
+    """
+    generation, analytics, stale, checked_at = _analytics_memo
+    now = time.monotonic()
+    if analytics is not None and now - checked_at < config.ANALYTICS_GENERATION_CHECK_SECONDS:
+        return _with_stale_flag(analytics, stale)
     try:
         conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT data FROM analytics_cache WHERE id = 1")
+        cursor = conn.cursor()
+        cursor.execute("SELECT generation, stale FROM analytics_cache WHERE id = 1")
         row = cursor.fetchone()
+        current, current_stale = row if row else (None, False)
+        if analytics is not None and current == generation:
+            cursor.close()
+            conn.close()
+            _remember_analytics(generation, analytics, bool(current_stale))
+            return _with_stale_flag(analytics, current_stale)
+        cursor.execute("SELECT data, state, generation, stale FROM analytics_cache WHERE id = 1")
+        row = cursor.fetchone()
+        data, state, generation, stale = row if row else (None, None, None, False)
+        if not data and state:
+            # Deltas were folded into the state since the last read
+            analytics = AnalyticsAggregate(_load_json(state)).finalize()
+            data = json.dumps(analytics)
+            cursor.execute(
+                "UPDATE analytics_cache SET data = %s "
+                "WHERE id = 1 AND generation = %s AND data IS NULL",
+                (data, generation),
+            )
+            conn.commit()
         cursor.close()
         conn.close()
-        if row and row["data"]:
-            d = row["data"]
-            return json.loads(d) if isinstance(d, str) else d
+        if data:
+            analytics = _load_json(data)
+            _remember_analytics(generation, analytics, bool(stale))
+            return _with_stale_flag(analytics, stale)
     except Error:
         pass
     return None
 
 
-def save_analytics_cache(analytics):
-    """Save a precomputed analytics dict to cache."""
+def save_analytics_cache(analytics, state=None, expected_generation=None):
+    """Save a precomputed analytics dict (and its aggregate state) to cache.
+
+    With ``expected_generation`` the write only lands if nothing touched the
+    cache since that generation was read (a rebuild that raced a write is
+    dropped and the cache stays stale). Returns True if it was saved.
+    """
+    analytics = {k: v for k, v in analytics.items() if k != "_stale"}
+    sql = (
+        "UPDATE analytics_cache SET data = %s, state = %s, stale = 0, "
+        "generation = generation + 1, updated_at = NOW() WHERE id = 1"
+    )
+    params = [json.dumps(analytics), json.dumps(state) if state is not None else None]
+    if expected_generation is not None:
+        sql += " AND generation = %s"
+        params.append(expected_generation)
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        saved = cursor.rowcount > 0
+        generation = _read_analytics_generation(cursor)
+        conn.commit()
+        cursor.close()
+        conn.close()
+        if saved:
+            _remember_analytics(generation, analytics)
+        return saved
+    except Error:
+        return False
+
+
+def invalidate_analytics_cache():
+    """Mark analytics stale and drop the aggregate state so it is rebuilt.
+
+    The last computed numbers stay in place (flagged stale) so readers keep
+    something to show while one worker recomputes. With
+    ANALYTICS_ASYNC_RECOMPUTE the rebuild starts right away in the
+    background instead of on the next read.
+    """
+    global _analytics_memo
+    _analytics_memo = (None, None, False, 0.0)
     try:
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute(
-            "UPDATE analytics_cache SET data = %s, updated_at = NOW() WHERE id = 1",
-            (json.dumps(analytics),),
+            "UPDATE analytics_cache SET state = NULL, stale = 1, "
+            "generation = generation + 1, updated_at = NOW() WHERE id = 1"
         )
         conn.commit()
         cursor.close()
         conn.close()
+    except Error:
+        return
+    invalidate_analytics_segments()
+    if config.ANALYTICS_ASYNC_RECOMPUTE:
+        threading.Thread(target=_recompute_quietly, name="analytics-recompute", daemon=True).start()
+
+
+def _load_json(value):
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+
+def recompute_analytics(wait=0):
+    """Rebuild analytics under a MySQL named lock (single flight).
+
+    Returns the fresh analytics, or None when another worker already holds
+    the lock and it did not come free within ``wait`` seconds.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (ANALYTICS_LOCK_NAME, wait))
+        if cursor.fetchone()[0] != 1:
+            return None
+        try:
+            # Someone may have finished a rebuild while we waited for the lock
+            cursor.execute("SELECT data, state, stale, generation FROM analytics_cache WHERE id = 1")
+            row = cursor.fetchone()
+            data, state, stale, generation = row if row else (None, None, True, None)
+            if data and not stale:
+                return _load_json(data)
+            if state:
+                aggregate = AnalyticsAggregate(_load_json(state))
+            else:
+                cursor.execute(f"SELECT {', '.join(ANALYTICS_COLUMNS)} FROM students")
+                aggregate = AnalyticsAggregate.from_records(cursor.fetchall(), ANALYTICS_COLUMNS)
+            analytics = aggregate.finalize()
+            save_analytics_cache(analytics, aggregate.state, expected_generation=generation)
+            return analytics
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (ANALYTICS_LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _recompute_quietly():
+    try:
+        recompute_analytics(wait=config.ANALYTICS_RECOMPUTE_WAIT_SECONDS)
     except Error:
         pass
 
 
-def invalidate_analytics_cache():
-    """Mark analytics cache as stale so next request recomputes."""
+def load_analytics():
+    """Return current dashboard analytics.
+
+    Fresh numbers come from the in-process tier / analytics_cache.data. On a
+    miss or after an invalidation exactly one worker rebuilds (from the
+    aggregate state if present, otherwise by scanning students); everyone
+    else gets the last known-good numbers marked ``_stale``, or waits for
+    the rebuild if there is nothing cached at all.
+    """
+    cached = get_cached_analytics()
+    if cached is not None and not cached.get("_stale"):
+        return cached
+    fresh = recompute_analytics(wait=0)
+    if fresh is not None:
+        return fresh
+    if cached is not None:
+        return cached
+    fresh = recompute_analytics(wait=config.ANALYTICS_RECOMPUTE_WAIT_SECONDS)
+    return fresh if fresh is not None else (get_cached_analytics() or {})
+
+
+def apply_analytics_deltas(conn, pairs):
+    """Fold ``(old_row, new_row)`` student changes into the aggregate state.
+
+    Runs inside the caller's transaction on ``conn``, after the student
+    writes and before commit, so the rows and the aggregates change
+    atomically. The analytics_cache row lock serialises concurrent writers;
+    only the state is rewritten under it and ``data`` is cleared, so the
+    next read finalizes once however many edits landed in between.
+    Cached segments containing the rows are updated too. If no global
+    state exists the cache is marked stale instead: a rebuild may be
+    scanning students right now and miss this write, and bumping the
+    generation makes its save fail so the cache is rebuilt again.
+    """
+    pairs = [(old, new) for old, new in pairs if old or new]
+    if not pairs:
+        return
+    cursor = conn.cursor()
+    cursor.execute("SELECT state FROM analytics_cache WHERE id = 1 FOR UPDATE")
+    row = cursor.fetchone()
+    if row and row[0]:
+        aggregate = AnalyticsAggregate(_load_json(row[0]))
+        for old, new in pairs:
+            aggregate.apply_delta(old, new)
+        cursor.execute(
+            "UPDATE analytics_cache SET data = NULL, state = %s, "
+            "generation = generation + 1, updated_at = NOW() WHERE id = 1",
+            (json.dumps(aggregate.state),),
+        )
+    else:
+        cursor.execute(
+            "UPDATE analytics_cache SET stale = 1, generation = generation + 1 WHERE id = 1"
+        )
+    _apply_segment_deltas(cursor, pairs)
+    cursor.close()
+
+
+# ── Analytics segments ───────────────────────────────────────────────────────
+# Keyed analytics for filtered dashboards, one row per segment in
+# analytics_segments. Keys are "<kind>:<value>":
+#   department:<name>              students of one department
+#   course:<name>                  students of one course
+#   placed:<YYYY-MM-DD>..<YYYY-MM-DD>  students placed within a date window
+# Segments are built on first use, kept up to date from the same row deltas
+# as the global analytics, and evicted least-recently-used beyond
+# ANALYTICS_SEGMENT_DB_MAX rows (ANALYTICS_SEGMENT_MEMORY_MAX per worker).
+SEGMENT_KINDS = ("department", "course", "placed")
+_segment_memo = OrderedDict()   # key → (generation, analytics, touched_at)
+_segment_memo_lock = threading.Lock()
+
+
+def segment_key(kind, value):
+    """Build a segment key, or None if the filter is not supported."""
+    if kind not in SEGMENT_KINDS or not value:
+        return None
+    if kind == "placed":
+        start, _, end = str(value).partition("..")
+        try:
+            start = datetime.strptime(start, "%Y-%m-%d").strftime("%Y-%m-%d")
+            end = datetime.strptime(end, "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+        value = f"{start}..{end}"
+    return f"{kind}:{str(value)[:180]}"
+
+
+def _segment_filter(key):
+    """SQL WHERE clause + params selecting the students in a segment."""
+    kind, _, value = key.partition(":")
+    if kind == "placed":
+        start, end = value.split("..")
+        return "status = 'Placed' AND placed_date BETWEEN %s AND %s", [start, end]
+    default = "Unknown"
+    if value == default:
+        return f"({kind} IS NULL OR {kind} = '' OR {kind} = %s)", [default]
+    return f"{kind} = %s", [value]
+
+
+def _segment_matches(key, row):
+    """Python mirror of _segment_filter for one student row dict."""
+    if not row:
+        return False
+    kind, _, value = key.partition(":")
+    if kind == "placed":
+        start, end = value.split("..")
+        day = row.get("placed_date")
+        day = day.strftime("%Y-%m-%d") if isinstance(day, date) else (str(day)[:10] if day else None)
+        return row.get("status") == "Placed" and bool(day) and start <= day <= end
+    return (row.get(kind) or "Unknown") == value
+
+
+def _remember_segment(key, generation, analytics):
+    with _segment_memo_lock:
+        _segment_memo[key] = (generation, analytics, time.monotonic())
+        _segment_memo.move_to_end(key)
+        while len(_segment_memo) > config.ANALYTICS_SEGMENT_MEMORY_MAX:
+            _segment_memo.popitem(last=False)
+
+
+def load_segment_analytics(key):
+    """Return analytics for one segment, building and caching it on a miss."""
+    with _segment_memo_lock:
+        memo = _segment_memo.get(key)
+        if memo:
+            _segment_memo.move_to_end(key)
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT generation FROM analytics_segments WHERE segment_key = %s", (key,)
+        )
+        row = cursor.fetchone()
+        if memo and row and row[0] == memo[0]:
+            if time.monotonic() - memo[2] > config.ANALYTICS_SEGMENT_TOUCH_SECONDS:
+                cursor.execute(
+                    "UPDATE analytics_segments SET last_used_at = NOW() WHERE segment_key = %s",
+                    (key,),
+                )
+                conn.commit()
+                _remember_segment(key, memo[0], memo[1])
+            return memo[1]
+        if row:
+            cursor.execute(
+                "SELECT data, state, generation FROM analytics_segments WHERE segment_key = %s", (key,)
+            )
+            data, state, generation = cursor.fetchone()
+            if not data and state:
+                data = json.dumps(AnalyticsAggregate(_load_json(state)).finalize())
+                cursor.execute(
+                    "UPDATE analytics_segments SET data = %s "
+                    "WHERE segment_key = %s AND generation = %s AND data IS NULL",
+                    (data, key, generation),
+                )
+            cursor.execute(
+                "UPDATE analytics_segments SET last_used_at = NOW() WHERE segment_key = %s", (key,)
+            )
+            conn.commit()
+            if data:
+                analytics = _load_json(data)
+                _remember_segment(key, generation, analytics)
+                return analytics
+
+        # Build from a fresh snapshot; only store it if no student write
+        # (which always bumps the global generation) landed meanwhile
+        conn.commit()
+        cursor.execute("SELECT generation FROM analytics_cache WHERE id = 1")
+        snapshot_generation = cursor.fetchone()[0]
+        where, params = _segment_filter(key)
+        cursor.execute(
+            f"SELECT {', '.join(ANALYTICS_COLUMNS)} FROM students WHERE {where}", params
+        )
+        aggregate = AnalyticsAggregate.from_records(cursor.fetchall(), ANALYTICS_COLUMNS)
+        analytics = aggregate.finalize()
+        cursor.execute("SELECT generation FROM analytics_cache WHERE id = 1 FOR UPDATE")
+        if cursor.fetchone()[0] != snapshot_generation:
+            conn.rollback()
+            return analytics
+        kind, _, value = key.partition(":")
+        cursor.execute(
+            "INSERT INTO analytics_segments "
+            "(segment_key, kind, value, data, state, generation, updated_at, last_used_at) "
+            "VALUES (%s, %s, %s, %s, %s, 1, NOW(), NOW()) "
+            "ON DUPLICATE KEY UPDATE data = VALUES(data), state = VALUES(state), "
+            "generation = generation + 1, updated_at = NOW(), last_used_at = NOW()",
+            (key, kind, value, json.dumps(analytics), json.dumps(aggregate.state)),
+        )
+        cursor.execute(
+            "SELECT generation FROM analytics_segments WHERE segment_key = %s", (key,)
+        )
+        generation = cursor.fetchone()[0]
+        _evict_segments(cursor)
+        conn.commit()
+        _remember_segment(key, generation, analytics)
+        return analytics
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _evict_segments(cursor):
+    """Drop least-recently-used segments beyond ANALYTICS_SEGMENT_DB_MAX."""
+    cursor.execute(
+        "SELECT segment_key FROM analytics_segments "
+        "ORDER BY last_used_at DESC LIMIT 18446744073709551615 OFFSET %s",
+        (config.ANALYTICS_SEGMENT_DB_MAX,),
+    )
+    stale = [r[0] for r in cursor.fetchall()]
+    if stale:
+        cursor.execute(
+            f"DELETE FROM analytics_segments WHERE segment_key IN ({', '.join(['%s'] * len(stale))})",
+            stale,
+        )
+
+
+def _apply_segment_deltas(cursor, pairs):
+    """Fold row deltas into the cached segments those rows belong to.
+
+    Only segments containing an old or new row image are read and
+    rewritten; like the global cache, their ``data`` is cleared and
+    finalized by the next read. Returns the keys of the segments that changed.
+    """
+    keys = set()
+    touches_placed = False
+    for old, new in pairs:
+        for row in (old, new):
+            if row:
+                keys.add(segment_key("department", row.get("department") or "Unknown"))
+                keys.add(segment_key("course", row.get("course") or "Unknown"))
+                touches_placed = touches_placed or row.get("status") == "Placed"
+    keys.discard(None)
+    if not keys and not touches_placed:
+        return []
+    clauses, params = [], []
+    if keys:
+        clauses.append(f"segment_key IN ({', '.join(['%s'] * len(keys))})")
+        params.extend(keys)
+    if touches_placed:
+        clauses.append("kind = 'placed'")
+    cursor.execute(
+        f"SELECT segment_key, state FROM analytics_segments "
+        f"WHERE state IS NOT NULL AND ({' OR '.join(clauses)}) FOR UPDATE",
+        params,
+    )
+    updated = []
+    for key, state in cursor.fetchall():
+        aggregate = AnalyticsAggregate(_load_json(state))
+        touched = False
+        for old, new in pairs:
+            old_in, new_in = _segment_matches(key, old), _segment_matches(key, new)
+            if old_in or new_in:
+                aggregate.apply_delta(old if old_in else None, new if new_in else None)
+                touched = True
+        if not touched:
+            continue
+        cursor.execute(
+            "UPDATE analytics_segments SET data = NULL, state = %s, "
+            "generation = generation + 1, updated_at = NOW() WHERE segment_key = %s",
+            (json.dumps(aggregate.state), key),
+        )
+        updated.append(key)
+    return updated
+
+
+def invalidate_analytics_segments(keys=None):
+    """Drop cached segments (all of them when ``keys`` is None)."""
+    with _segment_memo_lock:
+        if keys is None:
+            _segment_memo.clear()
+        else:
+            for key in keys:
+                _segment_memo.pop(key, None)
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute("UPDATE analytics_cache SET data = NULL, updated_at = NOW() WHERE id = 1")
+        if keys is None:
+            cursor.execute("DELETE FROM analytics_segments")
+        elif keys:
+            cursor.execute(
+                f"DELETE FROM analytics_segments WHERE segment_key IN ({', '.join(['%s'] * len(keys))})",
+                list(keys),
+            )
         conn.commit()
         cursor.close()
         conn.close()
@@ -628,365 +1443,46 @@ def invalidate_analytics_cache():
         pass
 
 
+def fetch_student_rows(cursor, reg_nos, chunk=1000, for_update=False):
+    """Return ``{reg_no: row dict}`` (normalised) for the given students.
+
+    Works with plain and dictionary cursors; used to capture before/after
+    images of rows for apply_analytics_deltas. Before-images must be read
+    ``for_update``: a plain read is a snapshot that a concurrent writer may
+    already have superseded, and folding a stale old row into the
+    aggregates would drift them.
+    """
+    reg_nos = list(reg_nos)
+    rows = {}
+    for start in range(0, len(reg_nos), chunk):
+        part = reg_nos[start:start + chunk]
+        cursor.execute(
+            f"SELECT {', '.join(ANALYTICS_COLUMNS)} FROM students "
+            f"WHERE reg_no IN ({', '.join(['%s'] * len(part))})"
+            + (" FOR UPDATE" if for_update else ""),
+            part,
+        )
+        names = [d[0] for d in cursor.description]
+        for values in cursor.fetchall():
+            row = values if isinstance(values, dict) else dict(zip(names, values))
+            rows[row["reg_no"]] = normalize_row(row)
+    return rows
+
+
+def student_row_deltas(before, after):
+    """Pair before/after row maps from fetch_student_rows into deltas."""
+    return [(before.get(reg), after.get(reg)) for reg in set(before) | set(after)]
+
+
 # ── Analytics computation ────────────────────────────────────────────────────
-def compute_analytics(rows):
-    """Compute all analytics from a list of student dicts."""
-    total = len(rows)
-    opted_in = sum(1 for r in rows if r.get("seeking_placement") == "Opted In")
-    opted_out = sum(1 for r in rows if r.get("seeking_placement") == "Opted Out")
-    not_registered = sum(1 for r in rows if r.get("seeking_placement") == "Not Registered")
-    debarred = sum(1 for r in rows if r.get("seeking_placement") == "Debarred")
-    placed = sum(1 for r in rows if r.get("status") == "Placed")
-
-    def is_eligible(r):
-        if r.get("seeking_placement") != "Opted In":
-            return False
-        try:
-            return float(r.get("backlogs") or 0) < 3
-        except (ValueError, TypeError):
-            return True
-
-    eligible = sum(1 for r in rows if is_eligible(r))
-    ineligible = opted_in - eligible
-    placement_rate = round((placed / eligible * 100), 1) if eligible else 0
-
-    ctc_values = []
-    for r in rows:
-        if r.get("status") == "Placed" and r.get("ctc"):
-            try:
-                ctc_values.append(float(r["ctc"]))
-            except (ValueError, TypeError):
-                pass
-
-    avg_ctc = round(sum(ctc_values) / len(ctc_values), 2) if ctc_values else 0
-    median_ctc = round(statistics.median(ctc_values), 2) if ctc_values else 0
-    max_ctc = max(ctc_values) if ctc_values else 0
-    min_ctc = min(ctc_values) if ctc_values else 0
-
-    dept_stats = {}
-    for r in rows:
-        dept = r.get("department") or "Unknown"
-        if dept not in dept_stats:
-            dept_stats[dept] = {"total": 0, "placed": 0, "eligible": 0}
-        dept_stats[dept]["total"] += 1
-        if r.get("status") == "Placed":
-            dept_stats[dept]["placed"] += 1
-        if is_eligible(r):
-            dept_stats[dept]["eligible"] += 1
-    dept_sorted = sorted(dept_stats.items(), key=lambda x: x[1]["placed"], reverse=True)
-    dept_labels = [d[0] for d in dept_sorted]
-    dept_placed = [d[1]["placed"] for d in dept_sorted]
-    dept_total = [d[1]["total"] for d in dept_sorted]
-    dept_eligible = [d[1]["eligible"] for d in dept_sorted]
-
-    company_counts = {}
-    for r in rows:
-        if r.get("status") == "Placed" and r.get("company_name"):
-            c = r["company_name"]
-            company_counts[c] = company_counts.get(c, 0) + 1
-    top_companies = sorted(company_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-    company_labels = [c[0] for c in top_companies]
-    company_values = [c[1] for c in top_companies]
-
-    gender_counts = {}
-    for r in rows:
-        g = r.get("gender") or "Not Specified"
-        gender_counts[g] = gender_counts.get(g, 0) + 1
-
-    gender_placement = {}
-    for r in rows:
-        g = r.get("gender") or "Not Specified"
-        if g not in gender_placement:
-            gender_placement[g] = {"total": 0, "placed": 0}
-        gender_placement[g]["total"] += 1
-        if r.get("status") == "Placed":
-            gender_placement[g]["placed"] += 1
-
-    top_company = top_companies[0][0] if top_companies else "N/A"
-    unplaced_opted_in = sum(1 for r in rows if r.get("seeking_placement") == "Opted In" and r.get("status") != "Placed")
-
-    ctc_ranges = [
-        ("0-2", 0, 2), ("2-4", 2, 4), ("4-6", 4, 6), ("6-8", 6, 8),
-        ("8-10", 8, 10), ("10-12", 10, 12), ("12-14", 12, 14), ("14+", 14, 9999),
-    ]
-    ctc_dist_labels = [r[0] + " LPA" for r in ctc_ranges]
-    ctc_dist_values = [0] * len(ctc_ranges)
-    for v in ctc_values:
-        for i, (_, lo, hi) in enumerate(ctc_ranges):
-            if lo <= v < hi:
-                ctc_dist_values[i] += 1
-                break
-
-    dept_course_breakdown = {}
-    for r in rows:
-        dept = r.get("department") or "Unknown"
-        course = r.get("course") or "Unknown"
-        if dept not in dept_course_breakdown:
-            dept_course_breakdown[dept] = {}
-        if course not in dept_course_breakdown[dept]:
-            dept_course_breakdown[dept][course] = {"total": 0, "placed": 0, "eligible": 0}
-        dept_course_breakdown[dept][course]["total"] += 1
-        if r.get("status") == "Placed":
-            dept_course_breakdown[dept][course]["placed"] += 1
-        if is_eligible(r):
-            dept_course_breakdown[dept][course]["eligible"] += 1
-
-    course_agg = {}
-    for r in rows:
-        course = r.get("course") or "Unknown"
-        if course not in course_agg:
-            course_agg[course] = {
-                "department": r.get("department") or "Unknown",
-                "total": 0, "seeking": 0, "eligible": 0,
-                "ineligible_backlogs": 0, "has_backlogs": 0,
-                "deemed_placed": 0, "placed": 0,
-                "ctc_values": [],
-            }
-        agg = course_agg[course]
-        agg["total"] += 1
-        if r.get("seeking_placement") == "Opted In":
-            agg["seeking"] += 1
-        if is_eligible(r):
-            agg["eligible"] += 1
-        if r.get("seeking_placement") == "Opted In":
-            try:
-                bl = float(r.get("backlogs") or 0)
-                if bl >= 3:
-                    agg["ineligible_backlogs"] += 1
-            except (ValueError, TypeError):
-                pass
-        try:
-            bl = float(r.get("backlogs") or 0)
-            if bl > 0:
-                agg["has_backlogs"] += 1
-        except (ValueError, TypeError):
-            pass
-        if r.get("status") == "Deemed Placed":
-            agg["deemed_placed"] += 1
-        if r.get("status") == "Placed":
-            agg["placed"] += 1
-            if r.get("ctc"):
-                try:
-                    agg["ctc_values"].append(float(r["ctc"]))
-                except (ValueError, TypeError):
-                    pass
+# Columns the analytics aggregate reads
+ANALYTICS_COLUMNS = [
+    "reg_no", "seeking_placement", "status", "backlogs", "ctc", "department",
+    "course", "gender", "company_name", "placed_date",
+]
 
-    course_summary = []
-    for course, agg in sorted(course_agg.items(), key=lambda x: x[1]["department"]):
-        not_seeking = agg["total"] - agg["seeking"]
-        gap_pct = round((agg["seeking"] - agg["eligible"]) / agg["seeking"] * 100, 1) if agg["seeking"] > 0 else 0
-        unplaced = max(0, agg["eligible"] - agg["placed"] - agg["deemed_placed"])
-        pending = unplaced
-        achieved_pct = round(agg["placed"] / agg["eligible"] * 100, 1) if agg["eligible"] > 0 else 0
-        avg_ctc_course = round(sum(agg["ctc_values"]) / len(agg["ctc_values"]), 2) if agg["ctc_values"] else 0
-        course_summary.append({
-            "department": agg["department"],
-            "stream": course,
-            "total": agg["total"],
-            "seeking": agg["seeking"],
-            "not_seeking": not_seeking,
-            "eligible": agg["eligible"],
-            "ineligible_backlogs": agg["ineligible_backlogs"],
-            "gap_pct": gap_pct,
-            "backlogs": agg["has_backlogs"],
-            "deemed_placed": agg["deemed_placed"],
-            "placed": agg["placed"],
-            "unplaced": unplaced,
-            "pending": pending,
-            "target_pct": 100,
-            "achieved_pct": achieved_pct,
-            "avg_ctc": avg_ctc_course,
-        })
-
-    dept_agg = {}
-    for r in rows:
-        dept = r.get("department") or "Unknown"
-        if dept not in dept_agg:
-            dept_agg[dept] = {
-                "total": 0, "opted_in": 0, "placed": 0,
-                "ctc_values": [], "companies": set(),
-            }
-        da = dept_agg[dept]
-        da["total"] += 1
-        if r.get("seeking_placement") == "Opted In":
-            da["opted_in"] += 1
-        if r.get("status") == "Placed":
-            da["placed"] += 1
-            if r.get("ctc"):
-                try:
-                    da["ctc_values"].append(float(r["ctc"]))
-                except (ValueError, TypeError):
-                    pass
-            if r.get("company_name"):
-                da["companies"].add(r["company_name"])
-
-    dept_summary = []
-    sr = 1
-    for dept, da in sorted(dept_agg.items()):
-        placed_pct = round(da["placed"] / da["opted_in"] * 100, 1) if da["opted_in"] > 0 else 0
-        highest = max(da["ctc_values"]) if da["ctc_values"] else 0
-        avg_c = round(sum(da["ctc_values"]) / len(da["ctc_values"]), 2) if da["ctc_values"] else 0
-        med_c = round(statistics.median(da["ctc_values"]), 2) if da["ctc_values"] else 0
-        companies_list = sorted(da["companies"])
-        dept_summary.append({
-            "sr_no": sr,
-            "school_name": dept,
-            "total": da["total"],
-            "opted_in": da["opted_in"],
-            "placed": da["placed"],
-            "placed_pct": placed_pct,
-            "highest_ctc": highest,
-            "avg_ctc": avg_c,
-            "median_ctc": med_c,
-            "unique_companies_count": len(companies_list),
-            "unique_companies": ", ".join(companies_list),
-        })
-        sr += 1
-
-    placement_dates = []
-    for r in rows:
-        if r.get("status") == "Placed" and r.get("placed_date"):
-            pd_val = r["placed_date"]
-            try:
-                if isinstance(pd_val, str):
-                    pd_val = datetime.strptime(pd_val, "%Y-%m-%d").date()
-                elif isinstance(pd_val, datetime):
-                    pd_val = pd_val.date()
-                placement_dates.append(pd_val)
-            except (ValueError, TypeError):
-                pass
-
-    placement_dates.sort()
-
-    trend_daily_labels = []
-    trend_daily_values = []
-    if placement_dates:
-        first_date = placement_dates[0]
-        last_date = placement_dates[-1]
-        day = first_date
-        cumulative = 0
-        date_counts = {}
-        for d in placement_dates:
-            date_counts[d] = date_counts.get(d, 0) + 1
-        while day <= last_date:
-            cumulative += date_counts.get(day, 0)
-            trend_daily_labels.append(day.strftime("%Y-%m-%d"))
-            trend_daily_values.append(cumulative)
-            day += timedelta(days=1)
-
-    trend_weekly_labels = []
-    trend_weekly_values = []
-    if placement_dates:
-        week_counts = {}
-        for d in placement_dates:
-            iso = d.isocalendar()
-            wk_key = f"{iso[0]}-W{iso[1]:02d}"
-            week_counts[wk_key] = week_counts.get(wk_key, 0) + 1
-        first_date = placement_dates[0]
-        last_date = placement_dates[-1]
-        day = first_date
-        seen_weeks = {}
-        while day <= last_date:
-            iso = day.isocalendar()
-            wk_key = f"{iso[0]}-W{iso[1]:02d}"
-            if wk_key not in seen_weeks:
-                seen_weeks[wk_key] = day
-            day += timedelta(days=1)
-        cumulative = 0
-        for wk_key in sorted(seen_weeks.keys()):
-            cumulative += week_counts.get(wk_key, 0)
-            trend_weekly_labels.append(wk_key)
-            trend_weekly_values.append(cumulative)
-
-    trend_monthly_labels = []
-    trend_monthly_values = []
-    if placement_dates:
-        month_counts = {}
-        for d in placement_dates:
-            mk = d.strftime("%Y-%m")
-            month_counts[mk] = month_counts.get(mk, 0) + 1
-        first_month = placement_dates[0].strftime("%Y-%m")
-        last_month = placement_dates[-1].strftime("%Y-%m")
-        ym = first_month
-        cumulative = 0
-        while ym <= last_month:
-            cumulative += month_counts.get(ym, 0)
-            trend_monthly_labels.append(ym)
-            trend_monthly_values.append(cumulative)
-            y, m = int(ym[:4]), int(ym[5:7])
-            m += 1
-            if m > 12:
-                m = 1
-                y += 1
-            ym = f"{y}-{m:02d}"
-
-    trend_daily_new = []
-    if placement_dates:
-        date_counts = {}
-        for d in placement_dates:
-            date_counts[d] = date_counts.get(d, 0) + 1
-        first_date = placement_dates[0]
-        last_date = placement_dates[-1]
-        day = first_date
-        while day <= last_date:
-            trend_daily_new.append(date_counts.get(day, 0))
-            day += timedelta(days=1)
-
-    trend_weekly_new = []
-    if placement_dates:
-        week_counts = {}
-        for d in placement_dates:
-            iso = d.isocalendar()
-            wk_key = f"{iso[0]}-W{iso[1]:02d}"
-            week_counts[wk_key] = week_counts.get(wk_key, 0) + 1
-        for wk in trend_weekly_labels:
-            trend_weekly_new.append(week_counts.get(wk, 0))
-
-    trend_monthly_new = []
-    if placement_dates:
-        month_counts = {}
-        for d in placement_dates:
-            mk = d.strftime("%Y-%m")
-            month_counts[mk] = month_counts.get(mk, 0) + 1
-        for mk in trend_monthly_labels:
-            trend_monthly_new.append(month_counts.get(mk, 0))
-
-    return {
-        "total": total,
-        "opted_in": opted_in,
-        "opted_out": opted_out,
-        "not_registered": not_registered,
-        "debarred": debarred,
-        "eligible": eligible,
-        "ineligible": ineligible,
-        "placed": placed,
-        "unplaced": unplaced_opted_in,
-        "placement_rate": placement_rate,
-        "avg_ctc": avg_ctc,
-        "median_ctc": median_ctc,
-        "max_ctc": max_ctc,
-        "min_ctc": min_ctc,
-        "top_company": top_company,
-        "dept_labels": dept_labels,
-        "dept_placed": dept_placed,
-        "dept_total": dept_total,
-        "dept_eligible": dept_eligible,
-        "company_labels": company_labels,
-        "company_values": company_values,
-        "gender_counts": gender_counts,
-        "gender_placement": gender_placement,
-        "ctc_dist_labels": ctc_dist_labels,
-        "ctc_dist_values": ctc_dist_values,
-        "dept_course_breakdown": dept_course_breakdown,
-        "course_summary": course_summary,
-        "dept_summary": dept_summary,
-        "trend_daily_labels": trend_daily_labels,
-        "trend_daily_values": trend_daily_values,
-        "trend_daily_new": trend_daily_new,
-        "trend_weekly_labels": trend_weekly_labels,
-        "trend_weekly_values": trend_weekly_values,
-        "trend_weekly_new": trend_weekly_new,
-        "trend_monthly_labels": trend_monthly_labels,
-        "trend_monthly_values": trend_monthly_values,
-        "trend_monthly_new": trend_monthly_new,
-    }
\ No newline at end of file
+
+def compute_analytics(rows):
+    """Compute all analytics from a list of student dicts (one fused pass)."""
+    records = [tuple(r.get(c) for c in ANALYTICS_COLUMNS) for r in rows]
+    return AnalyticsAggregate.from_records(records, ANALYTICS_COLUMNS).finalize()
@@ -0,0 +1,58 @@
+# http_cache.py — Conditional GET (ETag / Last-Modified → 304) from data generations
+from datetime import timezone
+from functools import wraps
+
+from flask import g, make_response, request, session
+from mysql.connector import Error
+
+from helpers import read_data_generations
+
+
+def skip_conditional():
+    """Serve the current response without validators (e.g. stale analytics)."""
+    g.skip_conditional = True
+
+
+def _is_fresh(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    ims = request.if_modified_since
+    return bool(ims and last_modified and ims >= last_modified)
+
+
+def conditional_get(*datasets):
+    """Answer repeat GETs with 304 while the named datasets are unchanged.
+
+    The ETag is built from the data_generations counters of ``datasets``,
+    read *before* the view runs: a write racing the view can only make the
+    body newer than its tag, which costs the client one extra full fetch
+    and never a missed change. Pages with pending flash messages and
+    responses flagged by skip_conditional() are served as usual.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if session.get("_flashes"):
+                return view(*args, **kwargs)
+            try:
+                generations = read_data_generations(datasets)
+            except Error:
+                return view(*args, **kwargs)
+
+            etag = ".".join(f"{name}-{gen}" for name, (gen, _) in generations.items())
+            stamps = [ts for _, ts in generations.values() if ts]
+            last_modified = max(stamps).replace(tzinfo=timezone.utc) if stamps else None
+
+            if _is_fresh(etag, last_modified):
+                response = make_response("", 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or g.get("skip_conditional"):
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
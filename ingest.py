@@ -0,0 +1,272 @@
+# ingest.py — Student MIS upload pipeline (column normalisation & typing)
+import hashlib
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+from helpers import DB_COLUMNS, row_hash_expression
+
+# Column groups after cleaning (everything else stays a trimmed string)
+FLOAT_UPLOAD_COLS = ["ctc", "graduation_ogpa"]
+PERCENT_UPLOAD_COLS = ["percent_10", "percent_12"]
+INT_UPLOAD_COLS = ["sr_no", "backlogs"]
+
+_GPA_PREFIX = r"^(?:C?GPA)\s*"
+
+
+def _clean_strings(series):
+    """Vectorised to_str_or_none: trimmed str, with '', 'nan' and nulls → NaN."""
+    present = series.notna()
+    text = series.astype(object).where(present, "").astype(str).str.strip()
+    blank = (text == "") | (text.str.lower() == "nan")
+    return text.where(present & ~blank)
+
+
+def _to_numbers(text):
+    """Parse cleaned strings to float64, unparsable values become NaN."""
+    return pd.to_numeric(text, errors="coerce")
+
+
+def _clean_percent(text):
+    """Vectorised fix_pct: strip GPA/CGPA prefix and '%', scale 0-1 → 0-100."""
+    cleaned = (
+        text.str.replace(_GPA_PREFIX, "", regex=True, case=False)
+        .str.strip()
+        .str.rstrip("%")
+        .str.strip()
+    )
+    cleaned = cleaned.where(~cleaned.isin(["__", "_", ""]))
+    num = _to_numbers(cleaned)
+    fraction = (num > 0) & (num <= 1)
+    return num.where(~fraction, (num * 100).round(1))
+
+
+def _float_list(num):
+    arr = num.to_numpy(dtype="float64", na_value=np.nan)
+    return [None if v != v else v for v in arr.tolist()]
+
+
+def _int_list(num):
+    arr = np.trunc(num.to_numpy(dtype="float64", na_value=np.nan))
+    return [None if (v != v or v in (np.inf, -np.inf)) else int(v) for v in arr.tolist()]
+
+
+def _str_list(text):
+    return [v if isinstance(v, str) else None for v in text.astype(object).tolist()]
+
+
+def normalize_upload_frame(df):
+    """Clean and type every DB column of an uploaded MIS sheet in one pass.
+
+    ``df`` must already be renamed to DB column names. Returns a dict of
+    ``column → list`` holding plain Python values (str / float / int / None)
+    ready to be bound as MySQL parameters, matching the per-cell
+    to_str_or_none → fix_pct → to_float_or_none / to_int_or_none chain the
+    upload handler used to run.
+    """
+    columns = {}
+    for col in DB_COLUMNS:
+        text = _clean_strings(df[col])
+        if col in PERCENT_UPLOAD_COLS:
+            columns[col] = _float_list(_clean_percent(text))
+        elif col in FLOAT_UPLOAD_COLS:
+            columns[col] = _float_list(_to_numbers(text))
+        elif col in INT_UPLOAD_COLS:
+            columns[col] = _int_list(_to_numbers(text))
+        else:
+            columns[col] = _str_list(text)
+    return columns
+
+
+def rows_from_columns(columns):
+    """Zip typed column arrays into DB_COLUMNS-ordered row tuples."""
+    return list(zip(*(columns[c] for c in DB_COLUMNS)))
+
+
+def content_digest(values_list):
+    """Order-independent content hash of typed upload rows (32 hex chars).
+
+    Each row is digested on its own and the digests are summed modulo
+    2**128, so the result does not depend on sheet order and needs no
+    sorted copy or CSV rendering of the data.
+    """
+    total = 0
+    for values in values_list:
+        line = "\x1f".join("\x00" if v is None else repr(v) for v in values)
+        total += int.from_bytes(hashlib.md5(line.encode("utf-8")).digest(), "big")
+    return f"{total % (1 << 128):032x}"
+
+
+# ── placed_date reconciliation ───────────────────────────────────────────────
+def placed_transitions(changes):
+    """Split diffed rows into newly placed / un-placed registration numbers.
+
+    ``changes`` is the output of diff_staging_against_students (only rows
+    that are new or whose content changed). Returns ``(placed, unplaced)``.
+    """
+    placed, unplaced = [], []
+    for change in changes:
+        old_status = None if change["is_new"] else change["old_status"]
+        new_status = change["new_status"]
+        if new_status == "Placed":
+            if old_status != "Placed":
+                placed.append(change["reg_no"])
+        elif not change["is_new"] and old_status == "Placed":
+            unplaced.append(change["reg_no"])
+    return placed, unplaced
+
+
+def sync_placed_dates(cursor, placed, unplaced, placed_on):
+    """Apply placed/un-placed transitions with one UPDATE … JOIN.
+
+    Transitions are staged in a session temporary table so the whole batch
+    costs a multi-row INSERT plus a single set-based UPDATE, regardless of
+    how many statuses flipped.
+    """
+    if not placed and not unplaced:
+        return 0
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_placed_sync")
+    cursor.execute(
+        "CREATE TEMPORARY TABLE tmp_placed_sync ("
+        "  reg_no VARCHAR(50) PRIMARY KEY,"
+        "  is_placed TINYINT NOT NULL"
+        ")"
+    )
+    rows = [(reg, 1) for reg in placed] + [(reg, 0) for reg in unplaced]
+    cursor.executemany(
+        "INSERT IGNORE INTO tmp_placed_sync (reg_no, is_placed) VALUES (%s, %s)",
+        rows,
+    )
+    cursor.execute(
+        "UPDATE students s JOIN tmp_placed_sync t ON s.reg_no = t.reg_no "
+        "SET s.placed_date = CASE WHEN t.is_placed = 1 "
+        "    THEN COALESCE(s.placed_date, %s) ELSE NULL END",
+        (placed_on,),
+    )
+    affected = cursor.rowcount
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_placed_sync")
+    return affected
+
+
+# ── Staging-table bulk load ──────────────────────────────────────────────────
+STAGING_TABLE = "stg_students"
+
+
+def dedupe_rows(values_list):
+    """Keep the last row per reg_no (what ON DUPLICATE KEY UPDATE would keep)."""
+    reg_idx = DB_COLUMNS.index("reg_no")
+    return list({values[reg_idx]: values for values in values_list}.values())
+
+
+def pick_batch_size(cursor, values_list, sample=200):
+    """Size multi-row INSERT batches to fit within max_allowed_packet.
+
+    Row width is estimated from a sample of rows (rendered value length plus
+    quoting/separator overhead); batches aim to fill
+    UPLOAD_BULK_PACKET_FILL of the server's packet limit.
+    """
+    cursor.execute("SELECT @@max_allowed_packet")
+    packet = int(cursor.fetchone()[0])
+    rows = values_list[:sample] or [()]
+    avg_row = sum(
+        sum(len(str(v)) + 4 for v in values) + 4 for values in rows
+    ) / len(rows)
+    fit = int(packet * config.UPLOAD_BULK_PACKET_FILL // max(avg_row, 1))
+    return max(config.UPLOAD_BULK_MIN_BATCH, min(config.UPLOAD_BULK_MAX_BATCH, fit))
+
+
+def create_staging_table(cursor):
+    """(Re)create the session-scoped staging copy of students.
+
+    Built from the column list rather than ``LIKE students``: InnoDB refuses
+    FULLTEXT indexes (ft_students_search) on temporary tables. Only the
+    reg_no key and the row_hash fingerprint are needed for the merge.
+    """
+    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {STAGING_TABLE}")
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE {STAGING_TABLE} "
+        f"SELECT {', '.join(DB_COLUMNS)} FROM students LIMIT 0"
+    )
+    cursor.execute(
+        f"ALTER TABLE {STAGING_TABLE} ADD PRIMARY KEY (reg_no), "
+        f"ADD COLUMN row_hash CHAR(32) AS ({row_hash_expression()}) STORED"
+    )
+
+
+def drop_staging_table(cursor):
+    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {STAGING_TABLE}")
+
+
+def load_staging_table(cursor, values_list, batch_size):
+    """Stream rows into the staging table as large multi-row INSERTs."""
+    cols_joined = ", ".join(DB_COLUMNS)
+    row_sql = "(" + ", ".join(["%s"] * len(DB_COLUMNS)) + ")"
+    prefix = f"INSERT INTO {STAGING_TABLE} ({cols_joined}) VALUES "
+    batches = 0
+    for start in range(0, len(values_list), batch_size):
+        chunk = values_list[start:start + batch_size]
+        cursor.execute(
+            prefix + ", ".join([row_sql] * len(chunk)),
+            [v for values in chunk for v in values],
+        )
+        batches += 1
+    return batches
+
+
+def stage_upload(cursor, values_list):
+    """Load uploaded rows into the staging table; return load stats.
+
+    ``values_list`` must already be deduplicated by reg_no. The staging table
+    stays alive on this connection for the diff and merge steps.
+    """
+    started = time.perf_counter()
+    batch_size = pick_batch_size(cursor, values_list)
+    create_staging_table(cursor)
+    batches = load_staging_table(cursor, values_list, batch_size)
+    seconds = time.perf_counter() - started
+    return {
+        "rows": len(values_list),
+        "batches": batches,
+        "batch_size": batch_size,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(len(values_list) / seconds, 1) if seconds > 0 else float(len(values_list)),
+    }
+
+
+def diff_staging_against_students(cursor):
+    """Return staged rows that are new or differ from students.
+
+    Both tables carry the generated ``row_hash`` fingerprint, so the
+    comparison happens in MySQL and only changed rows come back:
+    ``[{reg_no, is_new, old_status, new_status}, ...]``.
+    """
+    cursor.execute(
+        f"SELECT t.reg_no, s.reg_no IS NULL, s.status, t.status "
+        f"FROM {STAGING_TABLE} t "
+        f"LEFT JOIN students s ON s.reg_no = t.reg_no "
+        f"WHERE s.reg_no IS NULL OR NOT (s.row_hash <=> t.row_hash)"
+    )
+    return [
+        {"reg_no": reg, "is_new": bool(is_new), "old_status": old_status, "new_status": new_status}
+        for reg, is_new, old_status, new_status in cursor.fetchall()
+    ]
+
+
+def merge_staging_into_students(cursor):
+    """Set-based merge of changed rows: UPDATE … JOIN, then INSERT … SELECT."""
+    set_clause = ", ".join(f"s.{c} = t.{c}" for c in DB_COLUMNS if c != "reg_no")
+    cursor.execute(
+        f"UPDATE students s JOIN {STAGING_TABLE} t ON s.reg_no = t.reg_no "
+        f"SET {set_clause} "
+        f"WHERE NOT (s.row_hash <=> t.row_hash)"
+    )
+    cols_joined = ", ".join(DB_COLUMNS)
+    t_cols = ", ".join(f"t.{c}" for c in DB_COLUMNS)
+    cursor.execute(
+        f"INSERT INTO students ({cols_joined}) "
+        f"SELECT {t_cols} FROM {STAGING_TABLE} t "
+        f"LEFT JOIN students s ON s.reg_no = t.reg_no "
+        f"WHERE s.reg_no IS NULL"
+    )
@@ -5,13 +5,19 @@ from decimal import Decimal
 from io import BytesIO
 
 from flask import (
-    flash, jsonify, redirect, render_template, request, send_file, url_for,
+    Response, flash, jsonify, redirect, render_template, request, send_file, url_for,
 )
 from mysql.connector import Error
 
 from helpers import (
-    get_connection, normalize_rows, invalidate_analytics_cache,
+    get_connection, normalize_rows, invalidate_analytics_cache, parse_ctc_value,
+    apply_analytics_deltas, fetch_student_rows, student_row_deltas, bump_data_generation,
 )
+from cdm_analytics import load_cdm_analytics
+from drive_listing import load_drive_listing, load_drive_summaries, note_cdm_change
+from edit_logs import fetch_log_page, parse_log_args
+from http_cache import conditional_get
+from search import search_students
 
 
 # ── CDM constants ────────────────────────────────────────────────────────────
@@ -92,20 +98,67 @@ def format_course_label(course_name, drive_type):
 
 
 # ── CDM helpers ──────────────────────────────────────────────────────────────
-def generate_company_id(name, cursor):
+def company_id_base(name):
     clean = ''.join(c for c in name.upper() if c.isalnum())
     if len(clean) >= 4:
-        cid = clean[:2] + clean[-2:]
-    else:
-        cid = (clean + "XXXX")[:4]
-    base = cid
-    i = 1
-    while True:
-        cursor.execute("SELECT 1 FROM companies WHERE company_id=%s", (cid,))
-        if not cursor.fetchone():
-            return cid
-        cid = f"{base}{i}"
-        i += 1
+        return clean[:2] + clean[-2:]
+    return (clean + "XXXX")[:4]
+
+
+def allocate_company_ids(cursor, names, reserved=()):
+    """Allocate a free company id (base, base1, base2, ...) for each name.
+
+    Each prefix has a row in company_id_counters holding the next suffix to
+    try; the row stays locked until the caller commits, so concurrent
+    imports and creates queue per prefix instead of racing for one id.
+    Ids already taken under the prefix come from one range query on the
+    primary key (read with a share lock, so the latest committed rows are
+    seen). ``reserved`` holds lower-cased ids the caller is about to
+    insert itself. ``cursor`` must be a dictionary cursor.
+    """
+    bases = [company_id_base(name) for name in names]
+    prefixes = sorted(set(bases))
+    if not prefixes:
+        return []
+    cursor.execute(
+        "INSERT INTO company_id_counters (prefix, next_suffix) VALUES "
+        + ", ".join(["(%s, 0)"] * len(prefixes))
+        + " ON DUPLICATE KEY UPDATE next_suffix = next_suffix",
+        prefixes,
+    )
+    marks = ", ".join(["%s"] * len(prefixes))
+    cursor.execute(
+        f"SELECT prefix, next_suffix FROM company_id_counters WHERE prefix IN ({marks}) FOR UPDATE",
+        prefixes,
+    )
+    counters = {r["prefix"]: r["next_suffix"] for r in cursor.fetchall()}
+    cursor.execute(
+        "SELECT company_id FROM companies WHERE "
+        + " OR ".join(["company_id LIKE %s"] * len(prefixes))
+        + " LOCK IN SHARE MODE",
+        [p + "%" for p in prefixes],
+    )
+    taken = {r["company_id"].lower() for r in cursor.fetchall()} | set(reserved)
+
+    ids = []
+    for base in bases:
+        n = counters.get(base, 0)
+        cid = base if n == 0 else f"{base}{n}"
+        while cid.lower() in taken:
+            n += 1
+            cid = f"{base}{n}"
+        taken.add(cid.lower())
+        counters[base] = n + 1
+        ids.append(cid)
+    cursor.executemany(
+        "UPDATE company_id_counters SET next_suffix = %s WHERE prefix = %s",
+        [(counters[p], p) for p in prefixes],
+    )
+    return ids
+
+
+def allocate_company_id(cursor, name):
+    return allocate_company_ids(cursor, [name])[0]
 
 
 def parse_date_field(val):
@@ -124,20 +177,6 @@ def parse_date_field(val):
     return None
 
 
-def parse_ctc_value(ctc_text):
-    if not ctc_text:
-        return None
-    text = str(ctc_text).strip()
-    parts = re.split(r'\s*[-&,/]\s*', text)
-    for part in parts:
-        m = re.search(r'(\d+\.?\d*)', part)
-        if m:
-            val = float(m.group(1))
-            if val > 0:
-                return val
-    return None
-
-
 def split_coordinators(raw_primary, raw_secondary=None):
     names = []
     for raw in [raw_primary, raw_secondary]:
@@ -169,9 +208,15 @@ def get_request_actor():
 
 
 def sync_student_placed_status(cursor, reg_no, company_name, role, ctc_text, to_status):
+    """Mark the student placed when a drive moves them to 'placed'.
+
+    Returns analytics deltas (see apply_analytics_deltas) for the caller to
+    apply before commit; empty when the student row did not change.
+    """
     status = (to_status or "").strip().lower()
     if status == "placed":
         parsed_ctc = parse_ctc_value(ctc_text)
+        before = fetch_student_rows(cursor, [reg_no], for_update=True)
         cursor.execute(
             "UPDATE students "
             "SET status='Placed', "
@@ -182,6 +227,9 @@ def sync_student_placed_status(cursor, reg_no, company_name, role, ctc_text, to_
             "WHERE reg_no = %s",
             (company_name, role, parsed_ctc, reg_no),
         )
+        if cursor.rowcount:
+            return student_row_deltas(before, fetch_student_rows(cursor, [reg_no]))
+    return []
 
 
 def append_round_transition_log(
@@ -212,6 +260,225 @@ def append_round_transition_log(
     )
 
 
+# ── CDM import engine ────────────────────────────────────────────────────────
+# The recruitment sheet is resolved in memory against prefetched companies,
+# drives and HR contacts, then written with multi-row INSERTs of at most
+# CDM_IMPORT_BATCH rows. Matching follows the old row-by-row import: MySQL's
+# case-insensitive comparison, a drive is a duplicate when company, role and
+# process date match (rows without a role are never duplicates), and an HR
+# contact is added once per company and name.
+CDM_IMPORT_BATCH = 500
+
+
+def _import_text(row, key):
+    value = row.get(key)
+    if not value:
+        return None
+    text = str(value).strip()
+    return None if not text or text.lower() == "nan" else text
+
+
+def _chunks(items, size=CDM_IMPORT_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def read_cdm_import_rows(records):
+    """Clean sheet records (dicts keyed by CDM_EXCEL_HEADERS names)."""
+    rows = []
+    for record in records:
+        company_name = _import_text(record, "company_name")
+        if not company_name:
+            continue
+        data_shared = str(record.get("data_shared") or "").strip().upper()
+        hr_name = _import_text(record, "hr_name")
+        rows.append({
+            "company_id": _import_text(record, "company_id"),
+            "company_name": company_name,
+            "role": _import_text(record, "role"),
+            "ctc_text": _import_text(record, "ctc_text"),
+            "jd_received_date": parse_date_field(record.get("jd_received_date")),
+            "process_date": parse_date_field(record.get("process_date")),
+            "data_shared": data_shared in ("Y", "YES", "TRUE", "1"),
+            "location": _import_text(record, "location"),
+            "received_by": _import_text(record, "received_by"),
+            "notes": _import_text(record, "notes"),
+            "courses": [c.strip() for c in (_import_text(record, "course") or "").split(",") if c.strip()],
+            "hr": (hr_name, _import_text(record, "hr_designation"),
+                   _import_text(record, "hr_email"), _import_text(record, "hr_phone")) if hr_name else None,
+        })
+    return rows
+
+
+def _drive_key(company_id, role, process_date):
+    return (company_id.lower(), role.lower(), str(process_date) if process_date else None)
+
+
+def _prefetch_import_state(cursor, rows):
+    """Existing companies, drive keys and HR names the sheet can collide with."""
+    cursor.execute("SELECT company_id, received_by, secondary_coordinator FROM companies")
+    companies = {r["company_id"].lower(): dict(r) for r in cursor.fetchall()}
+
+    wanted = sorted({
+        companies[r["company_id"].lower()]["company_id"]
+        for r in rows if r["company_id"] and r["company_id"].lower() in companies
+    })
+    drive_keys, hr_names = set(), set()
+    for part in _chunks(wanted):
+        marks = ", ".join(["%s"] * len(part))
+        cursor.execute(
+            f"SELECT company_id, role, process_date FROM company_drives "
+            f"WHERE role IS NOT NULL AND company_id IN ({marks})",
+            part,
+        )
+        drive_keys.update(_drive_key(r["company_id"], r["role"], r["process_date"]) for r in cursor.fetchall())
+        cursor.execute(
+            f"SELECT company_id, name FROM company_hr WHERE name IS NOT NULL AND company_id IN ({marks})",
+            part,
+        )
+        hr_names.update((r["company_id"].lower(), r["name"].lower()) for r in cursor.fetchall())
+    return companies, drive_keys, hr_names
+
+
+_DRIVE_INSERT_COLUMNS = (
+    "company_id", "role", "ctc_text", "jd_received_date", "process_date",
+    "data_shared", "location", "notes", "status", "jd_briefing_done", "jd_briefing_date", "jd_briefing_conducted_by",
+)
+# Columns that tell the drives of one import apart when reading their ids back
+_DRIVE_MATCH_COLUMNS = ("company_id", "role", "ctc_text", "jd_received_date", "process_date", "location", "notes")
+
+
+def _drive_match_key(values):
+    return tuple("" if v is None else str(v) for v in values)
+
+
+def _insert_drives(cursor, drives):
+    """Multi-row INSERT of drive tuples; returns their drive_ids in order.
+
+    One INSERT's AUTO_INCREMENT values are not necessarily consecutive
+    (innodb_autoinc_lock_mode=2 interleaves concurrent inserts), so each
+    chunk's rows are read back from its first id and matched to the drives
+    by value. The caller's transaction read its snapshot before inserting,
+    so other requests' drives never show up there; if the rows still do not
+    line up, Error is raised and the import rolls back.
+    """
+    match = [_DRIVE_INSERT_COLUMNS.index(c) for c in _DRIVE_MATCH_COLUMNS]
+    ids = []
+    for part in _chunks(drives):
+        cursor.execute(
+            f"INSERT INTO company_drives ({', '.join(_DRIVE_INSERT_COLUMNS)}) VALUES "
+            + ", ".join(["(" + ", ".join(["%s"] * len(_DRIVE_INSERT_COLUMNS)) + ")"] * len(part)),
+            [v for drive in part for v in drive],
+        )
+        cursor.execute(
+            f"SELECT drive_id, {', '.join(_DRIVE_MATCH_COLUMNS)} FROM company_drives "
+            f"WHERE drive_id >= %s ORDER BY drive_id",
+            (cursor.lastrowid,),
+        )
+        inserted = {}               # match key → [drive_id, ...] in id order
+        rows = cursor.fetchall()
+        for row in rows:
+            key = _drive_match_key(row[c] for c in _DRIVE_MATCH_COLUMNS)
+            inserted.setdefault(key, []).append(row["drive_id"])
+        if len(rows) != len(part):
+            raise Error(msg=f"Read back {len(rows)} of {len(part)} imported drives")
+        for drive in part:
+            same = inserted.get(_drive_match_key(drive[i] for i in match))
+            if not same:
+                raise Error(msg="Imported drives did not match the rows read back")
+            ids.append(same.pop(0))
+    return ids
+
+
+def import_cdm_rows(cursor, rows):
+    """Write cleaned sheet rows; returns (companies, drives, hr contacts) added.
+
+    ``cursor`` must be a dictionary cursor; the caller commits.
+    """
+    companies, drive_keys, hr_names = _prefetch_import_state(cursor, rows)
+    new_companies = {}          # lower id → company dict, in sheet order
+    changed_companies = {}      # lower id → existing company dict with filled coordinators
+    drives, drive_courses, hr_rows = [], [], []
+
+    unnamed = [row for row in rows if not row["company_id"]]
+    allocated = allocate_company_ids(
+        cursor, [row["company_name"] for row in unnamed],
+        reserved={r["company_id"].lower() for r in rows if r["company_id"]},
+    )
+    for row, company_id in zip(unnamed, allocated):
+        row["company_id"] = company_id
+
+    for row in rows:
+        company_id = row["company_id"]
+        key = company_id.lower()
+        if key not in companies:
+            companies[key] = new_companies[key] = {
+                "company_id": company_id, "company_name": row["company_name"],
+                "received_by": None, "secondary_coordinator": None,
+            }
+        company = companies[key]
+        company_id = company["company_id"]
+
+        primary_coord, secondary_coord = split_coordinators(row["received_by"])
+        for col, value in (("received_by", primary_coord), ("secondary_coordinator", secondary_coord)):
+            if value and not company.get(col):
+                company[col] = value
+                if key not in new_companies:
+                    changed_companies[key] = company
+
+        if row["role"]:
+            drive_key = _drive_key(company_id, row["role"], row["process_date"])
+            if drive_key in drive_keys:
+                continue
+            drive_keys.add(drive_key)
+
+        drives.append((
+            company_id, row["role"], row["ctc_text"], row["jd_received_date"], row["process_date"],
+            row["data_shared"], row["location"], row["notes"], "Upcoming", False, None, None,
+        ))
+        drive_courses.append(row["courses"])
+
+        if row["hr"]:
+            hr_key = (key, row["hr"][0].lower())
+            if hr_key not in hr_names:
+                hr_names.add(hr_key)
+                hr_rows.append((company_id,) + row["hr"])
+
+    new_list = list(new_companies.values())
+    for part in _chunks(new_list):
+        cursor.execute(
+            "INSERT INTO companies (company_id, company_name, received_by, secondary_coordinator) VALUES "
+            + ", ".join(["(%s, %s, %s, %s)"] * len(part)),
+            [v for c in part for v in (c["company_id"], c["company_name"],
+                                       c["received_by"], c["secondary_coordinator"])],
+        )
+    if changed_companies:
+        cursor.executemany(
+            "UPDATE companies SET "
+            "received_by = COALESCE(NULLIF(received_by, ''), %s), "
+            "secondary_coordinator = COALESCE(NULLIF(secondary_coordinator, ''), %s) "
+            "WHERE company_id=%s",
+            [(c["received_by"], c["secondary_coordinator"], c["company_id"])
+             for c in changed_companies.values()],
+        )
+
+    drive_ids = _insert_drives(cursor, drives) if drives else []
+    course_rows = [(drive_id, c) for drive_id, courses in zip(drive_ids, drive_courses) for c in courses]
+    for part in _chunks(course_rows):
+        cursor.execute(
+            "INSERT IGNORE INTO drive_courses (drive_id, course_name) VALUES "
+            + ", ".join(["(%s, %s)"] * len(part)),
+            [v for pair in part for v in pair],
+        )
+    for part in _chunks(hr_rows):
+        cursor.execute(
+            "INSERT INTO company_hr (company_id, name, designation, email, phone) VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s)"] * len(part)),
+            [v for hr in part for v in hr],
+        )
+    return len(new_list), len(drives), len(hr_rows)
+
+
 def register_cdm_routes(app):
     """Register all CDM routes on the Flask app."""
 
@@ -221,50 +488,7 @@ def register_cdm_routes(app):
         try:
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT d.drive_id, d.company_id, c.company_name, d.role, d.ctc_text,
-                       d.jd_received_date, d.process_date, d.data_shared,
-                       d.location, d.notes, d.status,
-                      d.jd_briefing_done, d.jd_briefing_date, d.jd_briefing_conducted_by,
-                      c.received_by, c.secondary_coordinator
-                FROM company_drives d
-                JOIN companies c ON d.company_id = c.company_id
-                ORDER BY d.drive_id DESC
-            """)
-            drives = cursor.fetchall()
-            normalize_rows(drives)
-
-            drive_ids = [d["drive_id"] for d in drives]
-            course_map = {}
-            if drive_ids:
-                format_ids = ",".join(["%s"] * len(drive_ids))
-                cursor.execute(
-                    f"SELECT drive_id, course_name, drive_type FROM drive_courses WHERE drive_id IN ({format_ids})",
-                    tuple(drive_ids),
-                )
-                for row in cursor.fetchall():
-                    course_map.setdefault(row["drive_id"], []).append(
-                        format_course_label(row["course_name"], row.get("drive_type"))
-                    )
-            for d in drives:
-                d["courses"] = ", ".join(course_map.get(d["drive_id"], []))
-                d["data_shared"] = "Yes" if d.get("data_shared") else "No"
-                d["jd_briefing_done"] = "Yes" if d.get("jd_briefing_done") else "No"
-
-            cursor.execute("""
-                SELECT c.company_id, c.company_name, c.received_by, c.secondary_coordinator,
-                       COUNT(DISTINCT d.drive_id) AS drive_count,
-                       MAX(d.process_date) AS latest_process_date,
-                       COUNT(DISTINCT ds.reg_no) AS participants_count
-                FROM companies c
-                LEFT JOIN company_drives d ON c.company_id = d.company_id
-                LEFT JOIN drive_students ds ON d.drive_id = ds.drive_id
-                GROUP BY c.company_id, c.company_name, c.received_by, c.secondary_coordinator
-                ORDER BY latest_process_date DESC, c.company_id DESC
-            """)
-            companies = cursor.fetchall()
-            normalize_rows(companies)
-
+            drives, companies = load_drive_listing(cursor)
             cursor.close()
             conn.close()
         except Error as e:
@@ -279,38 +503,12 @@ def register_cdm_routes(app):
 
     # ── CDM JSON endpoint ────────────────────────────────────────────────
     @app.route("/api/cdm")
+    @conditional_get("cdm")
     def api_cdm():
         try:
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT d.drive_id, d.company_id, c.company_name, d.role, d.ctc_text,
-                       d.jd_received_date, d.process_date, d.data_shared,
-                       d.location, d.notes, d.status,
-                      d.jd_briefing_done, d.jd_briefing_date, d.jd_briefing_conducted_by,
-                      c.received_by, c.secondary_coordinator
-                FROM company_drives d
-                JOIN companies c ON d.company_id = c.company_id
-                ORDER BY d.drive_id DESC
-            """)
-            drives = cursor.fetchall()
-            normalize_rows(drives)
-            drive_ids = [d["drive_id"] for d in drives]
-            course_map = {}
-            if drive_ids:
-                format_ids = ",".join(["%s"] * len(drive_ids))
-                cursor.execute(
-                    f"SELECT drive_id, course_name, drive_type FROM drive_courses WHERE drive_id IN ({format_ids})",
-                    tuple(drive_ids),
-                )
-                for row in cursor.fetchall():
-                    course_map.setdefault(row["drive_id"], []).append(
-                        format_course_label(row["course_name"], row.get("drive_type"))
-                    )
-            for d in drives:
-                d["courses"] = ", ".join(course_map.get(d["drive_id"], []))
-                d["data_shared"] = "Yes" if d.get("data_shared") else "No"
-                d["jd_briefing_done"] = "Yes" if d.get("jd_briefing_done") else "No"
+            drives, _ = load_drive_listing(cursor)
             cursor.close()
             conn.close()
             return jsonify({"data": drives})
@@ -361,115 +559,10 @@ def register_cdm_routes(app):
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
 
-            companies_added = 0
-            drives_added = 0
-            hr_added = 0
-
-            for _, row in df.iterrows():
-                company_name = str(row.get("company_name", "")).strip() if row.get("company_name") else None
-                if not company_name or company_name.lower() == "nan":
-                    continue
-
-                company_id = str(row.get("company_id", "")).strip() if row.get("company_id") else None
-                if not company_id or company_id.lower() == "nan":
-                    company_id = generate_company_id(company_name, cursor)
-
-                cursor.execute("SELECT 1 FROM companies WHERE company_id=%s", (company_id,))
-                if not cursor.fetchone():
-                    cursor.execute(
-                        "INSERT INTO companies (company_id, company_name, received_by) VALUES (%s, %s, %s)",
-                        (company_id, company_name, None),
-                    )
-                    companies_added += 1
-
-                role = str(row.get("role", "")).strip() if row.get("role") else None
-                if role and role.lower() == "nan":
-                    role = None
-                ctc_text = str(row.get("ctc_text", "")).strip() if row.get("ctc_text") else None
-                if ctc_text and ctc_text.lower() == "nan":
-                    ctc_text = None
-                jd_date = parse_date_field(row.get("jd_received_date"))
-                proc_date = parse_date_field(row.get("process_date"))
-                data_shared_raw = str(row.get("data_shared", "")).strip().upper() if row.get("data_shared") else ""
-                data_shared = True if data_shared_raw in ("Y", "YES", "TRUE", "1") else False
-                location = str(row.get("location", "")).strip() if row.get("location") else None
-                if location and location.lower() == "nan":
-                    location = None
-                received_by = str(row.get("received_by", "")).strip() if row.get("received_by") else None
-                if received_by and received_by.lower() == "nan":
-                    received_by = None
-                primary_coord, secondary_coord = split_coordinators(received_by)
-                if primary_coord or secondary_coord:
-                    cursor.execute(
-                        "UPDATE companies SET "
-                        "received_by = COALESCE(NULLIF(received_by, ''), %s), "
-                        "secondary_coordinator = COALESCE(NULLIF(secondary_coordinator, ''), %s) "
-                        "WHERE company_id=%s",
-                        (primary_coord, secondary_coord, company_id),
-                    )
-                notes = str(row.get("notes", "")).strip() if row.get("notes") else None
-                if notes and notes.lower() == "nan":
-                    notes = None
-
-                dup_check_sql = (
-                    "SELECT drive_id FROM company_drives "
-                    "WHERE company_id=%s AND role=%s"
-                )
-                dup_params = [company_id, role]
-                if proc_date:
-                    dup_check_sql += " AND process_date=%s"
-                    dup_params.append(proc_date)
-                else:
-                    dup_check_sql += " AND process_date IS NULL"
-                cursor.execute(dup_check_sql, tuple(dup_params))
-                if cursor.fetchone():
-                    continue
-
-                cursor.execute(
-                    "INSERT INTO company_drives "
-                    "(company_id, role, ctc_text, jd_received_date, process_date, "
-                    "data_shared, location, notes, status, jd_briefing_done, jd_briefing_date, jd_briefing_conducted_by) "
-                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                    (company_id, role, ctc_text, jd_date, proc_date,
-                     data_shared, location, notes, "Upcoming", False, None, None),
-                )
-                drive_id = cursor.lastrowid
-                drives_added += 1
-
-                courses_raw = str(row.get("course", "")).strip() if row.get("course") else ""
-                if courses_raw and courses_raw.lower() != "nan":
-                    courses = [c.strip() for c in courses_raw.split(",") if c.strip()]
-                    if courses:
-                        cursor.executemany(
-                            "INSERT IGNORE INTO drive_courses (drive_id, course_name) VALUES (%s, %s)",
-                            [(drive_id, c) for c in courses],
-                        )
-
-                hr_name = str(row.get("hr_name", "")).strip() if row.get("hr_name") else None
-                if hr_name and hr_name.lower() == "nan":
-                    hr_name = None
-                if hr_name:
-                    hr_desig = str(row.get("hr_designation", "")).strip() if row.get("hr_designation") else None
-                    if hr_desig and hr_desig.lower() == "nan":
-                        hr_desig = None
-                    hr_email = str(row.get("hr_email", "")).strip() if row.get("hr_email") else None
-                    if hr_email and hr_email.lower() == "nan":
-                        hr_email = None
-                    hr_phone = str(row.get("hr_phone", "")).strip() if row.get("hr_phone") else None
-                    if hr_phone and hr_phone.lower() == "nan":
-                        hr_phone = None
-                    cursor.execute(
-                        "SELECT hr_id FROM company_hr WHERE company_id=%s AND name=%s",
-                        (company_id, hr_name),
-                    )
-                    if not cursor.fetchone():
-                        cursor.execute(
-                            "INSERT INTO company_hr (company_id, name, designation, email, phone) "
-                            "VALUES (%s, %s, %s, %s, %s)",
-                            (company_id, hr_name, hr_desig, hr_email, hr_phone),
-                        )
-                        hr_added += 1
-
+            companies_added, drives_added, hr_added = import_cdm_rows(
+                cursor, read_cdm_import_rows(df.to_dict("records")),
+            )
+            note_cdm_change(cursor)
             conn.commit()
             cursor.close()
             conn.close()
@@ -499,32 +592,9 @@ def register_cdm_routes(app):
                 flash("Recruiter not found.", "danger")
                 return redirect(url_for("cdm_page"))
 
-            cursor.execute(
-                "SELECT * FROM company_drives WHERE company_id=%s ORDER BY drive_id DESC",
-                (company_id,),
+            drives = load_drive_summaries(
+                cursor, company_id, with_counts=True, yes_no=("data_shared",),
             )
-            drives = cursor.fetchall()
-            normalize_rows(drives)
-
-            for d in drives:
-                cursor.execute(
-                    "SELECT course_name, drive_type FROM drive_courses WHERE drive_id=%s",
-                    (d["drive_id"],),
-                )
-                d["courses"] = ", ".join([
-                    format_course_label(r["course_name"], r.get("drive_type")) for r in cursor.fetchall()
-                ])
-                d["data_shared"] = "Yes" if d.get("data_shared") else "No"
-                cursor.execute(
-                    "SELECT COUNT(*) AS cnt FROM drive_students WHERE drive_id=%s",
-                    (d["drive_id"],),
-                )
-                d["student_count"] = cursor.fetchone()["cnt"]
-                cursor.execute(
-                    "SELECT COUNT(*) AS cnt FROM drive_rounds WHERE drive_id=%s",
-                    (d["drive_id"],),
-                )
-                d["round_count"] = cursor.fetchone()["cnt"]
 
             cursor.execute(
                 "SELECT * FROM company_hr WHERE company_id=%s ORDER BY name",
@@ -559,6 +629,7 @@ def register_cdm_routes(app):
             cursor.execute("DELETE FROM drive_rounds WHERE drive_id=%s", (drive_id,))
             cursor.execute("DELETE FROM drive_courses WHERE drive_id=%s", (drive_id,))
             cursor.execute("DELETE FROM company_drives WHERE drive_id=%s", (drive_id,))
+            note_cdm_change(cursor, [drive_id])
             conn.commit()
             cursor.close()
             conn.close()
@@ -609,6 +680,7 @@ def register_cdm_routes(app):
                     [(drive_id, c["course_name"], c.get("drive_type")) for c in courses],
                 )
 
+            note_cdm_change(cursor, [drive_id])
             conn.commit()
             cursor.close()
             conn.close()
@@ -661,6 +733,7 @@ def register_cdm_routes(app):
                         "INSERT IGNORE INTO drive_courses (drive_id, course_name, drive_type) VALUES (%s, %s, %s)",
                         [(drive_id, c["course_name"], c.get("drive_type")) for c in courses],
                     )
+                note_cdm_change(cursor, [drive_id])
                 conn.commit()
                 cursor.close()
                 conn.close()
@@ -706,6 +779,7 @@ def register_cdm_routes(app):
                  datetime.now()),
             )
 
+            note_cdm_change(cursor, [drive_id])
             conn.commit()
             cursor.close()
             conn.close()
@@ -721,46 +795,23 @@ def register_cdm_routes(app):
     # ── CDM Change Log API ───────────────────────────────────────────────
     @app.route("/api/cdm/edit-log")
     def api_cdm_edit_log():
-        limit = request.args.get("limit", 200, type=int)
-        page = request.args.get("page", 1, type=int)
-        drive_id = request.args.get("drive_id", None, type=int)
-        offset = (page - 1) * limit
+        """Change log, newest first: ``limit``, ``after`` (next_cursor),
+        ``field``, ``from`` / ``to`` (YYYY-MM-DD) and ``drive_id``."""
+        try:
+            query = parse_log_args(request.args, "cdm_edit_log")
+        except ValueError as e:
+            return jsonify({"data": [], "error": str(e)}), 400
         try:
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
-
-            if drive_id:
-                cursor.execute(
-                    "SELECT COUNT(*) as cnt FROM cdm_edit_log WHERE drive_id = %s", (drive_id,)
-                )
-            else:
-                cursor.execute("SELECT COUNT(*) as cnt FROM cdm_edit_log")
-            total_count = cursor.fetchone()["cnt"]
-
-            if drive_id:
-                cursor.execute(
-                    "SELECT * FROM cdm_edit_log WHERE drive_id = %s ORDER BY changed_at DESC LIMIT %s OFFSET %s",
-                    (drive_id, limit, offset),
-                )
-            else:
-                cursor.execute(
-                    "SELECT * FROM cdm_edit_log ORDER BY changed_at DESC LIMIT %s OFFSET %s",
-                    (limit, offset),
-                )
-            rows = cursor.fetchall()
-            for r in rows:
-                if r.get("changed_at"):
-                    r["changed_at"] = r["changed_at"].strftime("%d %B %Y, %I:%M %p")
+            result = fetch_log_page(cursor, "cdm_edit_log", **query)
             cursor.close()
             conn.close()
-
-            total_pages = (total_count + limit - 1) // limit if limit > 0 else 1
-            return jsonify({
-                "data": rows,
-                "page": page,
-                "total_pages": total_pages,
-                "total_count": total_count,
-            })
+            if query["page"]:
+                limit = query["limit"]
+                result["page"] = query["page"]
+                result["total_pages"] = max(1, (result["total_count"] + limit - 1) // limit)
+            return jsonify(result)
         except Error as e:
             return jsonify({"data": [], "error": str(e)}), 500
 
@@ -798,6 +849,7 @@ def register_cdm_routes(app):
                 f"UPDATE company_hr SET `{field}` = %s WHERE hr_id = %s",
                 (value, hr_id),
             )
+            note_cdm_change(cursor, [])
             conn.commit()
             cursor.close()
             conn.close()
@@ -811,6 +863,7 @@ def register_cdm_routes(app):
             conn = get_connection()
             cursor = conn.cursor()
             cursor.execute("DELETE FROM company_hr WHERE hr_id=%s", (hr_id,))
+            note_cdm_change(cursor, [])
             conn.commit()
             cursor.close()
             conn.close()
@@ -834,6 +887,7 @@ def register_cdm_routes(app):
                  data.get("email"), data.get("phone")),
             )
             hr_id = cursor.lastrowid
+            note_cdm_change(cursor, [])
             conn.commit()
             cursor.close()
             conn.close()
@@ -888,12 +942,13 @@ def register_cdm_routes(app):
                 cursor.close()
                 conn.close()
                 return jsonify({"ok": False, "error": "Recruiter already exists.", "company_id": existing["company_id"]}), 409
-            cid = generate_company_id(name, cursor)
+            cid = allocate_company_id(cursor, name)
             cursor.execute(
                 "INSERT INTO companies (company_id, company_name, received_by, secondary_coordinator, notes) "
                 "VALUES (%s, %s, %s, %s, %s)",
                 (cid, name, received_by, secondary_coordinator, notes),
             )
+            note_cdm_change(cursor)
             conn.commit()
             cursor.close()
             conn.close()
@@ -943,6 +998,7 @@ def register_cdm_routes(app):
                 "WHERE company_id=%s",
                 (name, received_by, secondary_coordinator, notes, company_id),
             )
+            note_cdm_change(cursor)
             conn.commit()
             cursor.close()
             conn.close()
@@ -982,6 +1038,7 @@ def register_cdm_routes(app):
             cursor.execute(
                 "DELETE FROM companies WHERE company_id = %s", (company_id,)
             )
+            note_cdm_change(cursor)
             conn.commit()
             cursor.close()
             conn.close()
@@ -991,165 +1048,13 @@ def register_cdm_routes(app):
 
     # ── CDM Analytics API ────────────────────────────────────────────────
     @app.route("/api/cdm/analytics")
+    @conditional_get("cdm")
     def cdm_analytics():
         try:
             conn = get_connection()
-            cursor = conn.cursor(dictionary=True)
-
-            cursor.execute("SELECT COUNT(*) AS total_drives FROM company_drives")
-            total_drives = cursor.fetchone()["total_drives"]
-            cursor.execute("SELECT COUNT(*) AS total_companies FROM companies")
-            total_companies = cursor.fetchone()["total_companies"]
-            cursor.execute("SELECT COUNT(DISTINCT reg_no) AS total_participating_students FROM drive_students")
-            total_participating_students = cursor.fetchone()["total_participating_students"]
-            cursor.execute(
-                "SELECT COUNT(DISTINCT reg_no) AS total_selected_students "
-                "FROM drive_students WHERE status IN ('Selected', 'Placed')"
-            )
-            total_selected_students = cursor.fetchone()["total_selected_students"]
-
-            cursor.execute(
-                "SELECT IFNULL(status, 'Upcoming') AS status, COUNT(*) AS cnt "
-                "FROM company_drives GROUP BY status"
-            )
-            status_dist = {r["status"]: r["cnt"] for r in cursor.fetchall()}
-
-            cursor.execute("SELECT ctc_text FROM company_drives WHERE ctc_text IS NOT NULL AND ctc_text != ''")
-            ctc_rows = cursor.fetchall()
-            ctc_values = []
-            for r in ctc_rows:
-                val = parse_ctc_value(r["ctc_text"])
-                if val is not None:
-                    ctc_values.append(val)
-
-            ctc_stats = {}
-            if ctc_values:
-                ctc_values.sort()
-                ctc_stats["mean"] = round(sum(ctc_values) / len(ctc_values), 2)
-                mid = len(ctc_values) // 2
-                ctc_stats["median"] = round(
-                    (ctc_values[mid - 1] + ctc_values[mid]) / 2 if len(ctc_values) % 2 == 0 else ctc_values[mid], 2
-                )
-                ctc_stats["highest"] = round(max(ctc_values), 2)
-                ctc_stats["lowest"] = round(min(ctc_values), 2)
-                ctc_stats["count"] = len(ctc_values)
-
-            cursor.execute("""
-                SELECT c.company_name, COUNT(ds.reg_no) AS selected_count
-                FROM drive_students ds
-                JOIN company_drives d ON ds.drive_id = d.drive_id
-                JOIN companies c ON d.company_id = c.company_id
-                WHERE ds.status IN ('Selected', 'Placed')
-                GROUP BY c.company_id, c.company_name
-                ORDER BY selected_count DESC
-                LIMIT 10
-            """)
-            top_placed_companies = cursor.fetchall()
-
-            cursor.execute("""
-                SELECT c.company_name, COUNT(DISTINCT ds.reg_no) AS placed_count
-                FROM drive_students ds
-                JOIN company_drives d ON ds.drive_id = d.drive_id
-                JOIN companies c ON d.company_id = c.company_id
-                WHERE ds.status = 'Placed'
-                GROUP BY c.company_id, c.company_name
-                ORDER BY placed_count DESC, c.company_name ASC
-            """)
-            placed_by_company = cursor.fetchall()
-
-            cursor.execute("""
-                SELECT COUNT(DISTINCT d.company_id) AS unique_placed_companies
-                FROM drive_students ds
-                JOIN company_drives d ON ds.drive_id = d.drive_id
-                WHERE ds.status = 'Placed'
-            """)
-            unique_placed_companies = cursor.fetchone()["unique_placed_companies"]
-
-            cursor.execute("""
-                SELECT c.company_name, d.ctc_text
-                FROM company_drives d
-                JOIN companies c ON d.company_id = c.company_id
-                WHERE d.ctc_text IS NOT NULL AND d.ctc_text != ''
-            """)
-            ctc_company_rows = cursor.fetchall()
-            company_ctc_map = {}
-            for r in ctc_company_rows:
-                val = parse_ctc_value(r["ctc_text"])
-                if val is not None:
-                    name = r["company_name"]
-                    if name not in company_ctc_map or val > company_ctc_map[name]:
-                        company_ctc_map[name] = val
-            highest_ctc_companies = sorted(
-                [{"company_name": k, "ctc": v} for k, v in company_ctc_map.items()],
-                key=lambda x: x["ctc"], reverse=True
-            )[:10]
-
-            cursor.execute("""
-                                SELECT c.received_by,
-                       COUNT(DISTINCT d.drive_id) AS total_drives,
-                       COUNT(DISTINCT d.company_id) AS companies_brought
-                FROM company_drives d
-                                JOIN companies c ON d.company_id = c.company_id
-                                WHERE c.received_by IS NOT NULL AND c.received_by != ''
-                                GROUP BY c.received_by
-                ORDER BY companies_brought DESC
-            """)
-            team_base = cursor.fetchall()
-
-            cursor.execute("""
-                                SELECT c.received_by, COUNT(ds.reg_no) AS selections
-                FROM company_drives d
-                                JOIN companies c ON d.company_id = c.company_id
-                JOIN drive_students ds ON d.drive_id = ds.drive_id
-                WHERE ds.status IN ('Selected', 'Placed')
-                                    AND c.received_by IS NOT NULL AND c.received_by != ''
-                                GROUP BY c.received_by
-            """)
-            team_selections = {r["received_by"]: r["selections"] for r in cursor.fetchall()}
-
-            cursor.execute("""
-                                SELECT c.received_by, d.ctc_text
-                FROM company_drives d
-                                JOIN companies c ON d.company_id = c.company_id
-                                WHERE c.received_by IS NOT NULL AND c.received_by != ''
-                  AND d.ctc_text IS NOT NULL AND d.ctc_text != ''
-            """)
-            team_ctc_rows = cursor.fetchall()
-            team_ctc_map = {}
-            for r in team_ctc_rows:
-                val = parse_ctc_value(r["ctc_text"])
-                if val is not None:
-                    team_ctc_map.setdefault(r["received_by"], []).append(val)
-
-            team_performance = []
-            for row in team_base:
-                person = row["received_by"]
-                ctc_list = team_ctc_map.get(person, [])
-                team_performance.append({
-                    "name": person,
-                    "companies_brought": row["companies_brought"],
-                    "total_drives": row["total_drives"],
-                    "selections": team_selections.get(person, 0),
-                    "avg_ctc": round(sum(ctc_list) / len(ctc_list), 2) if ctc_list else None,
-                    "highest_ctc": round(max(ctc_list), 2) if ctc_list else None,
-                })
-
-            cursor.close()
+            body = load_cdm_analytics(conn)
             conn.close()
-
-            return jsonify({
-                "total_drives": total_drives,
-                "total_companies": total_companies,
-                "total_participating_students": total_participating_students,
-                "total_selected_students": total_selected_students,
-                "unique_placed_companies": unique_placed_companies,
-                "placed_by_company": placed_by_company,
-                "status_dist": status_dist,
-                "ctc_stats": ctc_stats,
-                "top_placed_companies": top_placed_companies,
-                "highest_ctc_companies": highest_ctc_companies,
-                "team_performance": team_performance,
-            })
+            return Response(body, mimetype="application/json")
         except Error as e:
             return jsonify({"error": str(e)}), 500
 
@@ -1186,6 +1091,7 @@ def register_cdm_routes(app):
                 "VALUES (%s, %s, %s, %s)",
                 (drive_id, data["reg_no"], data.get("status", "Applied"), data.get("current_round", 0)),
             )
+            note_cdm_change(cursor, [drive_id])
             conn.commit()
             cursor.close()
             conn.close()
@@ -1277,7 +1183,7 @@ def register_cdm_routes(app):
                     note="single_update",
                 )
 
-            sync_student_placed_status(
+            analytics_deltas = sync_student_placed_status(
                 cursor,
                 reg_no,
                 before.get("company_name"),
@@ -1286,6 +1192,10 @@ def register_cdm_routes(app):
                 next_status,
             )
 
+            apply_analytics_deltas(conn, analytics_deltas)
+            note_cdm_change(cursor, [drive_id])
+            if analytics_deltas:
+                bump_data_generation(cursor, "students")
             conn.commit()
             cursor.close()
             conn.close()
@@ -1356,6 +1266,7 @@ def register_cdm_routes(app):
             cursor.execute(query, tuple(vals))
             updated = cursor.rowcount
 
+            analytics_deltas = []
             if updated:
                 cursor.execute(
                     "SELECT reg_no, current_round, status FROM drive_students "
@@ -1384,15 +1295,19 @@ def register_cdm_routes(app):
                             actor,
                             note="bulk_update",
                         )
-                    sync_student_placed_status(
+                    analytics_deltas.extend(sync_student_placed_status(
                         cursor,
                         reg_no,
                         before.get("company_name"),
                         before.get("role"),
                         before.get("ctc_text"),
                         to_status,
-                    )
+                    ))
 
+            apply_analytics_deltas(conn, analytics_deltas)
+            note_cdm_change(cursor, [drive_id])
+            if analytics_deltas:
+                bump_data_generation(cursor, "students")
             conn.commit()
             cursor.close()
             conn.close()
@@ -1440,6 +1355,7 @@ def register_cdm_routes(app):
                 "DELETE FROM drive_students WHERE drive_id = %s AND reg_no = %s",
                 (drive_id, reg_no),
             )
+            note_cdm_change(cursor, [drive_id])
             conn.commit()
             cursor.close()
             conn.close()
@@ -1512,6 +1428,7 @@ def register_cdm_routes(app):
                     })
                 except Exception:
                     already.append(student["reg_no"])
+            note_cdm_change(cursor, [drive_id])
             conn.commit()
             cursor.close()
             conn.close()
@@ -1774,6 +1691,7 @@ def register_cdm_routes(app):
                 (drive_id, data["round_name"], next_order, round_date),
             )
             round_id = cursor.lastrowid
+            note_cdm_change(cursor, [])
             conn.commit()
             cursor.close()
             conn.close()
@@ -1857,6 +1775,7 @@ def register_cdm_routes(app):
                             note="round_deleted",
                         )
 
+            note_cdm_change(cursor, [])
             conn.commit()
             cursor.close()
             conn.close()
@@ -1866,6 +1785,7 @@ def register_cdm_routes(app):
 
     # ── Calendar Data API ────────────────────────────────────────────────
     @app.route("/api/cdm/calendar")
+    @conditional_get("cdm")
     def cdm_calendar():
         try:
             conn = get_connection()
@@ -2129,15 +2049,10 @@ def register_cdm_routes(app):
         try:
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
-            like = f"%{q}%"
-            cursor.execute(
-                "SELECT reg_no, student_name, course, department, status "
-                "FROM students WHERE "
-                "student_name LIKE %s OR reg_no LIKE %s OR course LIKE %s "
-                "ORDER BY student_name LIMIT 15",
-                (like, like, like),
+            rows = search_students(
+                cursor, q, ["course", "department", "status"],
+                fields=["student_name", "reg_no", "course"],
             )
-            rows = cursor.fetchall()
             cursor.close()
             conn.close()
             return jsonify({"results": rows})
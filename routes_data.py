@@ -6,17 +6,55 @@ from datetime import datetime
 from decimal import Decimal
 
 from flask import (
-    flash, jsonify, redirect, render_template, request,
-    send_from_directory, url_for,
+    Response, flash, jsonify, redirect, render_template, request,
+    send_from_directory, stream_with_context, url_for,
 )
 from mysql.connector import Error
 
+import config
 from helpers import (
     EDITABLE_COLUMNS, NUMERIC_FLOAT_COLS, NUMERIC_INT_COLS,
-    get_connection, normalize_row, normalize_rows, to_float_or_none,
-    to_int_or_none, compute_analytics, get_cached_analytics,
-    save_analytics_cache, invalidate_analytics_cache,
+    get_connection, normalize_row, to_float_or_none,
+    to_int_or_none, load_analytics, apply_analytics_deltas,
+    fetch_student_rows, student_row_deltas, bump_data_generation,
 )
+from drive_listing import note_cdm_change
+from edit_logs import fetch_log_page, parse_log_args
+from http_cache import conditional_get
+from search import global_search, search_students
+from student_query import (
+    EXPORT_FORMATS, column_values, count_views, first_page, list_students, parse_listing_args,
+    stream_students, view_stats,
+)
+
+
+def clean_edit_value(field, value):
+    """Validate and convert one inline edit; raises ValueError with the message.
+
+    Blank strings become None; numeric columns are converted.
+    """
+    if field not in EDITABLE_COLUMNS:
+        raise ValueError(f"Field '{field}' is not editable")
+
+    if value is None or str(value).strip() == "":
+        return None
+
+    label = field.replace('_', ' ').title()
+    if field in NUMERIC_FLOAT_COLS:
+        converted = to_float_or_none(value)
+        if converted is None:
+            raise ValueError(f"{label} must be a numeric value")
+        return converted
+    if field in NUMERIC_INT_COLS:
+        converted = to_int_or_none(value)
+        if converted is None:
+            raise ValueError(f"{label} must be a whole number")
+        return converted
+    if field == "email" and not re.match(r'^[^@\s]+@[^@\s]+\.[^@\s]+$', str(value)):
+        raise ValueError("Invalid email format")
+    if field == "mobile_number" and len(re.findall(r'\d', str(value))) < 10:
+        raise ValueError("Mobile number must have at least 10 digits")
+    return value
 
 
 def register_data_routes(app):
@@ -28,19 +66,18 @@ def register_data_routes(app):
         try:
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM students ORDER BY sr_no")
-            rows = cursor.fetchall()
-            normalize_rows(rows)
-            analytics = get_cached_analytics()
-            if not analytics:
-                analytics = compute_analytics(rows)
-                save_analytics_cache(analytics)
+            page = first_page(cursor)
+            view_counts = count_views(cursor)
             cursor.close()
             conn.close()
+            analytics = load_analytics()
         except Error:
-            rows = []
+            page = {"data": [], "next_cursor": None, "has_more": False}
+            view_counts = {}
             analytics = {}
-        return render_template("students.html", students_json=rows, analytics=analytics)
+        return render_template("students.html", students_json=page,
+                               view_counts=view_counts, analytics=analytics,
+                               first_page_size=config.STUDENTS_FIRST_PAGE_SIZE)
 
     @app.route("/data")
     def data_page_legacy_redirect():
@@ -54,38 +91,17 @@ def register_data_routes(app):
             return jsonify({"error": "Missing field"}), 400
 
         field = data["field"]
-        value = data.get("value")
-
-        if field not in EDITABLE_COLUMNS:
-            return jsonify({"error": f"Field '{field}' is not editable"}), 400
-
-        if value is not None and str(value).strip() == "":
-            value = None
-
-        if value is not None:
-            if field in NUMERIC_FLOAT_COLS:
-                converted = to_float_or_none(value)
-                if converted is None:
-                    return jsonify({"error": f"{field.replace('_',' ').title()} must be a numeric value"}), 400
-                value = converted
-            elif field in NUMERIC_INT_COLS:
-                converted = to_int_or_none(value)
-                if converted is None:
-                    return jsonify({"error": f"{field.replace('_',' ').title()} must be a whole number"}), 400
-                value = converted
-            elif field == "email":
-                if not re.match(r'^[^@\s]+@[^@\s]+\.[^@\s]+$', str(value)):
-                    return jsonify({"error": "Invalid email format"}), 400
-            elif field == "mobile_number":
-                if len(re.findall(r'\d', str(value))) < 10:
-                    return jsonify({"error": "Mobile number must have at least 10 digits"}), 400
+        try:
+            value = clean_edit_value(field, data.get("value"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         try:
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
 
             cursor.execute(
-                f"SELECT `{field}`, student_name FROM students WHERE reg_no = %s",
+                f"SELECT `{field}`, student_name FROM students WHERE reg_no = %s FOR UPDATE",
                 (reg_no,),
             )
             row = cursor.fetchone()
@@ -104,6 +120,7 @@ def register_data_routes(app):
                 conn.close()
                 return jsonify({"ok": True, "reg_no": reg_no, "field": field, "value": value, "unchanged": True})
 
+            before = fetch_student_rows(cursor, [reg_no], for_update=True)
             cursor.execute(
                 f"UPDATE students SET `{field}` = %s WHERE reg_no = %s",
                 (value, reg_no),
@@ -127,10 +144,12 @@ def register_data_routes(app):
                  str(value) if value is not None else None, datetime.now()),
             )
 
+            after = fetch_student_rows(cursor, [reg_no])
+            bump_data_generation(cursor, "students")
+            apply_analytics_deltas(conn, student_row_deltas(before, after))
             conn.commit()
             cursor.close()
             conn.close()
-            invalidate_analytics_cache()
             return jsonify({"ok": True, "reg_no": reg_no, "field": field, "value": value})
         except Error as e:
             return jsonify({"error": str(e)}), 500
@@ -141,14 +160,24 @@ def register_data_routes(app):
         try:
             conn = get_connection()
             cursor = conn.cursor()
+            before = fetch_student_rows(cursor, [reg_no], for_update=True)
+            # drive_students rows go with the student (ON DELETE CASCADE)
+            cursor.execute(
+                "SELECT drive_id FROM drive_students WHERE reg_no = %s FOR UPDATE", (reg_no,)
+            )
+            drive_ids = [r[0] for r in cursor.fetchall()]
             cursor.execute("DELETE FROM students WHERE reg_no = %s", (reg_no,))
-            conn.commit()
             affected = cursor.rowcount
+            if affected:
+                bump_data_generation(cursor, "students")
+                if drive_ids:
+                    note_cdm_change(cursor, drive_ids)
+            apply_analytics_deltas(conn, student_row_deltas(before, {}))
+            conn.commit()
             cursor.close()
             conn.close()
             if affected == 0:
                 return jsonify({"error": "Student not found"}), 404
-            invalidate_analytics_cache()
             return jsonify({"ok": True, "deleted": reg_no})
         except Error as e:
             return jsonify({"error": str(e)}), 500
@@ -251,7 +280,7 @@ def register_data_routes(app):
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
 
-            cursor.execute("SELECT * FROM students WHERE reg_no = %s", (reg_no,))
+            cursor.execute("SELECT * FROM students WHERE reg_no = %s FOR UPDATE", (reg_no,))
             current = cursor.fetchone()
             if not current:
                 cursor.close()
@@ -303,78 +332,245 @@ def register_data_routes(app):
                         (reg_no,),
                     )
 
+            if changes:
+                after = fetch_student_rows(cursor, [reg_no])
+                bump_data_generation(cursor, "students")
+                apply_analytics_deltas(conn, student_row_deltas({reg_no: current}, after))
             conn.commit()
             cursor.close()
             conn.close()
 
-            if changes:
-                invalidate_analytics_cache()
-
             return jsonify({"ok": True, "reg_no": reg_no, "changed": changes})
         except Error as e:
             return jsonify({"error": str(e)}), 500
 
-    # ── Change Log API ───────────────────────────────────────────────────
-    @app.route("/api/edit-log")
-    def api_edit_log():
-        limit = request.args.get("limit", 200, type=int)
-        page = request.args.get("page", 1, type=int)
-        reg_no = request.args.get("reg_no", None)
-        offset = (page - 1) * limit
+    # ── Batch edits (many students, one transaction) ─────────────────────
+    @app.route("/api/students/batch-update", methods=["PUT"])
+    def batch_update_students():
+        """Apply ``{"edits": [{reg_no, field, value}, ...]}`` atomically.
+
+        Each edit is checked like a single inline edit; any invalid edit or
+        unknown student rejects the whole batch. A later edit to the same
+        cell wins. Changed cells are written with one UPDATE ... CASE per
+        field (per STUDENT_BATCH_EDIT_CHUNK students) and logged with one
+        multi-row edit_log insert.
+        """
+        data = request.get_json()
+        if not data or not isinstance(data.get("edits"), list) or not data["edits"]:
+            return jsonify({"error": "Missing edits"}), 400
+        edits = data["edits"]
+        if len(edits) > config.STUDENT_BATCH_EDIT_MAX:
+            return jsonify({"error": f"At most {config.STUDENT_BATCH_EDIT_MAX} edits per request"}), 400
+
+        cells, errors = {}, []
+        for i, edit in enumerate(edits):
+            if not isinstance(edit, dict) or not edit.get("reg_no") or "field" not in edit:
+                errors.append({"index": i, "error": "Each edit needs reg_no and field"})
+                continue
+            reg_no, field = str(edit["reg_no"]).strip(), edit["field"]
+            try:
+                cells[(reg_no, field)] = clean_edit_value(field, edit.get("value"))
+            except ValueError as e:
+                errors.append({"index": i, "reg_no": reg_no, "field": field, "error": str(e)})
+        if errors:
+            return jsonify({"error": "Invalid edits", "errors": errors}), 400
+
+        chunk = config.STUDENT_BATCH_EDIT_CHUNK
+        reg_nos = list(dict.fromkeys(reg_no for reg_no, _ in cells))
         try:
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
 
-            if reg_no:
+            current = {}
+            for start in range(0, len(reg_nos), chunk):
+                part = reg_nos[start:start + chunk]
                 cursor.execute(
-                    "SELECT COUNT(*) as cnt FROM edit_log WHERE reg_no = %s", (reg_no,)
+                    f"SELECT * FROM students WHERE reg_no IN ({', '.join(['%s'] * len(part))}) FOR UPDATE",
+                    part,
                 )
-            else:
-                cursor.execute("SELECT COUNT(*) as cnt FROM edit_log")
-            total_count = cursor.fetchone()["cnt"]
+                for row in cursor.fetchall():
+                    current[row["reg_no"]] = normalize_row(row)
+            missing = [r for r in reg_nos if r not in current]
+            if missing:
+                cursor.close()
+                conn.close()
+                return jsonify({"error": "Student not found", "missing": missing}), 404
+
+            now = datetime.now()
+            by_field, log_rows, placed, unplaced = {}, [], [], []
+            for (reg_no, field), value in cells.items():
+                row = current[reg_no]
+                old_value = row.get(field)
+                if str(old_value or "") == str(value or ""):
+                    continue
+                by_field.setdefault(field, []).append((reg_no, value))
+                log_rows.append((
+                    reg_no, row.get("student_name", ""), field,
+                    str(old_value) if old_value is not None else None,
+                    str(value) if value is not None else None, now,
+                ))
+                if field == "status":
+                    (placed if value == "Placed" else unplaced).append(reg_no)
+
+            for field, pairs in by_field.items():
+                for start in range(0, len(pairs), chunk):
+                    part = pairs[start:start + chunk]
+                    cursor.execute(
+                        f"UPDATE students SET `{field}` = CASE reg_no "
+                        + " ".join(["WHEN %s THEN %s"] * len(part))
+                        + f" ELSE `{field}` END WHERE reg_no IN ({', '.join(['%s'] * len(part))})",
+                        [v for pair in part for v in pair] + [reg_no for reg_no, _ in part],
+                    )
 
-            if reg_no:
+            for start in range(0, len(placed), chunk):
+                part = placed[start:start + chunk]
                 cursor.execute(
-                    "SELECT * FROM edit_log WHERE reg_no = %s ORDER BY changed_at DESC LIMIT %s OFFSET %s",
-                    (reg_no, limit, offset),
+                    "UPDATE students SET placed_date = CURDATE() WHERE placed_date IS NULL "
+                    f"AND reg_no IN ({', '.join(['%s'] * len(part))})",
+                    part,
                 )
-            else:
+            for start in range(0, len(unplaced), chunk):
+                part = unplaced[start:start + chunk]
                 cursor.execute(
-                    "SELECT * FROM edit_log ORDER BY changed_at DESC LIMIT %s OFFSET %s",
-                    (limit, offset),
+                    f"UPDATE students SET placed_date = NULL WHERE reg_no IN ({', '.join(['%s'] * len(part))})",
+                    part,
+                )
+
+            changed = list(dict.fromkeys(r[0] for r in log_rows))
+            if log_rows:
+                cursor.executemany(
+                    "INSERT INTO edit_log (reg_no, student_name, field_name, old_value, new_value, changed_at) "
+                    "VALUES (%s, %s, %s, %s, %s, %s)",
+                    log_rows,
+                )
+                after = fetch_student_rows(cursor, changed)
+                bump_data_generation(cursor, "students")
+                apply_analytics_deltas(
+                    conn, student_row_deltas({r: current[r] for r in changed}, after),
                 )
-            rows = cursor.fetchall()
-            for r in rows:
-                if r.get("changed_at"):
-                    r["changed_at"] = r["changed_at"].strftime("%d %B %Y, %I:%M %p")
+            conn.commit()
             cursor.close()
             conn.close()
 
-            total_pages = (total_count + limit - 1) // limit if limit > 0 else 1
             return jsonify({
-                "data": rows,
-                "page": page,
-                "total_pages": total_pages,
-                "total_count": total_count,
+                "ok": True,
+                "changed": len(log_rows),
+                "unchanged": len(cells) - len(log_rows),
+                "students": changed,
             })
+        except Error as e:
+            return jsonify({"error": str(e)}), 500
+
+    # ── Change Log API ───────────────────────────────────────────────────
+    @app.route("/api/edit-log")
+    def api_edit_log():
+        """Change log, newest first: ``limit``, ``after`` (next_cursor),
+        ``field``, ``from`` / ``to`` (YYYY-MM-DD) and ``reg_no``."""
+        try:
+            query = parse_log_args(request.args, "edit_log")
+        except ValueError as e:
+            return jsonify({"data": [], "error": str(e)}), 400
+        try:
+            conn = get_connection()
+            cursor = conn.cursor(dictionary=True)
+            result = fetch_log_page(cursor, "edit_log", **query)
+            cursor.close()
+            conn.close()
+            if query["page"]:
+                limit = query["limit"]
+                result["page"] = query["page"]
+                result["total_pages"] = max(1, (result["total_count"] + limit - 1) // limit)
+            return jsonify(result)
         except Error as e:
             return jsonify({"data": [], "error": str(e)}), 500
 
     # ── API: all students / search ───────────────────────────────────────
     @app.route("/api/students")
+    @conditional_get("students")
     def api_students():
+        """Students list with projection, filters, sort and keyset paging.
+
+        Query args: ``fields=a,b``, ``sort=department,-ctc``,
+        ``filters={"col": ["v", ""]}`` ('' = blank), ``view=placed`` (a
+        quick-view tile), ``limit=N``, ``after=<next_cursor>``, ``count=1``.
+        Without ``limit`` every matching row is returned.
+        """
+        try:
+            query = parse_listing_args(request.args)
+        except ValueError as e:
+            return jsonify({"data": [], "error": str(e)}), 400
         try:
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM students ORDER BY sr_no")
-            rows = cursor.fetchall()
-            normalize_rows(rows)
+            page = list_students(cursor, **query)
             cursor.close()
             conn.close()
-            return jsonify({"data": rows})
+            return jsonify(page)
         except Error as e:
             return jsonify({"data": [], "error": str(e)}), 500
 
+    @app.route("/api/students/values")
+    def api_student_values():
+        """Distinct values of ``field`` for a column filter panel."""
+        try:
+            conn = get_connection()
+            cursor = conn.cursor(dictionary=True)
+            values = column_values(cursor, request.args.get("field", ""))
+            cursor.close()
+            conn.close()
+            return jsonify({"values": values})
+        except ValueError as e:
+            return jsonify({"values": [], "error": str(e)}), 400
+        except Error as e:
+            return jsonify({"values": [], "error": str(e)}), 500
+
+    @app.route("/api/students/stats")
+    def api_student_stats():
+        """Stats panel figures; takes the same filters / view args as /api/students."""
+        try:
+            query = parse_listing_args(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            conn = get_connection()
+            cursor = conn.cursor(dictionary=True)
+            stats = view_stats(cursor, query["filters"], query["view"])
+            cursor.close()
+            conn.close()
+            return jsonify(stats)
+        except Error as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/api/students/export")
+    def api_students_export():
+        """Stream every matching student as ``format=ndjson|csv|json``.
+
+        Takes the same fields / sort / filters / view args as /api/students;
+        paging args are ignored.
+        """
+        fmt = request.args.get("format", "ndjson").lower()
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"error": f"Unknown format '{fmt}'"}), 400
+        try:
+            query = parse_listing_args(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            conn = get_connection()
+        except Error as e:
+            return jsonify({"error": str(e)}), 500
+        body = stream_students(conn, fmt, query["fields"], query["sort_keys"],
+                               query["filters"], query["view"])
+        headers = {}
+        if fmt == "csv":
+            name = f"students_{datetime.now().strftime('%Y-%m-%d')}.csv"
+            headers["Content-Disposition"] = f"attachment; filename={name}"
+        response = Response(stream_with_context(body), mimetype=EXPORT_FORMATS[fmt], headers=headers)
+        # The body closes or discards conn itself; this covers one that never
+        # started (no query was sent, so the connection is clean to pool)
+        response.call_on_close(conn.close)
+        return response
+
     @app.route("/api/search")
     def api_search():
         q = request.args.get("q", "").strip()
@@ -383,17 +579,22 @@ def register_data_routes(app):
         try:
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
-            like = f"%{q}%"
-            cursor.execute(
-                "SELECT reg_no, student_name, course, department, status, company_name "
-                "FROM students WHERE "
-                "student_name LIKE %s OR reg_no LIKE %s OR course LIKE %s OR company_name LIKE %s "
-                "ORDER BY student_name LIMIT 15",
-                (like, like, like, like),
+            rows = search_students(
+                cursor, q, ["course", "department", "status", "company_name"],
             )
-            rows = cursor.fetchall()
             cursor.close()
             conn.close()
             return jsonify({"results": rows})
         except Error as e:
             return jsonify({"results": [], "error": str(e)}), 500
+
+    @app.route("/api/search/all")
+    def api_global_search():
+        """Header search: students, recruiters, drives and HR in one ranked list."""
+        q = request.args.get("q", "").strip()
+        if len(q) < 2:
+            return jsonify({"results": []})
+        answer = global_search(q)
+        if answer["errors"] and not answer["results"]:
+            return jsonify({"results": [], "error": "; ".join(answer["errors"].values())}), 500
+        return jsonify(answer)
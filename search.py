@@ -0,0 +1,294 @@
+# search.py — Student search over the ngram FULLTEXT index, unified global search
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from mysql.connector import Error
+
+import config
+from helpers import STUDENT_SEARCH_COLUMNS, get_connection, normalize_rows
+
+# MySQL error raised when MATCH() has no FULLTEXT index to use
+ER_FT_MATCHING_KEY_NOT_FOUND = 1191
+
+_MATCH = f"MATCH({', '.join(STUDENT_SEARCH_COLUMNS)})"
+_fulltext_state = {"available": True}
+_fulltext_lock = threading.Lock()
+
+# Result tiers, best first
+TIER_EXACT, TIER_PREFIX, TIER_WORD_PREFIX, TIER_SUBSTRING, TIER_FUZZY = range(5)
+
+
+def _fulltext_available():
+    return config.SEARCH_FULLTEXT_ENABLED and _fulltext_state["available"]
+
+
+def _mark_fulltext_missing():
+    with _fulltext_lock:
+        _fulltext_state["available"] = False
+
+
+def _phrase(q):
+    """Boolean-mode phrase for ``q``: contiguous ngrams, i.e. a substring match."""
+    return '"' + q.replace('"', " ") + '"'
+
+
+def _escape_like(q):
+    return q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _text_tier(q, title, key, others=()):
+    """Tier of a hit whose display title / identifier are ``title`` / ``key``."""
+    title = (title or "").lower()
+    key = (key or "").lower()
+    if q in (title, key):
+        return TIER_EXACT
+    if title.startswith(q) or key.startswith(q):
+        return TIER_PREFIX
+    if any(word.startswith(q) for word in title.split()):
+        return TIER_WORD_PREFIX
+    if q in title or any(q in str(v or "").lower() for v in others):
+        return TIER_SUBSTRING
+    return TIER_FUZZY
+
+
+def _tier(row, q, fields):
+    return _text_tier(q, row.get("student_name"), row.get("reg_no"), [row.get(f) for f in fields])
+
+
+def rank_results(rows, q, fields, limit):
+    """Order candidates exact → prefix → word prefix → substring → fuzzy.
+
+    Within a tier, FULLTEXT relevance (``_score``) and then the name decide.
+    """
+    q = q.lower()
+    ranked = sorted(
+        rows,
+        key=lambda r: (_tier(r, q, fields), -(r.get("_score") or 0), r.get("student_name") or ""),
+    )
+    for row in ranked:
+        row.pop("_score", None)
+    return ranked[:limit]
+
+
+def _like_search(cursor, q, columns, fields, limit):
+    like = f"%{_escape_like(q)}%"
+    cursor.execute(
+        f"SELECT {', '.join(columns)} FROM students WHERE "
+        + " OR ".join(f"{f} LIKE %s" for f in fields)
+        + " ORDER BY student_name LIMIT %s",
+        tuple([like] * len(fields)) + (limit,),
+    )
+    return cursor.fetchall()
+
+
+def _fulltext_search(cursor, q, columns, fields, limit):
+    select = ", ".join(columns)
+    found = {}
+
+    def collect(rows):
+        for row in rows:
+            found.setdefault(row["reg_no"], row)
+
+    # 1. Prefix matches on the B-tree indexes (name, reg_no)
+    prefix = f"{_escape_like(q)}%"
+    cursor.execute(
+        f"SELECT {select} FROM students WHERE student_name LIKE %s OR reg_no LIKE %s "
+        f"ORDER BY student_name LIMIT %s",
+        (prefix, prefix, limit),
+    )
+    collect(cursor.fetchall())
+
+    # 2. Substring matches: the query as an ngram phrase
+    if len(found) < limit:
+        phrase = _phrase(q)
+        cursor.execute(
+            f"SELECT {select}, {_MATCH} AGAINST (%s IN BOOLEAN MODE) AS _score "
+            f"FROM students WHERE {_MATCH} AGAINST (%s IN BOOLEAN MODE) "
+            f"ORDER BY _score DESC LIMIT %s",
+            (phrase, phrase, limit * 3),
+        )
+        lowered = q.lower()
+        collect(
+            r for r in cursor.fetchall()
+            if any(lowered in str(r.get(f) or "").lower() for f in fields)
+        )
+
+    # 3. Typo tolerance: rows sharing most ngrams with the query
+    if len(found) < limit and len(q) >= config.SEARCH_FUZZY_MIN_LENGTH:
+        cursor.execute(
+            f"SELECT {select}, {_MATCH} AGAINST (%s) AS _score FROM students "
+            f"WHERE {_MATCH} AGAINST (%s) ORDER BY _score DESC LIMIT %s",
+            (q, q, limit),
+        )
+        collect(cursor.fetchall())
+
+    return list(found.values())
+
+
+def search_students(cursor, q, columns, fields=STUDENT_SEARCH_COLUMNS, limit=15):
+    """Ranked student matches for ``q``; ``cursor`` must be a dictionary cursor.
+
+    ``columns`` are returned (reg_no and student_name are always included),
+    ``fields`` are the columns a substring hit may come from. Uses the
+    ngram FULLTEXT index, and the old LIKE scan when the index is missing.
+    """
+    columns = list(dict.fromkeys(["reg_no", "student_name"] + list(columns)))
+    if _fulltext_available():
+        try:
+            rows = _fulltext_search(cursor, q, columns, fields, limit)
+            return rank_results(rows, q, fields, limit)
+        except Error as e:
+            if e.errno != ER_FT_MATCHING_KEY_NOT_FOUND:
+                raise
+            _mark_fulltext_missing()
+    return rank_results(_like_search(cursor, q, columns, fields, limit), q, fields, limit)
+
+
+# ── Unified global search ────────────────────────────────────────────────────
+# Students, recruiters (companies), drives and HR contacts are searched in
+# parallel, each on its own pooled connection, then merged into one ranked
+# list. Answers are cached per query for SEARCH_CACHE_TTL_SECONDS.
+SEARCH_SOURCES = ("student", "company", "drive", "hr")
+
+_executor = ThreadPoolExecutor(max_workers=config.SEARCH_WORKERS, thread_name_prefix="search")
+_cache = OrderedDict()       # (query, limit) → (expires_at, results)
+_cache_lock = threading.Lock()
+
+
+def _run_query(sql, params):
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    return normalize_rows(rows)
+
+
+def _search_student_items(q, limit):
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        rows = search_students(cursor, q, ["course", "department", "status", "company_name"], limit=limit)
+        cursor.close()
+    finally:
+        conn.close()
+    return [{
+        "type": "student", "id": r["reg_no"], "title": r.get("student_name"),
+        "subtitle": " · ".join(v for v in (r["reg_no"], r.get("course")) if v),
+        "status": r.get("status"),
+        "tier": _tier(r, q.lower(), STUDENT_SEARCH_COLUMNS),
+    } for r in rows]
+
+
+def _search_company_items(q, limit):
+    like = f"%{_escape_like(q)}%"
+    rows = _run_query(
+        "SELECT company_id, company_name, received_by FROM companies "
+        "WHERE company_name LIKE %s OR company_id LIKE %s "
+        "ORDER BY company_name LIMIT %s",
+        (like, like, limit),
+    )
+    return [{
+        "type": "company", "id": r["company_id"], "title": r.get("company_name"),
+        "subtitle": " · ".join(v for v in (r["company_id"], r.get("received_by")) if v),
+        "company_id": r["company_id"],
+        "tier": _text_tier(q.lower(), r.get("company_name"), r["company_id"]),
+    } for r in rows]
+
+
+def _search_drive_items(q, limit):
+    like = f"%{_escape_like(q)}%"
+    rows = _run_query(
+        "SELECT d.drive_id, d.company_id, c.company_name, d.role, d.location, d.status, d.process_date "
+        "FROM company_drives d JOIN companies c ON d.company_id = c.company_id "
+        "WHERE d.role LIKE %s OR d.location LIKE %s "
+        "ORDER BY d.process_date DESC, d.drive_id DESC LIMIT %s",
+        (like, like, limit),
+    )
+    return [{
+        "type": "drive", "id": r["drive_id"], "title": r.get("role"),
+        "subtitle": " · ".join(v for v in (r.get("company_name"), r.get("location"), r.get("process_date")) if v),
+        "status": r.get("status"), "company_id": r["company_id"],
+        "tier": _text_tier(q.lower(), r.get("role"), None, [r.get("location")]),
+    } for r in rows]
+
+
+def _search_hr_items(q, limit):
+    like = f"%{_escape_like(q)}%"
+    rows = _run_query(
+        "SELECT h.hr_id, h.company_id, h.name, h.designation, h.email, c.company_name "
+        "FROM company_hr h JOIN companies c ON h.company_id = c.company_id "
+        "WHERE h.name LIKE %s OR h.email LIKE %s "
+        "ORDER BY h.name LIMIT %s",
+        (like, like, limit),
+    )
+    return [{
+        "type": "hr", "id": r["hr_id"], "title": r.get("name"),
+        "subtitle": " · ".join(v for v in (r.get("designation"), r.get("company_name"), r.get("email")) if v),
+        "company_id": r["company_id"],
+        "tier": _text_tier(q.lower(), r.get("name"), r.get("email")),
+    } for r in rows]
+
+
+_SOURCE_FUNCS = {
+    "student": _search_student_items,
+    "company": _search_company_items,
+    "drive": _search_drive_items,
+    "hr": _search_hr_items,
+}
+
+
+def _cache_get(key):
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] > now:
+            _cache.move_to_end(key)
+            return hit[1]
+        if hit:
+            del _cache[key]
+    return None
+
+
+def _cache_put(key, value):
+    with _cache_lock:
+        _cache[key] = (time.monotonic() + config.SEARCH_CACHE_TTL_SECONDS, value)
+        _cache.move_to_end(key)
+        while len(_cache) > config.SEARCH_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def global_search(q, limit=20):
+    """One ranked list of students, recruiters, drives and HR contacts.
+
+    Returns ``{"results": [...], "errors": {...}}``; each result carries
+    ``type``, ``id``, ``title``, ``subtitle`` and its rank ``tier``. A source
+    that fails is reported under ``errors`` and the others still answer.
+    Failed answers are not cached.
+    """
+    q = " ".join(q.split())
+    key = (q.lower(), limit)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    per_source = max(5, limit // 2)
+    futures = {name: _executor.submit(_SOURCE_FUNCS[name], q, per_source) for name in SEARCH_SOURCES}
+    items, errors = [], {}
+    for order, name in enumerate(SEARCH_SOURCES):
+        try:
+            found = futures[name].result()
+        except Error as e:
+            errors[name] = str(e)
+            continue
+        items.extend((item["tier"], order, pos, item) for pos, item in enumerate(found))
+    items.sort(key=lambda t: t[:3])
+    answer = {"results": [item for _, _, _, item in items[:limit]], "errors": errors}
+    if not errors:
+        _cache_put(key, answer)
+    return answer
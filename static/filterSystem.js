@@ -8,6 +8,12 @@
  *     keys:          DATA_KEYS,        // ordered column key array
  *     tableConfig:   { ... }           // DataTable overrides (language, etc.)
  *   });
+ *   filterApi.appendData(rows);         // add rows loaded after init
+ *
+ * Remote mode — pass `remote: { reload: fn(filters), values: fn(key, cb) }`
+ * when the table holds only the rows loaded so far: filter changes call
+ * remote.reload() (which answers with filterApi.setData(rows)) instead of
+ * filtering locally, and panels list the values remote.values() returns.
  *
  * All optimizations:
  *   1. Pre-normalise data (all values → trimmed strings) once at load
@@ -29,11 +35,12 @@ function initFilterSystem(opts) {
     var tableConfig = opts.tableConfig || {};
     var headerRowSelector = opts.headerRowSelector || '#headerRow';
     var filterRowSelector = opts.filterRowSelector || '#filterRow';
+    var remote = opts.remote || null;
 
     /* ──────────────────────────────────────────────────────────
        1. Pre-normalise LOCAL_DATA — all values become strings
        ────────────────────────────────────────────────────────── */
-    var LOCAL_DATA = opts.data.map(function (row) {
+    function normaliseRow(row) {
         var out = {};
         for (var k in row) {
             if (Object.prototype.hasOwnProperty.call(row, k)) {
@@ -42,16 +49,20 @@ function initFilterSystem(opts) {
             }
         }
         return out;
-    });
+    }
+    var LOCAL_DATA = opts.data.map(normaliseRow);
 
     /* ──────────────────────────────────────────────────────────
        6. Cache unique values per column (single scan)
        ────────────────────────────────────────────────────────── */
     var COLUMN_UNIQUE_VALUES = {};
     DATA_KEYS.forEach(function (k) { COLUMN_UNIQUE_VALUES[k] = new Set(); });
-    LOCAL_DATA.forEach(function (row) {
-        DATA_KEYS.forEach(function (k) { COLUMN_UNIQUE_VALUES[k].add(row[k]); });
-    });
+    function collectUniqueValues(rows) {
+        rows.forEach(function (row) {
+            DATA_KEYS.forEach(function (k) { COLUMN_UNIQUE_VALUES[k].add(row[k]); });
+        });
+    }
+    collectUniqueValues(LOCAL_DATA);
 
     /* ── Global filter state ────────────────────────────────── */
     var ACTIVE_FILTERS = {};
@@ -111,6 +122,10 @@ function initFilterSystem(opts) {
        2 + 3 + 4 + 5.  Optimised filter engine
        ────────────────────────────────────────────────────────── */
     function applyAllFilters() {
+        if (remote) {
+            remote.reload(JSON.parse(JSON.stringify(ACTIVE_FILTERS)));
+            return;
+        }
         var baseData = preFilterFn ? LOCAL_DATA.filter(preFilterFn) : LOCAL_DATA;
         var keys = Object.keys(ACTIVE_FILTERS);
 
@@ -152,17 +167,44 @@ function initFilterSystem(opts) {
         table.draw(false);
     }
 
+    /* Pre-filter + column filters applied to any subset of LOCAL_DATA */
+    function filterRows(rows) {
+        var baseData = preFilterFn ? rows.filter(preFilterFn) : rows;
+        var keys = Object.keys(ACTIVE_FILTERS);
+        if (keys.length === 0) return baseData.slice();
+        var compiled = [];
+        for (var i = 0; i < keys.length; i++) {
+            var vals = ACTIVE_FILTERS[keys[i]];
+            if (vals && vals.length > 0) compiled.push({ key: keys[i], set: new Set(vals) });
+        }
+        if (compiled.length === 0) return baseData.slice();
+        return baseData.filter(function (row) {
+            for (var j = 0; j < compiled.length; j++) {
+                if (!compiled[j].set.has(row[compiled[j].key])) return false;
+            }
+            return true;
+        });
+    }
+
     /* ──────────────────────────────────────────────────────────
        Populate a single column filter from cached unique values
        ────────────────────────────────────────────────────────── */
     function populateColumnFilter(colIndex) {
         var key = DATA_KEYS[colIndex];
-        var $list = getPanel(colIndex).find('.cf-list');
-        $list.empty();
+        getPanel(colIndex).find('.cf-list').empty();
+        if (remote) {
+            remote.values(key, function (values) { renderColumnFilter(colIndex, values); });
+        } else {
+            /* Read from cached set — no re-scan needed */
+            renderColumnFilter(colIndex, COLUMN_UNIQUE_VALUES[key]);
+        }
+    }
 
-        /* Read from cached set — no re-scan needed */
+    function renderColumnFilter(colIndex, rawValues) {
+        var key = DATA_KEYS[colIndex];
+        var $list = getPanel(colIndex).find('.cf-list');
         var seen = {};
-        COLUMN_UNIQUE_VALUES[key].forEach(function (raw) {
+        rawValues.forEach(function (raw) {
             var norm = raw.toLowerCase();
             if (!(norm in seen)) seen[norm] = raw;
         });
@@ -175,12 +217,15 @@ function initFilterSystem(opts) {
         });
 
         var html = '';
+        /* Keep the current selection when a panel is rebuilt after appendData */
+        var allowed = ACTIVE_FILTERS[key] ? new Set(ACTIVE_FILTERS[key]) : null;
         vals.forEach(function (val) {
             var label = val === '' ? '(Blank)' : val;
             var safeVal = $('<i>').text(val).html();
             var safeLbl = $('<span>').text(label).html();
+            var checked = (!allowed || allowed.has(val)) ? ' checked' : '';
             html += '<li data-val="' + safeVal + '">' +
-                '<label><input type="checkbox" checked>' +
+                '<label><input type="checkbox"' + checked + '>' +
                 '<span>' + safeLbl + '</span></label></li>';
         });
         $list.html(html);
@@ -343,21 +388,30 @@ function initFilterSystem(opts) {
             applyAllFilters();
         },
         getCurrentData: function () {
-            var baseData = preFilterFn ? LOCAL_DATA.filter(preFilterFn) : LOCAL_DATA;
-            var keys = Object.keys(ACTIVE_FILTERS);
-            if (keys.length === 0) return baseData.slice();
-            var compiled = [];
-            for (var i = 0; i < keys.length; i++) {
-                var vals = ACTIVE_FILTERS[keys[i]];
-                if (vals && vals.length > 0) compiled.push({ key: keys[i], set: new Set(vals) });
+            return filterRows(LOCAL_DATA);
+        },
+        appendData: function (rows) {
+            /* Add rows fetched later (e.g. further /api/students pages) */
+            var added = rows.map(normaliseRow);
+            Array.prototype.push.apply(LOCAL_DATA, added);
+            if (remote) {
+                /* Already filtered server-side; panels list server values */
+                table.rows.add(added);
+                table.draw(false);
+                return;
             }
-            if (compiled.length === 0) return baseData.slice();
-            return baseData.filter(function (row) {
-                for (var j = 0; j < compiled.length; j++) {
-                    if (!compiled[j].set.has(row[compiled[j].key])) return false;
-                }
-                return true;
-            });
+            collectUniqueValues(added);
+            FILTER_POPULATED = {};
+            /* Filters are per-row, so only the new rows need checking */
+            table.rows.add(filterRows(added));
+            table.draw(false);
+        },
+        setData: function (rows) {
+            /* Remote mode: replace the loaded rows (first page of a new query) */
+            LOCAL_DATA = rows.map(normaliseRow);
+            table.clear();
+            table.rows.add(LOCAL_DATA);
+            table.draw();
         },
         getRawData: function () { return LOCAL_DATA; },
         getTable: function () { return table; }
@@ -1,5 +1,5 @@
 /**
- * Global Student Search — autocomplete search in the navbar
+ * Global Search — navbar autocomplete over students, recruiters, drives and HR contacts
  * Requires jQuery. Include this script after jQuery on any page with the global search bar.
  */
 (function () {
@@ -47,6 +47,31 @@
         };
     }
 
+    var TYPE_LABELS = { student: 'Student', company: 'Recruiter', drive: 'Drive', hr: 'HR Contact' };
+
+    function escapeHtml(text) {
+        return $('<i>').text(text).html();
+    }
+
+    function truncate(text, max) {
+        return text.length > max ? text.substring(0, max) + '…' : text;
+    }
+
+    function resultHref(r) {
+        if (r.type === 'student') return '/student/' + encodeURIComponent(r.id);
+        return '/recruitment/recruiter/' + encodeURIComponent(r.company_id);
+    }
+
+    function resultBadge(r) {
+        if (r.type === 'student' && r.status === 'Placed') {
+            return '<span class="badge bg-success ms-2" style="font-size:0.65rem;">Placed</span>';
+        }
+        if (r.type === 'drive' && r.status) {
+            return '<span class="badge bg-info ms-2" style="font-size:0.65rem;">' + escapeHtml(r.status) + '</span>';
+        }
+        return '';
+    }
+
     var debounceTimer = null;
     var $input = $('#globalSearch');
     var $results = $('#globalSearchResults');
@@ -61,20 +86,17 @@
             return;
         }
         debounceTimer = setTimeout(function () {
-            $.getJSON('/api/search?q=' + encodeURIComponent(q), function (res) {
+            $.getJSON('/api/search/all?q=' + encodeURIComponent(q), function (res) {
+                if ($input.val().trim() !== q) return;  // a newer query is on its way
                 if (!res.results || res.results.length === 0) {
-                    $results.html('<div class="gs-empty">No students found</div>').show();
+                    $results.html('<div class="gs-empty">No matches found</div>').show();
                     return;
                 }
                 var html = '';
-                res.results.forEach(function (s) {
-                    var badge = '';
-                    if (s.status === 'Placed') badge = '<span class="badge bg-success ms-2" style="font-size:0.65rem;">Placed</span>';
-                    var course = s.course || '';
-                    if (course.length > 40) course = course.substring(0, 40) + '…';
-                    html += '<a class="gs-item" href="/student/' + encodeURIComponent(s.reg_no) + '">';
-                    html += '<div class="gs-name">' + (s.student_name || '') + badge + '</div>';
-                    html += '<div class="gs-meta">' + s.reg_no + ' · ' + course + '</div>';
+                res.results.forEach(function (r) {
+                    html += '<a class="gs-item" href="' + resultHref(r) + '">';
+                    html += '<div class="gs-name">' + escapeHtml(r.title || '') + resultBadge(r) + '</div>';
+                    html += '<div class="gs-meta">' + TYPE_LABELS[r.type] + ' · ' + escapeHtml(truncate(r.subtitle || '', 60)) + '</div>';
                     html += '</a>';
                 });
                 $results.html(html).show();
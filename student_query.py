@@ -0,0 +1,405 @@
+# student_query.py — Server-side student listing (projection, filters, sort, keyset pages)
+import base64
+import binascii
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from mysql.connector import Error
+
+import config
+from helpers import DISPLAY_COLUMNS, DB_COLUMNS, NUMERIC_FLOAT_COLS, NUMERIC_INT_COLS, normalize_rows
+
+# Columns a caller may project, filter or sort on
+LISTABLE_COLUMNS = DB_COLUMNS + ["placed_date"]
+# Non-text columns: a "(Blank)" filter value means NULL only ('' would compare as 0)
+NON_TEXT_COLUMNS = NUMERIC_FLOAT_COLS | NUMERIC_INT_COLS | {"sr_no", "placed_date"}
+DEFAULT_SORT = [("sr_no", False)]
+
+# Quick-view tiles on the Students page, as SQL (mirrors FILTER_FUNCTIONS there)
+CSE_COURSES = [
+    "B Tech Artificial Intelligence",
+    "B Tech CSE",
+    "BCA",
+    "MCA",
+    "MTech Computer Science",
+]
+
+
+def _prefix_filter(prefixes):
+    sql = "(" + " OR ".join(["course LIKE %s"] * len(prefixes)) + ")"
+    return sql, [p + "%" for p in prefixes]
+
+
+VIEW_FILTERS = {
+    "placed": ("status = 'Placed'", []),
+    "unplaced": ("seeking_placement = 'Opted In' AND NOT (status <=> 'Placed')", []),
+    "eligible": ("seeking_placement = 'Opted In' AND (backlogs IS NULL OR backlogs < 3)", []),
+    "ineligible": ("seeking_placement = 'Opted In' AND backlogs >= 3", []),
+    "opted_out": ("seeking_placement = 'Opted Out'", []),
+    "cse": _prefix_filter(CSE_COURSES),
+    "mba": _prefix_filter(["MBA"]),
+    "bba": _prefix_filter(["BBA"]),
+    "pharmacy": _prefix_filter(["B Pharmacy", "M Pharmacy"]),
+}
+
+
+# ── Request parsing ──────────────────────────────────────────────────────────
+def parse_fields(raw):
+    """``a,b,c`` → validated column list (all listable columns when empty)."""
+    fields = [f.strip() for f in (raw or "").split(",") if f.strip()]
+    if not fields:
+        return list(LISTABLE_COLUMNS)
+    unknown = [f for f in fields if f not in LISTABLE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return list(dict.fromkeys(fields))
+
+
+def parse_sort(raw):
+    """``department,-ctc`` → [(column, descending), ...] ending in reg_no.
+
+    reg_no (the primary key) is always the final key so the order is total
+    and a keyset cursor identifies exactly one position.
+    """
+    keys = []
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        desc = part.startswith("-")
+        col = part.lstrip("+-").strip()
+        if col not in LISTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort by '{col}'")
+        if col not in (c for c, _ in keys):
+            keys.append((col, desc))
+    keys = keys or list(DEFAULT_SORT)
+    if "reg_no" not in (c for c, _ in keys):
+        keys.append(("reg_no", False))
+    return keys
+
+
+def parse_filters(raw):
+    """JSON ``{column: [values]}`` as kept by filterSystem.js ('' = blank)."""
+    if not raw:
+        return {}
+    try:
+        filters = json.loads(raw)
+    except ValueError:
+        raise ValueError("filters must be a JSON object")
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be a JSON object")
+    parsed = {}
+    for col, values in filters.items():
+        if col not in LISTABLE_COLUMNS:
+            raise ValueError(f"Cannot filter on '{col}'")
+        if not isinstance(values, list):
+            values = [values]
+        values = ["" if v is None else str(v).strip() for v in values]
+        if values:
+            parsed[col] = values
+    return parsed
+
+
+def encode_cursor(sort_keys, row):
+    payload = {"k": [[c, d] for c, d in sort_keys], "v": [row.get(c) for c, _ in sort_keys]}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(token, sort_keys):
+    """Return the sort-key values stored in an ``after`` cursor."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        keys, values = payload["k"], payload["v"]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+    if [tuple(k) for k in keys] != list(sort_keys) or len(values) != len(sort_keys):
+        raise ValueError("Cursor does not match the requested sort")
+    return values
+
+
+def parse_listing_args(args):
+    """Turn /api/students query args into list_students keyword arguments.
+
+    Without ``limit`` the whole (filtered) result comes back in one page,
+    as the endpoint always did; with it, pages are capped at
+    STUDENTS_API_MAX_LIMIT rows. Raises ValueError on bad input.
+    """
+    sort_keys = parse_sort(args.get("sort"))
+    limit = args.get("limit", type=int)
+    if limit is not None:
+        limit = max(1, min(limit, config.STUDENTS_API_MAX_LIMIT))
+    view = (args.get("view") or "").strip() or None
+    if view == "all":
+        view = None
+    if view is not None and view not in VIEW_FILTERS:
+        raise ValueError(f"Unknown view '{view}'")
+    after = args.get("after")
+    return {
+        "fields": parse_fields(args.get("fields")),
+        "sort_keys": sort_keys,
+        "filters": parse_filters(args.get("filters")),
+        "view": view,
+        "after": decode_cursor(after, sort_keys) if after else None,
+        "limit": limit,
+        "with_total": args.get("count") in ("1", "true"),
+    }
+
+
+# ── SQL building ─────────────────────────────────────────────────────────────
+def filter_clause(filters, view=None):
+    """WHERE fragments and params for a quick view plus column value filters."""
+    clauses, params = [], []
+    if view:
+        sql, view_params = VIEW_FILTERS[view]
+        clauses.append(f"({sql})")
+        params.extend(view_params)
+    for col, values in filters.items():
+        parts = []
+        present = [v for v in dict.fromkeys(values) if v != ""]
+        if present:
+            parts.append(f"`{col}` IN ({', '.join(['%s'] * len(present))})")
+            params.extend(present)
+        if "" in values:
+            if col in NON_TEXT_COLUMNS:
+                parts.append(f"`{col}` IS NULL")
+            else:
+                parts.append(f"(`{col}` IS NULL OR `{col}` = '')")
+        clauses.append("(" + " OR ".join(parts) + ")")
+    return clauses, params
+
+
+def keyset_clause(sort_keys, after):
+    """Rows strictly after ``after`` in ORDER BY sort_keys, NULL-aware.
+
+    MySQL sorts NULLs first ascending and last descending; the expansion
+    ``k1 > v1 OR (k1 = v1 AND k2 > v2) OR …`` follows the same rule.
+    """
+    branches, params = [], []
+    equal_sql, equal_params = [], []
+    for (col, desc), value in zip(sort_keys, after):
+        c = f"`{col}`"
+        if value is None:
+            beyond, beyond_params = (None if desc else f"{c} IS NOT NULL"), []
+            equal, eq_params = f"{c} IS NULL", []
+        else:
+            beyond = f"({c} < %s OR {c} IS NULL)" if desc else f"{c} > %s"
+            beyond_params = [value]
+            equal, eq_params = f"{c} = %s", [value]
+        if beyond:
+            branches.append("(" + " AND ".join(equal_sql + [beyond]) + ")")
+            params.extend(equal_params + beyond_params)
+        equal_sql.append(equal)
+        equal_params.extend(eq_params)
+    if not branches:
+        return "FALSE", []
+    return "(" + " OR ".join(branches) + ")", params
+
+
+def _where(clauses):
+    return (" WHERE " + " AND ".join(clauses)) if clauses else ""
+
+
+def list_students(cursor, fields, sort_keys, filters=None, view=None,
+                  after=None, limit=None, with_total=False):
+    """Fetch one page of students; ``cursor`` must be a dictionary cursor.
+
+    Returns ``{data, next_cursor, has_more[, total]}``. Rows carry the
+    requested fields plus reg_no and the sort columns (needed for the
+    cursor). ``total`` counts every row matching the filters.
+    """
+    filters = filters or {}
+    columns = list(dict.fromkeys(fields + ["reg_no"] + [c for c, _ in sort_keys]))
+    clauses, params = filter_clause(filters, view)
+    page_clauses, page_params = list(clauses), list(params)
+    if after is not None:
+        sql, keyset_params = keyset_clause(sort_keys, after)
+        page_clauses.append(sql)
+        page_params.extend(keyset_params)
+
+    order = ", ".join(f"`{c}` {'DESC' if d else 'ASC'}" for c, d in sort_keys)
+    sql = (
+        f"SELECT {', '.join(f'`{c}`' for c in columns)} FROM students"
+        f"{_where(page_clauses)} ORDER BY {order}"
+    )
+    if limit:
+        sql += " LIMIT %s"
+        page_params.append(limit + 1)
+    cursor.execute(sql, page_params)
+    rows = cursor.fetchall()
+
+    has_more = bool(limit) and len(rows) > limit
+    if has_more:
+        rows = rows[:limit]
+    normalize_rows(rows)
+    page = {
+        "data": rows,
+        "next_cursor": encode_cursor(sort_keys, rows[-1]) if has_more else None,
+        "has_more": has_more,
+    }
+    if with_total:
+        cursor.execute(f"SELECT COUNT(*) AS cnt FROM students{_where(clauses)}", params)
+        page["total"] = cursor.fetchone()["cnt"]
+    return page
+
+
+def first_page(cursor, limit=None):
+    """First page of the Students table, in its default sort and columns."""
+    return list_students(
+        cursor, list(DISPLAY_COLUMNS), parse_sort(None),
+        limit=limit or config.STUDENTS_FIRST_PAGE_SIZE, with_total=True,
+    )
+
+
+def _filter_value(v):
+    """A value as filterSystem.js shows it (JS prints 7.0 as "7")."""
+    if v is None:
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v).strip()
+
+
+def column_values(cursor, field):
+    """Distinct values of one column for its filter panel, blank ('') first.
+
+    Capped at STUDENTS_FILTER_VALUES_MAX; ``cursor`` must be a dictionary
+    cursor.
+    """
+    if field not in LISTABLE_COLUMNS:
+        raise ValueError(f"Cannot filter on '{field}'")
+    cursor.execute(
+        f"SELECT DISTINCT `{field}` FROM students ORDER BY `{field}` LIMIT %s",
+        (config.STUDENTS_FILTER_VALUES_MAX,),
+    )
+    values = (_filter_value(r[field]) for r in normalize_rows(cursor.fetchall()))
+    return list(dict.fromkeys(values))
+
+
+def view_stats(cursor, filters=None, view=None):
+    """Stats panel figures for the students matching a view / filters.
+
+    Counts come from one aggregate scan; CTC figures are over placed
+    students with a positive CTC. ``cursor`` must be a dictionary cursor.
+    """
+    clauses, params = filter_clause(filters or {}, view)
+    cursor.execute(
+        "SELECT COUNT(*) AS total, "
+        "COALESCE(SUM(seeking_placement = 'Opted In'), 0) AS opted_in, "
+        f"COALESCE(SUM({VIEW_FILTERS['eligible'][0]}), 0) AS eligible, "
+        f"COALESCE(SUM({VIEW_FILTERS['placed'][0]}), 0) AS placed "
+        f"FROM students{_where(clauses)}",
+        params,
+    )
+    row = cursor.fetchone()
+    stats = {k: int(row[k]) for k in ("total", "opted_in", "eligible", "placed")}
+    cursor.execute(
+        f"SELECT ctc FROM students{_where(clauses + ['status = %s', 'ctc > 0'])} ORDER BY ctc",
+        params + ["Placed"],
+    )
+    ctcs = [float(r["ctc"]) for r in cursor.fetchall()]
+    mean = median = highest = None
+    if ctcs:
+        mid = len(ctcs) // 2
+        mean = round(sum(ctcs) / len(ctcs), 2)
+        median = round((ctcs[mid - 1] + ctcs[mid]) / 2 if len(ctcs) % 2 == 0 else ctcs[mid], 2)
+        highest = round(ctcs[-1], 2)
+    stats.update({
+        "mean_ctc": mean,
+        "median_ctc": median,
+        "highest_ctc": highest,
+        "placement_rate": round(stats["placed"] / stats["eligible"] * 100, 1) if stats["eligible"] else None,
+    })
+    return stats
+
+
+def count_views(cursor):
+    """Row counts for every quick view in one scan (dictionary cursor)."""
+    selects, params = [], []
+    for name, (sql, view_params) in VIEW_FILTERS.items():
+        selects.append(f"COALESCE(SUM({sql}), 0) AS `{name}`")
+        params.extend(view_params)
+    cursor.execute(f"SELECT {', '.join(selects)} FROM students", params)
+    row = cursor.fetchone() or {}
+    return {name: int(row.get(name) or 0) for name in VIEW_FILTERS}
+
+
+# ── Streaming export ─────────────────────────────────────────────────────────
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "json": "application/json",
+}
+
+
+def _export_value(v):
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(v, date):
+        return v.strftime("%Y-%m-%d")
+    return v
+
+
+def _csv_line(values):
+    buf = io.StringIO()
+    csv.writer(buf).writerow(["" if v is None else v for v in values])
+    return buf.getvalue()
+
+
+def stream_students(conn, fmt, fields, sort_keys, filters=None, view=None):
+    """Yield the filtered student table as NDJSON, CSV or a JSON array.
+
+    Rows come off an unbuffered cursor ``STUDENTS_EXPORT_BATCH`` at a time,
+    so memory stays flat however large the table is. The generator owns
+    ``conn``: it goes back to the pool once the result is fully read, and
+    is discarded when the stream is abandoned (client disconnect) or fails
+    midway, as its unread result makes it unfit for reuse.
+    """
+    clauses, params = filter_clause(filters or {}, view)
+    order = ", ".join(f"`{c}` {'DESC' if d else 'ASC'}" for c, d in sort_keys)
+    cursor = conn.cursor(buffered=False)
+    finished = False
+    try:
+        cursor.execute(
+            f"SELECT {', '.join(f'`{c}`' for c in fields)} FROM students"
+            f"{_where(clauses)} ORDER BY {order}",
+            params,
+        )
+        if fmt == "csv":
+            yield _csv_line(fields)
+        elif fmt == "json":
+            yield "["
+        first = True
+        while True:
+            batch = cursor.fetchmany(config.STUDENTS_EXPORT_BATCH)
+            if not batch:
+                break
+            if fmt == "csv":
+                yield "".join(_csv_line(_export_value(v) for v in row) for row in batch)
+                continue
+            lines = [
+                json.dumps(dict(zip(fields, map(_export_value, row))))
+                for row in batch
+            ]
+            if fmt == "ndjson":
+                yield "\n".join(lines) + "\n"
+            else:
+                yield ("" if first else ",") + ",".join(lines)
+            first = False
+        if fmt == "json":
+            yield "]"
+        finished = True
+    finally:
+        if finished:
+            try:
+                cursor.close()
+            except Error:
+                pass
+            conn.close()
+        else:
+            # Unpooled connections (DB_POOL_ENABLED off) just close
+            getattr(conn, "discard", conn.close)()
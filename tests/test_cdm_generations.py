@@ -0,0 +1,71 @@
+# tests/test_cdm_generations.py — Student deletes move the cdm generation (no MySQL needed)
+import app as app_module
+import routes_data
+
+
+class FakeCursor:
+    def __init__(self, log, drive_ids):
+        self.log = log
+        self.drive_ids = drive_ids
+        self.description = [("reg_no",)]
+        self.rowcount = 0
+        self._result = []
+
+    def execute(self, sql, params=()):
+        self.log.append((sql, params))
+        self._result = []
+        if sql.startswith("SELECT drive_id FROM drive_students"):
+            self._result = [(d,) for d in self.drive_ids]
+        elif sql.startswith("SELECT generation FROM data_generations"):
+            self._result = [(7,)]
+        elif sql.startswith("DELETE FROM students"):
+            self.rowcount = 1
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, drive_ids=()):
+        self.log = []
+        self.drive_ids = list(drive_ids)
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.log, self.drive_ids)
+
+    def commit(self):
+        self.log.append(("COMMIT", ()))
+
+    def close(self):
+        pass
+
+
+def _bumped(log):
+    return [p[0] for sql, p in log if sql.startswith("INSERT INTO data_generations")]
+
+
+def test_delete_student_records_its_drives(monkeypatch):
+    conn = FakeConnection(drive_ids=[3, 5])
+    monkeypatch.setattr(routes_data, "get_connection", lambda: conn)
+    response = app_module.app.test_client().delete("/api/student/R001")
+
+    assert response.status_code == 200
+    assert _bumped(conn.log) == ["students", "cdm"]
+    changes = [p for sql, p in conn.log if sql.startswith("INSERT IGNORE INTO cdm_listing_changes")]
+    assert changes == [[7, 3, 7, 5]]
+
+
+def test_drop_all_moves_the_cdm_generation(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(app_module, "get_connection", lambda: conn)
+    monkeypatch.setattr(app_module, "invalidate_analytics_cache", lambda: None)
+    response = app_module.app.test_client().post("/drop-all")
+
+    assert response.status_code == 302
+    assert _bumped(conn.log) == ["students", "cdm"]
@@ -0,0 +1,71 @@
+# tests/test_cdm_import.py — CDM sheet import: drive ids read back for drive_courses (no MySQL needed)
+from datetime import date
+
+from routes_cdm import _DRIVE_INSERT_COLUMNS, _DRIVE_MATCH_COLUMNS, import_cdm_rows
+
+
+class FakeCursor:
+    """Dictionary cursor over in-memory drives whose AUTO_INCREMENT values
+    interleave with another session's, as under innodb_autoinc_lock_mode=2."""
+
+    def __init__(self, free_ids):
+        self.free_ids = iter(free_ids)
+        self.drives = {}
+        self.drive_courses = []
+        self.lastrowid = None
+        self._result = []
+
+    def execute(self, sql, params=()):
+        self._result = []
+        if sql.startswith("INSERT INTO company_drives"):
+            width = len(_DRIVE_INSERT_COLUMNS)
+            ids = []
+            for start in range(0, len(params), width):
+                row = dict(zip(_DRIVE_INSERT_COLUMNS, params[start:start + width]))
+                if row["process_date"]:
+                    row["process_date"] = date.fromisoformat(row["process_date"])
+                row["drive_id"] = next(self.free_ids)
+                self.drives[row["drive_id"]] = row
+                ids.append(row["drive_id"])
+            self.lastrowid = ids[0]
+        elif sql.startswith("SELECT drive_id, ") and "FROM company_drives" in sql:
+            self._result = [
+                {c: self.drives[i][c] for c in ("drive_id",) + _DRIVE_MATCH_COLUMNS}
+                for i in sorted(self.drives) if i >= params[0]
+            ]
+        elif sql.startswith("INSERT IGNORE INTO drive_courses"):
+            self.drive_courses += list(zip(params[::2], params[1::2]))
+
+    def fetchall(self):
+        return self._result
+
+
+def _row(company_id, role, courses, process_date=None):
+    return {
+        "company_id": company_id, "company_name": company_id.upper(), "role": role,
+        "ctc_text": None, "jd_received_date": None, "process_date": process_date,
+        "data_shared": False, "location": None, "received_by": None, "notes": None,
+        "courses": courses, "hr": None,
+    }
+
+
+def test_courses_attach_to_their_own_drives_when_ids_interleave():
+    # 11, 13 and 14 went to another request's inserts meanwhile
+    cursor = FakeCursor([10, 12, 15, 16])
+    rows = [
+        _row("acme", "Analyst", ["BCA"]),
+        _row("acme", "Engineer", ["B Tech CSE", "MCA"], "2026-01-05"),
+        _row("beta", None, ["MBA"]),
+        _row("beta", None, ["BBA"]),
+    ]
+    assert import_cdm_rows(cursor, rows) == (2, 4, 0)
+
+    courses = {}
+    for drive_id, course in cursor.drive_courses:
+        drive = cursor.drives[drive_id]
+        courses.setdefault((drive["company_id"], drive["role"]), set()).add(course)
+    assert courses[("acme", "Analyst")] == {"BCA"}
+    assert courses[("acme", "Engineer")] == {"B Tech CSE", "MCA"}
+    assert courses[("beta", None)] == {"MBA", "BBA"}
+    per_drive = [drive_id for drive_id, _ in cursor.drive_courses]
+    assert sorted(per_drive) == [10, 12, 12, 15, 16]
@@ -0,0 +1,97 @@
+# tests/test_pool.py — Connection pool slot accounting (no MySQL needed)
+from mysql.connector import Error
+
+from helpers import ConnectionPool
+from student_query import stream_students
+
+
+class FakeCursor:
+    def execute(self, sql, params=None):
+        self._rows = [("R%03d" % i,) for i in range(3)]
+
+    def fetchmany(self, size):
+        batch, self._rows = self._rows[:1], self._rows[1:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def cursor(self, **kwargs):
+        return FakeCursor()
+
+    def rollback(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def _pool(size=2):
+    return ConnectionPool("test", size=size, max_idle=0, timeout=0.1,
+                          ping_interval=60, factory=FakeConnection)
+
+
+def test_dropped_connection_returns_its_slot():
+    pool = _pool()
+
+    def failing_handler():
+        conn = pool.acquire()
+        try:
+            raise Error("boom")
+        except Error as e:
+            return str(e)          # no conn.close(), as in the route handlers
+
+    for _ in range(5):
+        failing_handler()
+    assert pool.stats()["in_use"] == 0
+    pool.acquire().close()
+
+
+def test_close_is_idempotent_and_context_manager_releases():
+    pool = _pool(size=1)
+    conn = pool.acquire()
+    conn.close()
+    conn.close()
+    with pool.acquire():
+        assert pool.stats()["in_use"] == 1
+    assert pool.stats()["in_use"] == 0
+
+
+def test_discard_frees_the_slot_without_pooling():
+    pool = _pool(size=1)
+    conn = pool.acquire()
+    conn.discard()
+    conn.close()                   # the finalizer is detached: no double release
+    stats = pool.stats()
+    assert (stats["in_use"], stats["idle"], stats["closed"]) == (0, 0, 1)
+
+
+def test_abandoned_export_stream_is_discarded():
+    pool = _pool(size=1)
+    body = stream_students(pool.acquire(), "ndjson", ["reg_no"], [("reg_no", False)])
+    next(body)
+    body.close()                   # client went away mid-stream
+    stats = pool.stats()
+    assert (stats["in_use"], stats["idle"], stats["closed"]) == (0, 0, 1)
+
+    body = stream_students(pool.acquire(), "ndjson", ["reg_no"], [("reg_no", False)])
+    assert "".join(body).count("\n") == 3
+    assert pool.stats()["idle"] == 1
+
+
+def test_abandoned_export_stream_closes_an_unpooled_connection():
+    closed = []
+
+    class RawConnection(FakeConnection):
+        def close(self):
+            closed.append(True)
+
+    body = stream_students(RawConnection(), "ndjson", ["reg_no"], [("reg_no", False)])
+    next(body)
+    body.close()
+    assert closed == [True]
@@ -0,0 +1,37 @@
+# tests/test_staging_upload.py — Staging-table upload against a live MySQL (skipped without one)
+import pytest
+from mysql.connector import Error
+
+from helpers import DB_COLUMNS, get_connection, init_db
+from ingest import diff_staging_against_students, drop_staging_table, stage_upload
+
+
+@pytest.fixture
+def cursor():
+    try:
+        init_db()
+        conn = get_connection()
+    except Error as e:
+        pytest.skip(f"MySQL not available: {e}")
+    cur = conn.cursor()
+    yield cur
+    drop_staging_table(cur)
+    conn.rollback()
+    cur.close()
+    conn.close()
+
+
+def _row(reg_no, name):
+    values = dict.fromkeys(DB_COLUMNS)
+    values.update(reg_no=reg_no, student_name=name, sr_no=1)
+    return tuple(values[c] for c in DB_COLUMNS)
+
+
+def test_stage_upload_after_init_db(cursor):
+    # students carries the ngram FULLTEXT index, which a temporary table cannot copy
+    stats = stage_upload(cursor, [_row("ZZTEST0001", "Staging Test")])
+    assert stats["rows"] == 1
+
+    changes = diff_staging_against_students(cursor)
+    assert [c["reg_no"] for c in changes] == ["ZZTEST0001"]
+    assert changes[0]["is_new"]
@@ -0,0 +1,498 @@
+# versions.py — Upload version storage (delta snapshots, checkpoints, archive)
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+
+from mysql.connector import Error
+
+import config
+from helpers import ARCHIVE_FOLDER, DB_COLUMNS, get_connection
+from ingest import STAGING_TABLE
+
+log = logging.getLogger(__name__)
+
+# upload_versions.storage values:
+#   full       — legacy full copy of the sheet (rows carry no row_hash)
+#   checkpoint — full copy of the sheet, rows carry row_hash
+#   delta      — only rows inserted ('I'), changed ('U') or removed ('D')
+#                relative to the previous version
+# Checkpoint/full rows use change_type 'F'.
+BASE_STORAGES = ("full", "checkpoint")
+
+
+def _base_version(cursor, version_id):
+    """Return (version_id, storage) of the nearest full/checkpoint ≤ version_id.
+
+    Archived versions no longer have snapshot rows, so they never count.
+    """
+    cursor.execute(
+        "SELECT version_id, storage FROM upload_versions "
+        "WHERE version_id <= %s AND storage IN ('full', 'checkpoint') "
+        "AND archive_path IS NULL "
+        "ORDER BY version_id DESC LIMIT 1",
+        (version_id,),
+    )
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+
+def _latest_version(cursor):
+    cursor.execute("SELECT MAX(version_id) FROM upload_versions")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _versions_since(cursor, base_id):
+    cursor.execute(
+        "SELECT COUNT(*) FROM upload_versions WHERE version_id > %s", (base_id,)
+    )
+    return cursor.fetchone()[0]
+
+
+def _latest_rows_join(alias="v"):
+    """JOIN that keeps, per reg_no, the row from the newest version in a range."""
+    return (
+        "JOIN (SELECT reg_no, MAX(version_id) AS vid FROM version_snapshots "
+        "      WHERE version_id BETWEEN %s AND %s GROUP BY reg_no) m "
+        f"  ON m.reg_no = {alias}.reg_no AND m.vid = {alias}.version_id"
+    )
+
+
+def choose_storage(cursor):
+    """Decide whether the next version is a checkpoint or a delta."""
+    previous = _latest_version(cursor)
+    if previous is None:
+        return "checkpoint", None
+    base_id, base_storage = _base_version(cursor, previous)
+    if base_id is None or base_storage == "full":
+        # Legacy copies have no fingerprints to diff against
+        return "checkpoint", previous
+    if _versions_since(cursor, base_id) >= config.VERSION_CHECKPOINT_INTERVAL - 1:
+        return "checkpoint", previous
+    return "delta", previous
+
+
+def _write_checkpoint(cursor, version_id):
+    cols = ", ".join(DB_COLUMNS)
+    t_cols = ", ".join(f"t.{c}" for c in DB_COLUMNS)
+    cursor.execute(
+        f"INSERT INTO version_snapshots (version_id, change_type, row_hash, {cols}) "
+        f"SELECT %s, 'F', t.row_hash, {t_cols} FROM {STAGING_TABLE} t",
+        (version_id,),
+    )
+    return cursor.rowcount
+
+
+def _write_delta(cursor, version_id, previous_id):
+    """Store only rows that differ from the rebuilt previous version."""
+    base_id, _ = _base_version(cursor, previous_id)
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_version_base")
+    cursor.execute(
+        "CREATE TEMPORARY TABLE tmp_version_base ("
+        "  reg_no VARCHAR(50) PRIMARY KEY,"
+        "  row_hash CHAR(32) NULL"
+        ")"
+    )
+    cursor.execute(
+        "INSERT IGNORE INTO tmp_version_base (reg_no, row_hash) "
+        "SELECT v.reg_no, v.row_hash FROM version_snapshots v "
+        f"{_latest_rows_join()} "
+        "WHERE v.change_type <> 'D'",
+        (base_id, previous_id),
+    )
+
+    cols = ", ".join(DB_COLUMNS)
+    t_cols = ", ".join(f"t.{c}" for c in DB_COLUMNS)
+    cursor.execute(
+        f"INSERT INTO version_snapshots (version_id, change_type, row_hash, {cols}) "
+        f"SELECT %s, IF(b.reg_no IS NULL, 'I', 'U'), t.row_hash, {t_cols} "
+        f"FROM {STAGING_TABLE} t "
+        f"LEFT JOIN tmp_version_base b ON b.reg_no = t.reg_no "
+        f"WHERE b.reg_no IS NULL OR NOT (b.row_hash <=> t.row_hash)",
+        (version_id,),
+    )
+    written = cursor.rowcount
+    cursor.execute(
+        f"INSERT INTO version_snapshots (version_id, change_type, reg_no) "
+        f"SELECT %s, 'D', b.reg_no FROM tmp_version_base b "
+        f"LEFT JOIN {STAGING_TABLE} t ON t.reg_no = b.reg_no "
+        f"WHERE t.reg_no IS NULL",
+        (version_id,),
+    )
+    written += cursor.rowcount
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_version_base")
+    return written
+
+
+def students_digest(cursor):
+    """Cheap fingerprint of the whole students table: row count plus the XOR
+    of per-row hashes, aggregated in MySQL from the stored row_hash column.
+    """
+    cursor.execute(
+        "SELECT COUNT(*), "
+        "  LPAD(HEX(BIT_XOR(CAST(CONV(LEFT(h, 16), 16, 10) AS UNSIGNED))), 16, '0'), "
+        "  LPAD(HEX(BIT_XOR(CAST(CONV(RIGHT(h, 16), 16, 10) AS UNSIGNED))), 16, '0') "
+        "FROM (SELECT MD5(CONCAT(reg_no, CHAR(31), IFNULL(row_hash, ''))) AS h FROM students) s"
+    )
+    count, high, low = cursor.fetchone()
+    return f"{count}:{high or ''}{low or ''}".lower()
+
+
+def latest_upload_matches(cursor, content_hash):
+    """True when the latest version has this content hash and students has
+    not changed since it was recorded (so re-applying it would be a no-op).
+    """
+    cursor.execute(
+        "SELECT content_hash, students_digest FROM upload_versions "
+        "ORDER BY version_id DESC LIMIT 1"
+    )
+    row = cursor.fetchone()
+    if not row or row[0] != content_hash or not row[1]:
+        return False
+    return row[1] == students_digest(cursor)
+
+
+def record_upload_version(cursor, filename, uploaded_at, total, inserted, updated, content_hash):
+    """Create an upload_versions row and store its snapshot from the staging table.
+
+    Every VERSION_CHECKPOINT_INTERVAL-th version (and the first one after
+    legacy full copies) is stored in full; the rest only keep rows that were
+    inserted, changed or removed relative to the previous version. Must run
+    after the upload has been merged into students, in the same transaction.
+    Returns ``(version_id, storage, rows_written)``.
+    """
+    storage, previous_id = choose_storage(cursor)
+    cursor.execute(
+        "INSERT INTO upload_versions "
+        "(filename, uploaded_at, total_records, inserted, updated, content_hash, "
+        " students_digest, storage) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+        (filename, uploaded_at, total, inserted, updated, content_hash,
+         students_digest(cursor), storage),
+    )
+    version_id = cursor.lastrowid
+    if storage == "checkpoint":
+        written = _write_checkpoint(cursor, version_id)
+    else:
+        written = _write_delta(cursor, version_id, previous_id)
+    return version_id, storage, written
+
+
+def _latest_archived(cursor, version_id):
+    """Return (version_id, archive_path) of the newest archived version ≤ version_id."""
+    cursor.execute(
+        "SELECT version_id, archive_path FROM upload_versions "
+        "WHERE version_id <= %s AND archive_path IS NOT NULL "
+        "ORDER BY version_id DESC LIMIT 1",
+        (version_id,),
+    )
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+
+def _rows_from_archive_chain(cursor, archived_id, archive_path, version_id):
+    """Rebuild a version from an archived base plus later delta rows."""
+    state = {r["reg_no"]: r for r in read_archive_rows(archive_path)}
+    cols = ", ".join(DB_COLUMNS)
+    cursor.execute(
+        f"SELECT change_type, {cols} FROM version_snapshots "
+        f"WHERE version_id > %s AND version_id <= %s ORDER BY version_id, id",
+        (archived_id, version_id),
+    )
+    for values in cursor.fetchall():
+        row = dict(zip(DB_COLUMNS, values[1:]))
+        if values[0] == "D":
+            state.pop(row["reg_no"], None)
+        else:
+            state[row["reg_no"]] = row
+    return _sorted_rows(state.values(), version_id)
+
+
+def _sorted_rows(rows, version_id):
+    def sr_key(row):
+        try:
+            return (0, int(row["sr_no"]))
+        except (TypeError, ValueError):
+            return (1, 0)
+    out = []
+    for row in sorted(rows, key=sr_key):
+        row = dict(row)
+        row["version_id"] = version_id
+        out.append(row)
+    return out
+
+
+def load_version_rows(cursor, version_id):
+    """Rebuild the full row set of a version (dict rows ordered by sr_no).
+
+    Archived versions are read from their blob. Otherwise the rebuild starts
+    from the nearest checkpoint (or, if newer, the nearest archived version)
+    at or before the version and applies every later delta up to it, keeping
+    the newest row per reg_no and dropping rows whose newest entry is a
+    removal. Unknown version ids give no rows.
+    """
+    archived_id, archive_path = _latest_archived(cursor, version_id)
+    if archived_id == version_id:
+        return _sorted_rows(read_archive_rows(archive_path), version_id)
+    cursor.execute("SELECT 1 FROM upload_versions WHERE version_id = %s", (version_id,))
+    if cursor.fetchone() is None:
+        return []
+    base_id, _ = _base_version(cursor, version_id)
+    if archived_id is not None and (base_id is None or archived_id > base_id):
+        return _rows_from_archive_chain(cursor, archived_id, archive_path, version_id)
+    if base_id is None:
+        return []
+    cols = ", ".join(f"v.{c}" for c in DB_COLUMNS)
+    cursor.execute(
+        f"SELECT v.id, {cols} FROM version_snapshots v "
+        f"{_latest_rows_join()} "
+        f"WHERE v.change_type <> 'D' ORDER BY v.sr_no",
+        (base_id, version_id),
+    )
+    names = ["id"] + DB_COLUMNS
+    rows = []
+    for values in cursor.fetchall():
+        row = dict(zip(names, values))
+        row["version_id"] = version_id
+        rows.append(row)
+    return rows
+
+
+def delete_version(conn, version_id):
+    """Delete a version, folding its rows into the next version if needed.
+
+    A following delta depends on this version's state, so rows it does not
+    override are carried forward into it. If the deleted version was a
+    full/checkpoint copy, the following delta becomes one itself. An
+    archived version instead gets a following unarchived delta archived
+    first. Commits on ``conn``; an archived version's blob is removed only
+    once the delete has committed. Returns False if there is no such version.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT storage, archive_path FROM upload_versions WHERE version_id = %s",
+        (version_id,),
+    )
+    row = cursor.fetchone()
+    if not row:
+        cursor.close()
+        return False
+    storage, archive_path = row
+    cursor.execute(
+        "SELECT version_id, storage, archive_path FROM upload_versions "
+        "WHERE version_id > %s ORDER BY version_id LIMIT 1",
+        (version_id,),
+    )
+    following = cursor.fetchone()
+    if following and following[1] == "delta" and following[2] is None:
+        next_id = following[0]
+        if archive_path:
+            archive_version(cursor, next_id)
+        else:
+            cols = ", ".join(DB_COLUMNS)
+            v_cols = ", ".join(f"v.{c}" for c in DB_COLUMNS)
+            cursor.execute(
+                f"INSERT INTO version_snapshots (version_id, change_type, row_hash, {cols}) "
+                f"SELECT %s, v.change_type, v.row_hash, {v_cols} FROM version_snapshots v "
+                f"WHERE v.version_id = %s AND NOT EXISTS ("
+                f"  SELECT 1 FROM version_snapshots n "
+                f"  WHERE n.version_id = %s AND n.reg_no = v.reg_no)",
+                (next_id, version_id, next_id),
+            )
+            if storage in BASE_STORAGES:
+                cursor.execute(
+                    "DELETE FROM version_snapshots WHERE version_id = %s AND change_type = 'D'",
+                    (next_id,),
+                )
+                cursor.execute(
+                    "UPDATE upload_versions SET storage = %s WHERE version_id = %s",
+                    (storage, next_id),
+                )
+    cursor.execute("DELETE FROM version_snapshots WHERE version_id = %s", (version_id,))
+    cursor.execute("DELETE FROM upload_versions WHERE version_id = %s", (version_id,))
+    conn.commit()
+    cursor.close()
+    if archive_path and os.path.exists(archive_path):
+        os.remove(archive_path)
+    return True
+
+
+# ── Columnar archive ─────────────────────────────────────────────────────────
+# One file per version: magic, 4-byte header length, JSON header, then one
+# zlib-compressed JSON array per column. The header records each column
+# segment's offset/length so a reader can decompress only what it needs.
+ARCHIVE_MAGIC = b"PMV1"
+_archive_lock = threading.Lock()
+
+
+def archive_file_path(version_id):
+    return os.path.join(ARCHIVE_FOLDER, f"version_{version_id}.pmv")
+
+
+def write_archive(path, meta, rows):
+    """Write rows (dicts keyed by DB_COLUMNS) as a compressed columnar blob."""
+    segments, columns, offset = [], [], 0
+    for col in DB_COLUMNS:
+        data = zlib.compress(
+            json.dumps([r.get(col) for r in rows], default=str).encode("utf-8"), 6
+        )
+        columns.append({"name": col, "offset": offset, "length": len(data)})
+        segments.append(data)
+        offset += len(data)
+    header = json.dumps(
+        dict(meta, row_count=len(rows), columns=columns), default=str
+    ).encode("utf-8")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(ARCHIVE_MAGIC)
+        f.write(struct.pack(">I", len(header)))
+        f.write(header)
+        for data in segments:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_archive_header(f):
+    if f.read(4) != ARCHIVE_MAGIC:
+        raise ValueError("Not a version archive")
+    (length,) = struct.unpack(">I", f.read(4))
+    return json.loads(f.read(length).decode("utf-8")), 8 + length
+
+
+def read_archive_columns(path, columns=None):
+    """Return ``(header, {column: values})`` for the requested columns only."""
+    with open(path, "rb") as f:
+        header, data_start = read_archive_header(f)
+        wanted = columns or [c["name"] for c in header["columns"]]
+        segments = {c["name"]: c for c in header["columns"]}
+        out = {}
+        for col in wanted:
+            seg = segments.get(col)
+            if seg is None:
+                continue
+            f.seek(data_start + seg["offset"])
+            out[col] = json.loads(zlib.decompress(f.read(seg["length"])).decode("utf-8"))
+    return header, out
+
+
+def iter_archive_rows(path, columns=None):
+    """Row-wise view over an archive: yields dicts of the requested columns."""
+    _header, data = read_archive_columns(path, columns)
+    names = list(data)
+    for values in zip(*(data[c] for c in names)):
+        yield dict(zip(names, values))
+
+
+def read_archive_rows(path):
+    return list(iter_archive_rows(path))
+
+
+VERSION_META_FIELDS = ["version_id", "filename", "uploaded_at"]
+
+
+def stream_archive_json(path, fields=None):
+    """Yield ``{"data": [...]}`` JSON for an archived version, row by row.
+
+    ``fields`` projects the output to a subset of DB_COLUMNS plus
+    version_id / filename / uploaded_at; only the needed column segments
+    are decompressed.
+    """
+    fields = fields or DB_COLUMNS + VERSION_META_FIELDS
+    with open(path, "rb") as f:
+        header, _ = read_archive_header(f)
+    meta = {k: header.get(k) for k in VERSION_META_FIELDS if k in fields}
+    columns = [c for c in fields if c in DB_COLUMNS]
+    yield '{"data": ['
+    first = True
+    for row in iter_archive_rows(path, columns):
+        row.update(meta)
+        yield ("" if first else ",") + json.dumps(row, default=str)
+        first = False
+    yield "]}"
+
+
+def archive_version(cursor, version_id):
+    """Move one version's snapshot into an archive blob and drop its rows.
+
+    Versions must be archived oldest first so a delta's predecessor is
+    already readable (from MySQL or its own blob).
+    """
+    cursor.execute(
+        "SELECT filename, uploaded_at, storage FROM upload_versions WHERE version_id = %s",
+        (version_id,),
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    filename, uploaded_at, storage = row
+    rows = load_version_rows(cursor, version_id)
+    for r in rows:
+        r.pop("id", None)
+        r.pop("version_id", None)
+    path = archive_file_path(version_id)
+    write_archive(path, {
+        "version_id": version_id,
+        "filename": filename,
+        "uploaded_at": uploaded_at.strftime("%Y-%m-%d %H:%M:%S") if uploaded_at else None,
+        "storage": storage,
+    }, rows)
+    cursor.execute(
+        "UPDATE upload_versions SET archive_path = %s WHERE version_id = %s",
+        (path, version_id),
+    )
+    cursor.execute("DELETE FROM version_snapshots WHERE version_id = %s", (version_id,))
+    return path
+
+
+def archive_old_versions(limit=None):
+    """Archive every version older than the latest checkpoint, oldest first.
+
+    Those versions are never needed to rebuild newer ones from MySQL.
+    Commits after each version; returns the number archived. A failure
+    stops the run (it resumes from there next time) and is logged.
+    """
+    if not _archive_lock.acquire(blocking=False):
+        return 0
+    archived = 0
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT MAX(version_id) FROM upload_versions "
+            "WHERE storage IN ('full', 'checkpoint') AND archive_path IS NULL"
+        )
+        latest_base = cursor.fetchone()[0]
+        if latest_base is not None:
+            cursor.execute(
+                "SELECT version_id FROM upload_versions "
+                "WHERE version_id < %s AND archive_path IS NULL ORDER BY version_id",
+                (latest_base,),
+            )
+            pending = [r[0] for r in cursor.fetchall()]
+            for version_id in pending[:limit] if limit else pending:
+                archive_version(cursor, version_id)
+                conn.commit()
+                archived += 1
+        cursor.close()
+        conn.close()
+    except (Error, OSError):
+        log.exception("Archive migration stopped after %d version(s)", archived)
+    finally:
+        _archive_lock.release()
+    return archived
+
+
+def start_archive_migration():
+    """Run archive_old_versions in a background daemon thread."""
+    if not config.VERSION_ARCHIVE_ENABLED:
+        return None
+    thread = threading.Thread(target=archive_old_versions, name="version-archive", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    print(f"Archived {archive_old_versions()} version(s).")